@@ -0,0 +1,82 @@
+"""
+bfloat16 autocast of selected submodules, for MODEL.PRECISION bf16 inference.
+
+`Autocast` runs a submodule under `torch.autocast` in bfloat16 (convs, linear layers
+and matmuls in bf16, on AMX/AVX512-BF16 kernels on recent Xeons) and returns its
+floating-point outputs as fp32, so the code after it (box decoding, score and mask
+sigmoids, NMS, thresholds) runs in fp32 as before. `Float32` does the reverse for a
+part of an autocast submodule that must stay in fp32. Both forward attribute lookups
+to the wrapped module, so callers reading e.g. `backbone.size_divisibility` or
+`backbone.output_shape()` are unaffected.
+"""
+import logging
+
+import torch
+from torch import nn
+
+logger = logging.getLogger(__name__)
+
+
+def _to_float(x):
+    if isinstance(x, torch.Tensor):
+        return x.float() if x.is_floating_point() else x
+    if isinstance(x, (list, tuple)):
+        return type(x)(_to_float(y) for y in x)
+    if isinstance(x, dict):
+        return {k: _to_float(v) for k, v in x.items()}
+    return x
+
+
+class _Wrapper(nn.Module):
+    def __init__(self, module: nn.Module, device_type: str):
+        super().__init__()
+        self.module = module
+        self.device_type = device_type
+
+    def __getattr__(self, name):
+        try:
+            return super().__getattr__(name)
+        except AttributeError:
+            return getattr(self.module, name)
+
+
+class Autocast(_Wrapper):
+    """Runs `module` under bfloat16 autocast; floating-point outputs are returned as fp32."""
+
+    def forward(self, *args, **kwargs):
+        with torch.autocast(self.device_type, dtype=torch.bfloat16):
+            outputs = self.module(*args, **kwargs)
+        return _to_float(outputs)
+
+
+class Float32(_Wrapper):
+    """Runs `module` in fp32 inside an `Autocast` submodule; its inputs are cast to fp32."""
+
+    def forward(self, *args, **kwargs):
+        with torch.autocast(self.device_type, enabled=False):
+            return self.module(*_to_float(args), **_to_float(kwargs))
+
+
+def wrap_modules(root: nn.Module, modules, wrapper, device_type: str):
+    """
+    Replace every reference to each of `modules` below `root` by `wrapper(module)`.
+
+    A module held by several parents (e.g. a box MLP shared by all decoder layers) gets
+    a single wrapper that all of them refer to.
+    """
+    wrappers = {id(m): wrapper(m, device_type) for m in modules}
+    for parent in list(root.modules()):
+        for name, child in parent._modules.items():
+            if child is not None and id(child) in wrappers:
+                parent._modules[name] = wrappers[id(child)]
+
+
+def check_bf16(model: nn.Module) -> str:
+    """
+    The device type `model` runs bf16 autocast on; warns when the CPU has no native
+    bf16 kernels, where bf16 is emulated and slower than fp32.
+    """
+    device_type = next(model.parameters()).device.type
+    if device_type == "cpu" and not torch.ops.mkldnn._is_mkldnn_bf16_supported():
+        logger.warning("This CPU has no AVX512-BF16/AMX support; MODEL.PRECISION bf16 will be slower than fp32")
+    return device_type
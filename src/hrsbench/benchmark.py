@@ -0,0 +1,518 @@
+"""
+In-process HRS benchmark driver.
+
+UniDet and MaskDINO are each built at most once per run, every found task is pushed
+through the already loaded model, and the scorers are called as functions.
+Several image sets (runs) can share one session of each model, and the detection
+and segmentation branches share nothing, so they can optionally run concurrently in
+two worker processes with disjoint CPU core budgets.
+"""
+import logging
+import os
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+DETECTION_TASKS = ("counting", "spatial", "size")
+SEGMENTATION_TASKS = ("color",)
+TASKS = DETECTION_TASKS + SEGMENTATION_TASKS
+
+
+def find_task_dirs(image_root: str | Path, seed: int) -> dict[str, Path]:
+    """Map each task to `<image_root>/<task>_seed<seed>` when that directory exists."""
+    task_dirs = {}
+    for task in TASKS:
+        task_dir = Path(image_root) / f"{task}_seed{seed}"
+        if task_dir.is_dir():
+            logger.info(f"Found task directory: {task_dir}")
+            task_dirs[task] = task_dir
+        else:
+            logger.info(f"Task directory not found: {task_dir}")
+    return task_dirs
+
+
+def load_scorer_module(task: str):
+    """
+    Scorer module of `task`; every one has an `evaluate` function, and the detection
+    scorers also `load_gt` and a per-image `image_correct` (the color one takes the
+    image path and its mask names instead of a pickle entry).
+
+    The scorers only depend on NumPy and the standard library (plus OpenCV, imported on
+    use, to decode the generated images of the color task).
+    """
+    if task == "counting":
+        from hrsbench.counting import calc_counting_acc
+
+        return calc_counting_acc
+    elif task == "spatial":
+        from hrsbench.compositions import calc_spatial_relation_acc
+
+        return calc_spatial_relation_acc
+    elif task == "size":
+        from hrsbench.compositions import calc_size_comp_acc
+
+        return calc_size_comp_acc
+    elif task == "color":
+        from hrsbench.colors import hue_based_color_classifier
+
+        return hue_based_color_classifier
+    raise ValueError(f"Unknown task type: {task}")
+
+
+def load_scorer(task: str):
+    """`evaluate` function of the scorer of `task`, see `load_scorer_module`."""
+    return load_scorer_module(task).evaluate
+
+
+def score_task(task: str, output_dir: str | Path, task_dir: str | Path) -> dict[str, Any]:
+    """Run the scorer of `task` on the stage output found in `output_dir`."""
+    output_dir = Path(output_dir)
+    if task == "color":
+        return load_scorer(task)(str(task_dir), str(output_dir / "color_detected_images"))
+    return load_scorer(task)(str(output_dir / f"{task}.pkl"))
+
+
+def score_images(task: str, output_dir: str | Path, task_dir: str | Path) -> dict[str, Any]:
+    """
+    Judge each image of `task_dir` with the `image_correct` of the `task` scorer.
+
+    `score_task` divides by every prompt of the task, so a subset of HRS scores about
+    its share of the dataset even when every image is right; this only counts the
+    images that were submitted.
+
+    Returns:
+        dict[str, Any]: {"images": {image name: whether it is correct}, "accuracy": percentage of correct images}
+    """
+    import pickle
+
+    from hrsbench import HRSBENCH_DATA_ROOT, stages
+
+    scorer = load_scorer_module(task)
+    gt_data = scorer.load_gt(str(HRSBENCH_DATA_ROOT / f"{task}.jsonl"))
+    output_dir = Path(output_dir)
+    if task == "color":
+        mask_dir = output_dir / "color_detected_images"
+        mask_names = os.listdir(mask_dir)
+        image_paths = stages.collect_images(task_dir, exclude=("layout.jpg", "layout.png"))
+    else:
+        with open(output_dir / f"{task}.pkl", "rb") as f:
+            pred_data = pickle.load(f)
+        image_paths = stages.collect_images(task_dir)
+
+    verdicts = {}
+    for path in image_paths:
+        name, prompt_idx = os.path.basename(path), stages.image_index(path)
+        if not prompt_idx.isdigit() or int(prompt_idx) >= len(gt_data):
+            raise ValueError(f"No {task} prompt for image {name}")
+        gt_entry = gt_data[int(prompt_idx)]
+        if task == "color":
+            img_masks_names = [mask for mask in mask_names if mask.startswith(f"{Path(path).stem}_mask_")]
+            verdicts[name] = scorer.image_correct(gt_entry, path, img_masks_names, str(mask_dir))
+        else:
+            verdicts[name] = prompt_idx in pred_data and scorer.image_correct(gt_entry, pred_data[prompt_idx])
+    accuracy = 100 * sum(verdicts.values()) / len(verdicts) if verdicts else 0.0
+    return {"images": verdicts, "accuracy": accuracy}
+
+
+def _open_cache(cfg, cache_dir: str | Path | None, cache_size_gb: float):
+    if cache_dir is None:
+        return None
+    from hrsbench.cache import InferenceCache, model_fingerprint
+
+    return InferenceCache(cache_dir, model_fingerprint(cfg), max_bytes=int(cache_size_gb * 1024**3))
+
+
+def load_unidet(
+    unidet_opts=(),
+    cache_dir: str | Path | None = None,
+    cache_size_gb: float = 20.0,
+    num_workers: int = 0,
+    threads_per_worker: int | None = None,
+    batch_size: int = 1,
+):
+    """
+    Build the UniDet demo and its inference cache.
+
+    With `num_workers` > 0 the demo runs the model in a pool of worker processes, and
+    with `batch_size` > 1 on batches of images in process, see `models.build_unidet`.
+    The inference-only checkpoint written by `hrsbench convert-weights --prune-unidet`
+    is used when present.
+
+    Returns:
+        tuple: (UnifiedVisualizationDemo, InferenceCache or None)
+    """
+    from hrsbench import models
+
+    weights = models.resolve_unidet_weights()
+    cfg = models.setup_unidet_cfg(opts=["MODEL.WEIGHTS", str(weights), *unidet_opts])
+    demo = models.build_unidet(cfg, num_workers, threads_per_worker, batch_size)
+    return demo, _open_cache(cfg, cache_dir, cache_size_gb)
+
+
+def load_maskdino(
+    maskdino_opts=(),
+    cache_dir: str | Path | None = None,
+    cache_size_gb: float = 20.0,
+    num_workers: int = 0,
+    threads_per_worker: int | None = None,
+):
+    """
+    Build the MaskDINO demo and its inference cache.
+
+    With `num_workers` > 0 the demo runs the model in a pool of worker processes, see
+    `models.build_maskdino`.
+
+    Returns:
+        tuple: (VisualizationDemo, InferenceCache or None)
+    """
+    from hrsbench import models
+
+    weights = models.resolve_weights(models.MASKDINO_WEIGHTS)
+    cfg = models.setup_maskdino_cfg(opts=["MODEL.WEIGHTS", str(weights), *maskdino_opts])
+    return models.build_maskdino(cfg, num_workers, threads_per_worker), _open_cache(cfg, cache_dir, cache_size_gb)
+
+
+def detect_runs(
+    demo,
+    runs: list[tuple[dict[str, Path], Path]],
+    resume: bool = False,
+    cache=None,
+    render: str = "all",
+    classes: str = "all",
+    per_image: bool = False,
+) -> list[dict[str, dict[str, Any]]]:
+    """
+    Run detection plus scoring for every detection task of every run on an already built UniDet.
+
+    Args:
+        runs: (task_dirs, output_dir) per evaluated image set, see `find_task_dirs`.
+        resume: skip images already committed to the stage journals by an interrupted run.
+        cache: optional `InferenceCache` of the model.
+        render: which images get a visualization, see `hrsbench.render`.
+        classes: "all" for the whole UniDet vocabulary, "prompt" to keep only the
+            classes each prompt expects, see `hrsbench.stages.run_detection`.
+        per_image: score each submitted image (`score_images`) instead of the whole task (`score_task`).
+
+    Returns:
+        list[dict[str, dict[str, Any]]]: scorer results keyed by task name, one dict per run.
+    """
+    from hrsbench import stages
+
+    all_results = [{} for _ in runs]
+    for (task_dirs, output_dir), results in zip(runs, all_results):
+        for task in DETECTION_TASKS:
+            if task not in task_dirs:
+                continue
+            logger.info(f"=== Processing {task} task of {output_dir} ===")
+            stages.run_detection(
+                demo,
+                stages.collect_images(task_dirs[task]),
+                task=task,
+                output_base_dir=output_dir,
+                pkl_path=Path(output_dir) / f"{task}.pkl",
+                resume=resume,
+                cache=cache,
+                render=render,
+                classes=classes,
+            )
+            results[task] = (score_images if per_image else score_task)(task, output_dir, task_dirs[task])
+    if cache is not None:
+        logger.info(f"UniDet inference cache: {cache.hits} hits, {cache.misses} misses")
+    return all_results
+
+
+def segment_runs(
+    demo,
+    runs: list[tuple[dict[str, Path], Path]],
+    resume: bool = False,
+    cache=None,
+    per_image: bool = False,
+) -> list[dict[str, dict[str, Any]]]:
+    """
+    Run segmentation plus color scoring for every run that has a color task on an already built MaskDINO.
+
+    Args:
+        runs: (task_dirs, output_dir) per evaluated image set, see `find_task_dirs`.
+        resume: skip images already committed to the stage journals by an interrupted run.
+        cache: optional `InferenceCache` of the model.
+        per_image: score each submitted image (`score_images`) instead of the whole task (`score_task`).
+
+    Returns:
+        list[dict[str, dict[str, Any]]]: scorer results keyed by task name, one dict per run.
+    """
+    from hrsbench import stages
+
+    all_results = [{} for _ in runs]
+    for (task_dirs, output_dir), results in zip(runs, all_results):
+        for task in SEGMENTATION_TASKS:
+            if task not in task_dirs:
+                continue
+            logger.info(f"=== Processing {task} task of {output_dir} ===")
+            stages.run_segmentation(
+                demo,
+                stages.collect_images(task_dirs[task], exclude=("layout.jpg", "layout.png")),
+                output_base_dir=output_dir,
+                resume=resume,
+                cache=cache,
+            )
+            results[task] = (score_images if per_image else score_task)(task, output_dir, task_dirs[task])
+    if cache is not None:
+        logger.info(f"MaskDINO inference cache: {cache.hits} hits, {cache.misses} misses")
+    return all_results
+
+
+def run_detection_tasks(
+    runs: list[tuple[dict[str, Path], Path]],
+    unidet_opts=(),
+    resume: bool = False,
+    cache_dir: str | Path | None = None,
+    cache_size_gb: float = 20.0,
+    num_workers: int = 0,
+    threads_per_worker: int | None = None,
+    metrics_snapshot: str | Path | None = None,
+    metrics_interval: float = 10.0,
+    batch_size: int = 1,
+    render: str = "all",
+    classes: str = "all",
+) -> list[dict[str, dict[str, Any]]]:
+    """
+    Build UniDet once and run detection plus scoring for every detection task of every run.
+
+    See `detect_runs`; `cache_dir` / `cache_size_gb` configure the shared per-image
+    inference cache (disabled if `cache_dir` is None), `num_workers` /
+    `threads_per_worker` the optional worker pool and `batch_size` the optional
+    batched inference, see `load_unidet`; `render` selects the visualized images and
+    `classes` the kept classes, see `detect_runs`. With
+    `metrics_snapshot`, the progress metrics of this process are dumped there every
+    `metrics_interval` seconds for the `MetricsExporter` of a parent process.
+    """
+    if not any(task in task_dirs for task_dirs, _ in runs for task in DETECTION_TASKS):
+        return [{} for _ in runs]
+    writer = None
+    if metrics_snapshot is not None:
+        from hrsbench.metrics import SnapshotWriter
+
+        writer = SnapshotWriter(metrics_snapshot, metrics_interval)
+        writer.start()
+    demo, cache = load_unidet(unidet_opts, cache_dir, cache_size_gb, num_workers, threads_per_worker, batch_size)
+    try:
+        return detect_runs(demo, runs, resume, cache, render, classes)
+    finally:
+        if demo.parallel:
+            demo.predictor.shutdown()
+        if writer is not None:
+            writer.stop()
+
+
+def run_segmentation_tasks(
+    runs: list[tuple[dict[str, Path], Path]],
+    maskdino_opts=(),
+    resume: bool = False,
+    cache_dir: str | Path | None = None,
+    cache_size_gb: float = 20.0,
+    num_workers: int = 0,
+    threads_per_worker: int | None = None,
+    metrics_snapshot: str | Path | None = None,
+    metrics_interval: float = 10.0,
+) -> list[dict[str, dict[str, Any]]]:
+    """
+    Build MaskDINO once and run segmentation plus color scoring for every run that has a color task.
+
+    See `segment_runs`; `cache_dir` / `cache_size_gb` configure the shared per-image
+    inference cache (disabled if `cache_dir` is None) and `num_workers` /
+    `threads_per_worker` the optional worker pool, see `load_maskdino`. With
+    `metrics_snapshot`, the progress metrics of this process are dumped there every
+    `metrics_interval` seconds for the `MetricsExporter` of a parent process.
+    """
+    if not any(task in task_dirs for task_dirs, _ in runs for task in SEGMENTATION_TASKS):
+        return [{} for _ in runs]
+    writer = None
+    if metrics_snapshot is not None:
+        from hrsbench.metrics import SnapshotWriter
+
+        writer = SnapshotWriter(metrics_snapshot, metrics_interval)
+        writer.start()
+    demo, cache = load_maskdino(maskdino_opts, cache_dir, cache_size_gb, num_workers, threads_per_worker)
+    try:
+        return segment_runs(demo, runs, resume, cache)
+    finally:
+        if demo.parallel:
+            demo.predictor.shutdown()
+        if writer is not None:
+            writer.stop()
+
+
+def _run_branches_concurrently(
+    runs: list[tuple[dict[str, Path], Path]],
+    unidet_opts,
+    maskdino_opts,
+    detection_cores: int | None,
+    segmentation_cores: int | None,
+    resume: bool,
+    model_kwargs: dict[str, Any],
+    metrics_snapshots: tuple[Path, Path] | tuple[None, None] = (None, None),
+    detection_kwargs: dict[str, Any] | None = None,
+) -> tuple[list[dict[str, dict[str, Any]]], list[dict[str, dict[str, Any]]]]:
+    """Run the detection and segmentation branches in two pinned worker processes."""
+    import multiprocessing as mp
+    from concurrent.futures import ProcessPoolExecutor
+
+    from hrsbench.workers import available_cores, init_worker, split_cores
+
+    det_budget, seg_budget = split_cores(available_cores(), [detection_cores, segmentation_cores])
+    logger.info(f"Detection branch on cores {det_budget}, segmentation branch on cores {seg_budget}")
+
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(1, mp_context=ctx, initializer=init_worker, initargs=(det_budget,)) as det_pool, \
+            ProcessPoolExecutor(1, mp_context=ctx, initializer=init_worker, initargs=(seg_budget,)) as seg_pool:
+        det_future = det_pool.submit(
+            run_detection_tasks,
+            runs,
+            tuple(unidet_opts),
+            resume,
+            **model_kwargs,
+            metrics_snapshot=metrics_snapshots[0],
+            **(detection_kwargs or {}),
+        )
+        seg_future = seg_pool.submit(
+            run_segmentation_tasks, runs, tuple(maskdino_opts), resume, **model_kwargs, metrics_snapshot=metrics_snapshots[1]
+        )
+        return det_future.result(), seg_future.result()
+
+
+def run_tasks(
+    runs: list[tuple[dict[str, Path], Path]],
+    unidet_opts=(),
+    maskdino_opts=(),
+    concurrent: bool = False,
+    detection_cores: int | None = None,
+    segmentation_cores: int | None = None,
+    resume: bool = False,
+    cache_dir: str | Path | None = None,
+    cache_size_gb: float = 20.0,
+    num_workers: int = 0,
+    threads_per_worker: int | None = None,
+    metrics_file: str | Path | None = None,
+    metrics_port: int | None = None,
+    metrics_interval: float = 10.0,
+    batch_size: int = 1,
+    render: str = "all",
+    classes: str = "all",
+) -> list[dict[str, dict[str, Any]]]:
+    """
+    Push every run through one UniDet session and one MaskDINO session.
+
+    With `resume`, images already committed to the stage journals of an interrupted run
+    are skipped and merged into the final outputs. With `cache_dir`, per-image model
+    outputs are looked up in (and added to) a content-addressed cache shared across
+    runs, methods and seeds.
+
+    With `concurrent`, the UniDet and MaskDINO branches run side by side in two worker
+    processes. The available cores are split between them (`detection_cores` /
+    `segmentation_cores`; unspecified budgets share the remaining cores evenly) and each
+    worker pins itself to its cores and sizes its thread pools accordingly.
+
+    With `num_workers` > 0, each model runs in a pool of that many CPU worker processes
+    (`AsyncPredictor`) fed through an ordered queue, with `threads_per_worker` intra-op
+    threads each; the outputs are the same as with the in-process model. With
+    `concurrent`, each branch splits its own core budget between its workers.
+
+    With `batch_size` > 1 (and no worker pool), UniDet runs on batches of that many
+    images per forward; every image gets the same outputs as when it runs alone.
+
+    `render` selects the detection images that get a visualization in
+    `<task>_detected_images` (`all`, `none`, `first:N`, `every:K` or `failures`, see
+    `hrsbench.render`); rendering runs in a background thread.
+
+    `classes="all"` (the default) keeps the full UniDet vocabulary. With
+    `classes="prompt"`, UniDet drops every class the prompt of an image does not
+    expect before thresholding and NMS; the scorers only look at the expected classes.
+
+    With `metrics_file` and/or `metrics_port`, live progress metrics (images/sec, ETA,
+    queue depths, per-phase latency percentiles, time of the last finished image) are
+    published in Prometheus text format while the run is in flight: the file is
+    rewritten every `metrics_interval` seconds and `http://127.0.0.1:<metrics_port>/metrics`
+    serves the current values. See `hrsbench.metrics`.
+
+    Returns:
+        list[dict[str, dict[str, Any]]]: scorer results keyed by task name, one dict per run.
+    """
+    from hrsbench import models
+
+    need_unidet = any(task in task_dirs for task_dirs, _ in runs for task in DETECTION_TASKS)
+    need_maskdino = any(task in task_dirs for task_dirs, _ in runs for task in SEGMENTATION_TASKS)
+    models.download_weights(unidet=need_unidet, maskdino=need_maskdino)
+    for _, output_dir in runs:
+        os.makedirs(output_dir, exist_ok=True)
+
+    model_kwargs = dict(
+        cache_dir=cache_dir,
+        cache_size_gb=cache_size_gb,
+        num_workers=num_workers,
+        threads_per_worker=threads_per_worker,
+        metrics_interval=metrics_interval,
+    )
+    detection_kwargs = dict(batch_size=batch_size, render=render, classes=classes)
+    concurrent = concurrent and need_unidet and need_maskdino
+    exporter = None
+    metrics_snapshots = (None, None)
+    if metrics_file is not None or metrics_port is not None:
+        import shutil
+        import tempfile
+
+        from hrsbench.metrics import MetricsExporter
+
+        if concurrent:
+            snapshot_dir = Path(tempfile.mkdtemp(prefix="hrsbench-metrics-"))
+            metrics_snapshots = (snapshot_dir / "detection.json", snapshot_dir / "segmentation.json")
+        exporter = MetricsExporter(
+            metrics_file, metrics_port, interval=metrics_interval, child_snapshots=[p for p in metrics_snapshots if p]
+        )
+        exporter.start()
+    try:
+        if concurrent:
+            det_results, seg_results = _run_branches_concurrently(
+                runs, unidet_opts, maskdino_opts, detection_cores, segmentation_cores, resume, model_kwargs,
+                metrics_snapshots, detection_kwargs,
+            )
+        else:
+            det_results = run_detection_tasks(runs, unidet_opts, resume, **model_kwargs, **detection_kwargs)
+            seg_results = run_segmentation_tasks(runs, maskdino_opts, resume, **model_kwargs)
+    finally:
+        if exporter is not None:
+            exporter.stop()
+            if metrics_snapshots[0] is not None:
+                shutil.rmtree(metrics_snapshots[0].parent, ignore_errors=True)
+    return [{**det, **seg} for det, seg in zip(det_results, seg_results)]
+
+
+def run_benchmark(
+    image_root: str | Path,
+    method_name: str | None = None,
+    output_root: str | Path = "./output",
+    seed: int = 42,
+    **kwargs,
+) -> dict[str, dict[str, Any]]:
+    """
+    Evaluate every `<task>_seed<seed>` directory found under `image_root`.
+
+    Outputs go to `<output_root>/<method_name>_seed<seed>/`, exactly where
+    `run_hrs_benchmark.sh` used to put them. Keyword arguments are forwarded to `run_tasks`.
+
+    Returns:
+        dict[str, dict[str, Any]]: scorer results keyed by task name.
+    """
+    method_name = method_name or Path(image_root).name
+    logger.info(f"Running HRS benchmark with method: {method_name}, seed: {seed}")
+
+    task_dirs = find_task_dirs(image_root, seed)
+    if not task_dirs:
+        raise FileNotFoundError(f"No task directories found with seed {seed} in {image_root}")
+
+    output_dir = Path(output_root) / f"{method_name}_seed{seed}"
+    results, = run_tasks([(task_dirs, output_dir)], **kwargs)
+
+    logger.info(f"=== HRS Benchmark completed for method: {method_name} ===")
+    logger.info(f"Results saved in: {output_dir}")
+    return results
@@ -0,0 +1,198 @@
+"""
+Content-addressed on-disk cache of per-image model outputs.
+
+An entry is addressed by the sha256 of the image bytes together with a fingerprint
+of the model that produced it (effective detectron2 config plus the sha256 of the
+model state dict), so byte-identical images are never run twice through the same
+model, whichever method, seed or run they belong to. The cache directory is
+bounded in size and evicts least recently used entries.
+"""
+import hashlib
+import logging
+import os
+import pickle
+from pathlib import Path
+from typing import Any
+
+from hrsbench.journal import atomic_write_bytes
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 1 << 20
+
+
+def file_digest(path: str | Path) -> str:
+    """sha256 of a file's content."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_state_dict(path: str | Path) -> dict:
+    """
+    The model state dict of a checkpoint, as CPU tensors.
+
+    Both a detectron2 training checkpoint (`{"model": state_dict, ...}` or a bare state
+    dict, numpy arrays included) and a memory-mappable `*.mmap.pth` are accepted; the
+    latter is mapped rather than read. Non-tensor entries are skipped.
+    """
+    import numpy as np
+    import torch
+
+    from hrsbench.models import MMAP_SUFFIX
+
+    if str(path).endswith(MMAP_SUFFIX):
+        state_dict = torch.load(path, map_location="cpu", mmap=True, weights_only=True)["model"]
+    else:
+        checkpoint = torch.load(path, map_location="cpu", weights_only=False)
+        state_dict = checkpoint["model"] if isinstance(checkpoint, dict) and "model" in checkpoint else checkpoint
+
+    tensors = {}
+    for key, value in state_dict.items():
+        if isinstance(value, np.ndarray):
+            value = torch.from_numpy(value)
+        if not isinstance(value, torch.Tensor):
+            logger.warning(f"Skipping non-tensor entry {key} of {path}")
+            continue
+        tensors[key] = value
+    return tensors
+
+
+def state_dict_digest(path: str | Path) -> str:
+    """
+    sha256 of the model state dict of a checkpoint: the name, dtype, shape and values of every tensor.
+
+    Unlike the digest of the file bytes, it is the same for a training checkpoint and its
+    `hrsbench convert-weights` copy, which load the same model.
+    """
+    import torch
+
+    h = hashlib.sha256()
+    for key, value in sorted(load_state_dict(path).items()):
+        h.update(f"{key} {value.dtype} {tuple(value.shape)}\0".encode())
+        h.update(value.detach().contiguous().reshape(-1).view(torch.uint8).numpy())
+    return h.hexdigest()
+
+
+def weights_digest(path: str | Path) -> str:
+    """
+    `state_dict_digest` of a weights file, memoized in a `<path>.sha256` sidecar.
+
+    The sidecar is trusted only while the size and mtime of the weights file are unchanged.
+    """
+    path = Path(path)
+    stat = path.stat()
+    # the "state_dict" tag tells these sidecars from the older ones holding the digest of the file bytes
+    stamp = f"state_dict {stat.st_size} {stat.st_mtime_ns}"
+    sidecar = path.with_name(path.name + ".sha256")
+    try:
+        cached_stamp, digest = sidecar.read_text().split("\n")[:2]
+        if cached_stamp == stamp:
+            return digest
+    except (OSError, ValueError):
+        pass
+    digest = state_dict_digest(path)
+    try:
+        atomic_write_bytes(sidecar, f"{stamp}\n{digest}\n".encode())
+    except OSError:
+        # read-only weights directory, just recompute next time
+        pass
+    return digest
+
+
+def model_fingerprint(cfg) -> str:
+    """
+    Fingerprint of the effective detectron2 config and the content of its weights.
+
+    The weights path is replaced by the weights digest, so the same checkpoint stored
+    at different paths, or converted to the memory-mappable format, maps to the same
+    fingerprint.
+    """
+    cfg = cfg.clone()
+    cfg.defrost()
+    if os.path.isfile(cfg.MODEL.WEIGHTS):
+        cfg.MODEL.WEIGHTS = weights_digest(cfg.MODEL.WEIGHTS)
+    return hashlib.sha256(cfg.dump().encode()).hexdigest()
+
+
+class InferenceCache:
+    """
+    Size-bounded LRU store of pickled per-image outputs of one model.
+
+    Several caches (e.g. UniDet and MaskDINO) may share the same `root`; the size bound
+    applies to the whole directory.
+
+    Args:
+        root: cache directory.
+        namespace: model fingerprint, see `model_fingerprint`.
+        max_bytes: total size above which the least recently used entries are evicted.
+    """
+
+    def __init__(self, root: str | Path, namespace: str, max_bytes: int = 20 * 1024**3):
+        self.root = Path(root)
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.root, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._scan())
+
+    def key(self, image_digest: str, *extra) -> str:
+        """Cache key of an image (by content digest) under this model and extra stage parameters."""
+        return hashlib.sha256("\0".join([self.namespace, image_digest, *map(str, extra)]).encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.pkl"
+
+    def get(self, key: str) -> Any | None:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        # mtime is the LRU clock
+        os.utime(path)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any):
+        path = self._path(key)
+        os.makedirs(path.parent, exist_ok=True)
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        atomic_write_bytes(path, data)
+        self._total_bytes += len(data)
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def _scan(self) -> list[tuple[Path, int, float]]:
+        entries = []
+        for path in self.root.glob("*/*.pkl"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is back under 90% of its bound."""
+        # rescan, other processes may share the directory
+        entries = sorted(self._scan(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        self._total_bytes = total
+        logger.info(f"Evicted {evicted} cache entries, {total / 1024**2:.1f} MiB left in {self.root}")
@@ -1,29 +1,647 @@
-import os
-import subprocess
+import argparse
+import logging
 import sys
-from importlib import resources
 
+# keep this module light: everything that needs NumPy or the model stacks is imported
+# inside the command that uses it, see `python -m hrsbench.perf.import_time`
+from hrsbench.benchmark import TASKS
 
-def main():
+
+def add_runtime_arguments(parser):
+    """Options shared by every command that runs the models."""
+    parser.add_argument(
+        "--unidet-opts",
+        nargs="*",
+        default=[],
+        help="Extra UniDet config options as 'KEY VALUE' pairs",
+    )
+    parser.add_argument(
+        "--maskdino-opts",
+        nargs="*",
+        default=[],
+        help="Extra MaskDINO config options as 'KEY VALUE' pairs",
+    )
+    parser.add_argument(
+        "--concurrent",
+        action="store_true",
+        help="Run the UniDet (counting/spatial/size) and MaskDINO (color) branches concurrently "
+        "in two worker processes with disjoint CPU core budgets",
+    )
+    parser.add_argument(
+        "--detection-cores",
+        type=int,
+        default=None,
+        help="Number of cores given to the UniDet worker with --concurrent (default: half of the available cores)",
+    )
+    parser.add_argument(
+        "--segmentation-cores",
+        type=int,
+        default=None,
+        help="Number of cores given to the MaskDINO worker with --concurrent (default: the remaining cores)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume an interrupted run: skip images already committed to the stage journals",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="Directory of a content-addressed cache of per-image model outputs, shared across runs "
+        "and methods (disabled by default)",
+    )
+    parser.add_argument(
+        "--cache-size-gb",
+        type=float,
+        default=20.0,
+        help="Size bound of the inference cache; least recently used entries are evicted beyond it",
+    )
+    add_worker_arguments(parser)
+    add_profile_argument(parser)
+    add_backend_argument(parser)
+    add_precision_arguments(parser)
+    add_compile_argument(parser)
+    add_fold_bn_argument(parser)
+    add_render_argument(parser)
+    add_classes_argument(parser)
+    add_metrics_arguments(parser)
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument(
+        "--metrics-file",
+        default=None,
+        help="Publish live progress metrics (images/sec, ETA, queue depths, latency percentiles) to this "
+        "file in Prometheus text format, e.g. for the node_exporter textfile collector",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="Serve the live progress metrics on http://127.0.0.1:PORT/metrics",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=10.0,
+        help="Seconds between two updates of --metrics-file",
+    )
+
+
+def add_render_argument(parser):
+    from hrsbench.render import render_spec
+
+    parser.add_argument(
+        "--render",
+        type=render_spec,
+        default="all",
+        help="Detection images that get a visualization in <task>_detected_images: all, none, first:N, "
+        "every:K or failures (images the scorer judges wrong); drawn in a background thread",
+    )
+
+
+def add_classes_argument(parser):
+    parser.add_argument(
+        "--classes",
+        choices=("prompt", "all"),
+        default="all",
+        help="Classes UniDet keeps: all (the full vocabulary) or prompt (those the prompt of each image "
+        "expects, the only ones the scorers look at; the others are dropped before NMS)",
+    )
+
+
+def add_profile_argument(parser):
+    from hrsbench.models import UNIDET_PROFILES
+
+    parser.add_argument(
+        "--profile",
+        choices=tuple(UNIDET_PROFILES),
+        default="accurate",
+        help="Speed/accuracy profile of UniDet, setting the test size, RPN proposal budgets, detections "
+        "per image and batch-norm folding together (see `hrsbench profiles` for their measured trade-off); "
+        "--unidet-opts override it",
+    )
+
+
+def add_backend_argument(parser):
+    parser.add_argument(
+        "--backend",
+        choices=("pytorch", "onnxruntime"),
+        default="pytorch",
+        help="Runtime of the UniDet backbone, RPN head and box heads: pytorch or onnxruntime (CPU; exported "
+        "to ONNX on first use, or ahead of time with `hrsbench export-onnx`). Same as "
+        "--unidet-opts MODEL.BACKEND onnxruntime",
+    )
+
+
+def add_precision_arguments(parser):
+    parser.add_argument(
+        "--precision",
+        choices=("fp32", "int8", "bf16"),
+        default="fp32",
+        help="Inference precision: fp32; int8 (UniDet only: CPU post-training quantization of the backbone/FPN "
+        "convs and the ROI head linear layers; needs --calibration-dir); or bf16 (both models: the UniDet "
+        "backbone/FPN, RPN and box heads and the MaskDINO Swin backbone and transformer decoder under bf16 "
+        "autocast, fastest on CPUs with AMX/AVX512-BF16). Same as --unidet-opts/--maskdino-opts MODEL.PRECISION",
+    )
+    parser.add_argument(
+        "--calibration-dir",
+        default=None,
+        help="Directory (or glob) of HRS images the int8 activation ranges are calibrated on, once; the "
+        "calibration is saved next to the weights. Same as --unidet-opts MODEL.QUANT.CALIBRATION_DIR DIR",
+    )
+
+
+def add_compile_argument(parser):
+    parser.add_argument(
+        "--compile",
+        action="store_true",
+        help="Run the UniDet backbone/FPN and the MaskDINO Swin backbone compiled ahead of time by AOTInductor, "
+        "one static-shape package per padded input shape (the first 2 shapes seen twice; other shapes run "
+        "eager). Compiling a shape takes minutes once; the packages are saved under compiled/ next to the "
+        "weights and reused by later runs. Same as --unidet-opts/--maskdino-opts MODEL.COMPILE.ENABLED True",
+    )
+
+
+def add_fold_bn_argument(parser):
+    parser.add_argument(
+        "--fold-bn",
+        action="store_true",
+        help="Fold the UniDet batch norms into the convs that precede them at load time (on in the balanced "
+        "and fast profiles). Faster, but with --workers every worker keeps a private copy of the folded "
+        "conv weights. Same as --unidet-opts MODEL.FOLD_BN True",
+    )
+
+
+def _unidet_opts(args):
+    from hrsbench.models import unidet_profile_opts
+
+    opts = [*(unidet_profile_opts(args.profile) if args.profile != "accurate" else []), *args.unidet_opts]
+    if args.backend != "pytorch":
+        opts += ["MODEL.BACKEND", args.backend]
+    if args.precision != "fp32":
+        opts += ["MODEL.PRECISION", args.precision]
+    if args.calibration_dir:
+        opts += ["MODEL.QUANT.CALIBRATION_DIR", args.calibration_dir]
+    if args.compile:
+        opts += ["MODEL.COMPILE.ENABLED", "True"]
+    if args.fold_bn:
+        opts += ["MODEL.FOLD_BN", "True"]
+    return opts
+
+
+def _maskdino_opts(args):
+    opts = list(args.maskdino_opts)
+    if args.precision == "bf16":
+        opts += ["MODEL.PRECISION", args.precision]
+    if args.compile:
+        opts += ["MODEL.COMPILE.ENABLED", "True"]
+    return opts
+
+
+def add_worker_arguments(parser):
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="Run UniDet on batches of this many images per forward (in process, without --workers); "
+        "every image gets the same detections as when it runs alone",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Run each model in this many CPU worker processes fed through an ordered queue, each pinned "
+        "to its share of the cores (default: in the main process)",
+    )
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        default=None,
+        help="Intra-op threads of each worker with --workers (default: its number of cores)",
+    )
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description="Run the HRS benchmark for a given method and image directory.",
+        epilog=(
+            "IMAGE_ROOT_DIR is expected to contain one directory per task, e.g. "
+            "counting_seed42/, spatial_seed42/, size_seed42/ and color_seed42/, holding images named "
+            "{prompt_idx}_{level}_{prompt}.jpg. Results are saved in OUTPUT_ROOT_DIR/METHOD_NAME_seed{GENERATION_SEED}/."
+        ),
+    )
+    parser.add_argument(
+        "image_root_dir",
+        metavar="IMAGE_ROOT_DIR",
+        help="The base directory containing the generated images, organized by task.",
+    )
+    parser.add_argument(
+        "method_name",
+        metavar="METHOD_NAME",
+        nargs="?",
+        default=None,
+        help="The name of the method being evaluated. Defaults to the basename of IMAGE_ROOT_DIR.",
+    )
+    parser.add_argument(
+        "output_root_dir",
+        metavar="OUTPUT_ROOT_DIR",
+        nargs="?",
+        default="./output",
+        help="The root directory to save outputs. Defaults to ./output.",
+    )
+    parser.add_argument(
+        "generation_seed",
+        metavar="GENERATION_SEED",
+        nargs="?",
+        type=int,
+        default=42,
+        help="The seed used for image generation. Defaults to 42.",
+    )
+    add_runtime_arguments(parser)
+    parser.add_argument(
+        "--no-server",
+        action="store_true",
+        help="Always evaluate in this process, even if an `hrsbench serve` daemon is running",
+    )
+    return parser
+
+
+def get_sweep_parser():
+    parser = argparse.ArgumentParser(
+        description="Evaluate many (method, image root, seed) entries with one model session "
+        "and write a combined leaderboard.",
+    )
+    parser.add_argument(
+        "sweep_file",
+        metavar="SWEEP_FILE",
+        help='JSONL file with one {"method": ..., "image_root": ..., "seed": ...} entry per line.',
+    )
+    parser.add_argument(
+        "output_root_dir",
+        metavar="OUTPUT_ROOT_DIR",
+        nargs="?",
+        default="./output",
+        help="The root directory to save outputs and leaderboard.{json,csv}. Defaults to ./output.",
+    )
+    add_runtime_arguments(parser)
+    return parser
+
+
+def get_serve_parser():
+    parser = argparse.ArgumentParser(
+        prog="hrsbench serve",
+        description="Keep UniDet and MaskDINO loaded and serve evaluation requests on a Unix socket "
+        "or a localhost port. run_hrsbench_eval and hrsbench.client.evaluate use it when it is running.",
+    )
+    parser.add_argument(
+        "--socket",
+        default=None,
+        help="Unix socket to listen on (default: $XDG_RUNTIME_DIR/hrsbench.sock or /tmp/hrsbench-<uid>.sock)",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=None,
+        help="Listen on this localhost TCP port instead of a Unix socket "
+        "(clients then need HRSBENCH_SERVER=http://127.0.0.1:PORT)",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind with --port")
+    parser.add_argument("--unidet-opts", nargs="*", default=[], help="Extra UniDet config options as 'KEY VALUE' pairs")
+    parser.add_argument("--maskdino-opts", nargs="*", default=[], help="Extra MaskDINO config options as 'KEY VALUE' pairs")
+    parser.add_argument("--cache-dir", default=None, help="Directory of the per-image inference cache (disabled by default)")
+    parser.add_argument("--cache-size-gb", type=float, default=20.0, help="Size bound of the inference cache")
+    add_worker_arguments(parser)
+    add_profile_argument(parser)
+    add_backend_argument(parser)
+    add_precision_arguments(parser)
+    add_compile_argument(parser)
+    add_fold_bn_argument(parser)
+    add_render_argument(parser)
+    add_classes_argument(parser)
+    return parser
+
+
+def get_score_parser():
+    parser = argparse.ArgumentParser(
+        prog="hrsbench score",
+        description="Score precomputed stage outputs without loading any model. Only NumPy and the "
+        "standard library are imported (plus OpenCV to decode the generated images of the color task).",
+    )
+    parser.add_argument("task", metavar="TASK", choices=TASKS, help=f"One of {', '.join(TASKS)}.")
+    parser.add_argument(
+        "inputs",
+        metavar="INPUT",
+        nargs="+",
+        help="counting/spatial/size: the <task>.pkl written by the detection stage; "
+        "color: the generated image directory followed by the mask directory.",
+    )
+    parser.add_argument(
+        "--gt-jsonl",
+        default=None,
+        help="Ground-truth prompts (default: the bundled hrs_dataset/<task>.jsonl)",
+    )
+    return parser
+
+
+def get_convert_weights_parser():
+    parser = argparse.ArgumentParser(
+        prog="hrsbench convert-weights",
+        description="Convert checkpoints once into a memory-mappable format (<name>.mmap.pth next to "
+        "each checkpoint). The benchmark then maps the converted weights instead of unpickling them, "
+        "so worker processes share their pages.",
+    )
+    parser.add_argument(
+        "weights",
+        metavar="WEIGHTS",
+        nargs="*",
+        help="Checkpoints to convert (default: the UniDet and MaskDINO weights, downloaded if missing)",
+    )
+    parser.add_argument(
+        "--prune-unidet",
+        action="store_true",
+        help="Write the UniDet checkpoint as an inference-only model instead (<name>.coco-only.mmap.pth), "
+        "keeping only the COCO classifier that the evaluation uses; picked up automatically",
+    )
+    return parser
+
+
+def get_export_onnx_parser():
+    parser = argparse.ArgumentParser(
+        prog="hrsbench export-onnx",
+        description="Export the UniDet backbone, RPN head and cascade box heads to ONNX for --backend "
+        "onnxruntime (onnx/unidet-<hash> next to the weights). They are otherwise exported on first use; "
+        "exporting ahead of time keeps worker processes from each exporting them.",
+    )
+    parser.add_argument("--unidet-opts", nargs="*", default=[], help="Extra UniDet config options as 'KEY VALUE' pairs")
+    return parser
+
+
+def get_profiles_parser():
+    from hrsbench.models import UNIDET_PROFILES
+
+    parser = argparse.ArgumentParser(
+        prog="hrsbench profiles",
+        description="Measure the UniDet profiles on a fixed image set: run the counting, spatial and size "
+        "detection stages with each profile and report images/sec, the speedup over `accurate` and the "
+        "change of every averaged HRS metric.",
+    )
+    parser.add_argument("image_root", metavar="IMAGE_ROOT", help="Directory holding the <task>_seed<seed> directories")
+    parser.add_argument("--seed", type=int, default=42, help="Generation seed of the task directories")
+    parser.add_argument(
+        "--limit", type=int, default=200, help="First images (by file name) of each task to run; 0 for all"
+    )
+    parser.add_argument(
+        "--profiles",
+        nargs="+",
+        choices=tuple(UNIDET_PROFILES),
+        default=list(UNIDET_PROFILES),
+        help="Profiles to measure; the first one is the reference (default: all, accurate first)",
+    )
+    parser.add_argument("--unidet-opts", nargs="*", default=[], help="Extra UniDet config options of every profile")
+    return parser
+
+
+def get_merge_shards_parser():
+    parser = argparse.ArgumentParser(
+        prog="hrsbench merge-shards",
+        description="Check that the shard files of a sharded demo.py run cover every prompt index exactly "
+        "once and merge them into the task pickle (detection) or mask directory (color) read by the scorers.",
+    )
+    parser.add_argument("shards", metavar="SHARD", nargs="+", help="Shard files, <output>.shard-<id>-of-<n>")
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Merged pickle or mask directory (default: the shard path without its .shard-<id>-of-<n> suffix)",
+    )
+    return parser
+
+
+def _use_spawn():
+    # worker pools must not be forked from a process whose torch thread pools are running
+    import multiprocessing as mp
+
+    mp.set_start_method("spawn", force=True)
+
+
+def _runtime_kwargs(args):
+    return dict(
+        unidet_opts=_unidet_opts(args),
+        maskdino_opts=_maskdino_opts(args),
+        concurrent=args.concurrent,
+        detection_cores=args.detection_cores,
+        segmentation_cores=args.segmentation_cores,
+        resume=args.resume,
+        cache_dir=args.cache_dir,
+        cache_size_gb=args.cache_size_gb,
+        num_workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+        batch_size=args.batch_size,
+        render=args.render,
+        classes=args.classes,
+        metrics_file=args.metrics_file,
+        metrics_port=args.metrics_port,
+        metrics_interval=args.metrics_interval,
+    )
+
+
+def main(argv=None):
     """
-    Finds and executes the run_hrs_benchmark.sh script,
-    passing along any command-line arguments.
+    Run every found HRS task in a single process, loading UniDet and MaskDINO once each,
+    or on the `hrsbench serve` daemon when one is running.
     """
+    args = get_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s %(name)s]: %(message)s")
+    _use_spawn()
+
+    from hrsbench.client import evaluate
+
     try:
-        script_path_obj = resources.files("hrsbench").joinpath("run_hrs_benchmark.sh")
+        evaluate(
+            args.image_root_dir,
+            method_name=args.method_name,
+            output_root=args.output_root_dir,
+            seed=args.generation_seed,
+            use_server=not args.no_server,
+            **_runtime_kwargs(args),
+        )
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
 
-        with resources.as_file(script_path_obj) as script_path:
-            if not os.access(script_path, os.X_OK):
-                os.chmod(script_path, 0o755)
 
-            args = [str(script_path)] + sys.argv[1:]
-            subprocess.run(args, check=True)
+def sweep_main(argv=None):
+    """
+    Run every entry of a sweep file through warm models and write the leaderboard.
+    """
+    args = get_sweep_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s %(name)s]: %(message)s")
+    _use_spawn()
+
+    from hrsbench.sweep import load_sweep, run_sweep
+
+    try:
+        run_sweep(load_sweep(args.sweep_file), output_root=args.output_root_dir, **_runtime_kwargs(args))
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def score_main(argv=None):
+    """
+    Score a precomputed pickle (or color mask directory) with NumPy only.
+    """
+    parser = get_score_parser()
+    args = parser.parse_args(argv)
+    num_inputs = 2 if args.task == "color" else 1
+    if len(args.inputs) != num_inputs:
+        parser.error(f"{args.task} takes {num_inputs} INPUT argument(s), got {len(args.inputs)}")
 
-    except FileNotFoundError:
-        print("Error: run_hrs_benchmark.sh not found within the package.", file=sys.stderr)
+    from hrsbench.benchmark import load_scorer
+
+    kwargs = {"gt_jsonl_path": args.gt_jsonl} if args.gt_jsonl else {}
+    try:
+        load_scorer(args.task)(*args.inputs, **kwargs)
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
-    except subprocess.CalledProcessError as e:
-        sys.exit(e.returncode)
+
+
+def convert_weights_main(argv=None):
+    """
+    Convert the model checkpoints into the memory-mappable format, or prune the UniDet one.
+    """
+    args = get_convert_weights_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s %(name)s]: %(message)s")
+
+    from hrsbench import models
+    from hrsbench.weights import convert_to_mmap, prune_unidet
+
+    if args.prune_unidet:
+        paths = args.weights
+        if not paths:
+            models.download_weights(maskdino=False)
+            paths = [models.UNIDET_WEIGHTS]
+        for path in paths:
+            try:
+                prune_unidet(path)
+            except ValueError as e:
+                print(f"Error: {e}", file=sys.stderr)
+                sys.exit(1)
+        return
+
+    paths = args.weights
+    if not paths:
+        models.download_weights()
+        paths = [models.UNIDET_WEIGHTS, models.MASKDINO_WEIGHTS]
+    for path in paths:
+        convert_to_mmap(path)
+
+
+def export_onnx_main(argv=None):
+    """
+    Export the dense parts of UniDet to ONNX for the ONNX Runtime backend.
+    """
+    args = get_export_onnx_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s %(name)s]: %(message)s")
+
+    from hrsbench import models
+    from hrsbench.weights import build_predictor
+
+    models.download_weights(maskdino=False)
+    weights = models.resolve_unidet_weights()
+    cfg = models.setup_unidet_cfg(opts=["MODEL.WEIGHTS", str(weights), *args.unidet_opts, "MODEL.DEVICE", "cpu"])
+    from unidet.modeling.fold_bn import fold_batchnorm
+    from unidet.modeling.onnx_backend import export_onnx
+
+    predictor = build_predictor(cfg)
+    if cfg.MODEL.FOLD_BN:
+        fold_batchnorm(predictor.model)
+    print(f"Exported to {export_onnx(predictor.model, cfg)}")
+
+
+def profiles_main(argv=None):
+    """
+    Report the latency and HRS metric deltas of the UniDet profiles.
+    """
+    parser = get_profiles_parser()
+    args = parser.parse_args(argv)
+
+    from hrsbench.models import unidet_profile_opts
+    from hrsbench.perf.variants import detection_task_dirs, report, run_variants
+
+    task_dirs = detection_task_dirs(args.image_root, args.seed)
+    if not task_dirs:
+        parser.error(f"no counting/spatial/size task directory for seed {args.seed} in {args.image_root}")
+    variants = [(profile, [*unidet_profile_opts(profile), *args.unidet_opts]) for profile in args.profiles]
+    report(run_variants(variants, task_dirs, args.limit or None))
+
+
+def merge_shards_main(argv=None):
+    """
+    Validate and merge the shard files of a sharded stage run.
+    """
+    args = get_merge_shards_parser().parse_args(argv)
+
+    from hrsbench.shards import ShardError, merge_shards
+
+    try:
+        output_path = merge_shards(args.shards, args.output)
+    except (ShardError, FileNotFoundError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Merged {len(args.shards)} shards into {output_path}")
+
+
+def serve_main(argv=None):
+    """
+    Start the evaluation daemon with warm models.
+    """
+    args = get_serve_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s %(name)s]: %(message)s")
+    _use_spawn()
+
+    from hrsbench.server import EvaluationService, serve
+
+    service = EvaluationService(
+        unidet_opts=_unidet_opts(args),
+        maskdino_opts=_maskdino_opts(args),
+        cache_dir=args.cache_dir,
+        cache_size_gb=args.cache_size_gb,
+        num_workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+        batch_size=args.batch_size,
+        render=args.render,
+        classes=args.classes,
+    )
+    try:
+        serve(service, socket_path=args.socket, host=args.host, port=args.port)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+COMMANDS = {
+    "eval": main,
+    "sweep": sweep_main,
+    "serve": serve_main,
+    "score": score_main,
+    "convert-weights": convert_weights_main,
+    "export-onnx": export_onnx_main,
+    "profiles": profiles_main,
+    "merge-shards": merge_shards_main,
+}
+
+
+def hrsbench_main(argv=None):
+    """
+    `hrsbench <command> ...` entry point dispatching to the commands above.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDS:
+        print(f"usage: hrsbench {{{','.join(COMMANDS)}}} ...", file=sys.stderr)
+        sys.exit(0 if argv and argv[0] in ("-h", "--help") else 2)
+    COMMANDS[argv[0]](argv[1:])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,164 @@
+"""
+Client of the `hrsbench serve` daemon.
+
+`evaluate` sends the evaluation to a running daemon and transparently falls back to
+an in-process run (`hrsbench.benchmark.run_benchmark`) when none is listening. The
+daemon address is taken from `$HRSBENCH_SERVER` (`unix:/path/to.sock` or
+`http://127.0.0.1:PORT`; `off` disables the daemon) and defaults to the Unix socket
+of `hrsbench.server.default_socket_path`.
+
+Scores returned by the daemon went through JSON, so per-level keys are strings.
+"""
+import http.client
+import json
+import logging
+import os
+import socket
+from pathlib import Path
+from typing import Any
+from urllib.parse import quote, urlparse
+
+logger = logging.getLogger(__name__)
+
+# evaluating a full image root takes a while
+_TIMEOUT = None
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float | None = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def server_address() -> str | None:
+    """Address of the daemon, or None when disabled through `HRSBENCH_SERVER=off`."""
+    address = os.environ.get("HRSBENCH_SERVER")
+    if address is None:
+        from hrsbench.server import default_socket_path
+
+        return f"unix:{default_socket_path()}"
+    if address.lower() in ("", "0", "off", "none"):
+        return None
+    return address
+
+
+def _connect(address: str, timeout: float | None = _TIMEOUT) -> http.client.HTTPConnection:
+    if address.startswith("unix:"):
+        return _UnixHTTPConnection(address[len("unix:"):], timeout=timeout)
+    url = urlparse(address if "://" in address else f"http://{address}")
+    return http.client.HTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+
+
+def _request(address: str, method: str, path: str, body: bytes | None = None, content_type: str = "application/json", timeout: float | None = _TIMEOUT) -> dict[str, Any]:
+    conn = _connect(address, timeout=timeout)
+    try:
+        conn.request(method, path, body=body, headers={"Content-Type": content_type} if body is not None else {})
+        response = conn.getresponse()
+        reply = json.loads(response.read())
+    finally:
+        conn.close()
+    if response.status == 404 and "error" in reply:
+        raise FileNotFoundError(reply["error"])
+    if response.status != 200:
+        raise RuntimeError(f"hrsbench server at {address} failed: {reply.get('error', response.reason)}")
+    return reply
+
+
+def ping(address: str | None = None, timeout: float = 1.0) -> dict[str, Any] | None:
+    """Health of the daemon at `address`, or None if nothing is listening there."""
+    address = address or server_address()
+    if address is None:
+        return None
+    try:
+        return _request(address, "GET", "/health", timeout=timeout)
+    except (OSError, ValueError, RuntimeError, http.client.HTTPException):
+        return None
+
+
+def evaluate_remote(address: str, request: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    """Send an `/evaluate` request (see `hrsbench.server`) and return the scores per task."""
+    return _request(address, "POST", "/evaluate", body=json.dumps(request).encode())["results"]
+
+
+def evaluate_image(task: str, name: str, data: bytes, address: str | None = None) -> dict[str, dict[str, Any]]:
+    """
+    Judge raw image bytes against their prompt on a running daemon.
+
+    Args:
+        task: HRS task of the image.
+        name: image file name, `<prompt_idx>_<level>_<prompt>.<ext>`, which identifies the prompt.
+        data: encoded image.
+
+    Returns:
+        dict[str, dict[str, Any]]: `{task: {"images": {name: correct}, "accuracy": 100.0 or 0.0}}`.
+    """
+    address = address or server_address()
+    if address is None:
+        raise RuntimeError("The hrsbench server is disabled through HRSBENCH_SERVER")
+    path = f"/images?task={quote(task)}&name={quote(name)}"
+    return _request(address, "POST", path, body=data, content_type="application/octet-stream")["results"]
+
+
+# options of `run_tasks` the daemon applies per request
+_REQUEST_OPTIONS = ("resume", "render")
+
+
+def _local_only_options(kwargs: dict[str, Any]) -> list[str]:
+    """Options of `kwargs` the daemon cannot apply: those not at their `run_tasks` default."""
+    import inspect
+
+    from hrsbench.benchmark import run_tasks
+
+    parameters = inspect.signature(run_tasks).parameters
+    local_only = []
+    for key, value in kwargs.items():
+        if key in _REQUEST_OPTIONS:
+            continue
+        default = parameters[key].default if key in parameters else inspect.Parameter.empty
+        # empty option lists and unset paths are all defaults
+        if value != default and (value or default):
+            local_only.append(key)
+    return local_only
+
+
+def evaluate(
+    image_root: str | Path,
+    method_name: str | None = None,
+    output_root: str | Path = "./output",
+    seed: int = 42,
+    use_server: bool = True,
+    **kwargs,
+) -> dict[str, dict[str, Any]]:
+    """
+    Evaluate an image root on the running daemon, or in process if there is none.
+
+    Keyword arguments are forwarded to `run_benchmark` for in-process runs. `resume` and
+    `render` are applied by the daemon too. Every other option (model options, cache,
+    worker pools, batching, `concurrent`, prompt classes, metrics) is fixed when the
+    daemon starts, so the daemon is bypassed when any of them differs from its
+    `run_tasks` default.
+    """
+    address = server_address() if use_server else None
+    local_only = _local_only_options(kwargs)
+    if local_only:
+        logger.info(f"Evaluating in process for {', '.join(local_only)}")
+    if address is not None and not local_only and ping(address):
+        logger.info(f"Evaluating on the hrsbench server at {address}")
+        return evaluate_remote(address, {
+            "image_root": str(Path(image_root).resolve()),
+            "method_name": method_name or Path(image_root).name,
+            "output_root": str(Path(output_root).resolve()),
+            "seed": seed,
+            "resume": kwargs.get("resume", False),
+            **({"render": kwargs["render"]} if "render" in kwargs else {}),
+        })
+
+    from hrsbench.benchmark import run_benchmark
+
+    return run_benchmark(image_root, method_name=method_name, output_root=output_root, seed=seed, **kwargs)
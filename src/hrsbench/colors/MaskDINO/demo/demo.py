@@ -7,7 +7,6 @@ python demo.py --config-file '/home/abdelrem/T2I_benchmark/codes/eval_metrics/co
 # Copyright (c) Facebook, Inc. and its affiliates.
 # Modified by Bowen Cheng from: https://github.com/facebookresearch/detectron2/blob/master/demo/demo.py
 import argparse
-import glob
 import multiprocessing as mp
 import os
 
@@ -16,23 +15,16 @@ import sys
 sys.path.insert(1, os.path.join(sys.path[0], '..'))
 # fmt: on
 
-import tempfile
-import time
-import warnings
-
-import cv2
-import numpy as np
-import tqdm
-
 from pathlib import Path
 
-from detectron2.config import get_cfg
-from detectron2.data.detection_utils import read_image
-from detectron2.projects.deeplab import add_deeplab_config
 from detectron2.utils.logger import setup_logger
 
-from maskdino import add_maskdino_config
-from predictor import VisualizationDemo
+from predictor import PRECISIONS, VisualizationDemo
+from hrsbench.cache import InferenceCache, model_fingerprint
+from hrsbench.cli import add_metrics_arguments
+from hrsbench.metrics import MetricsExporter
+from hrsbench.models import setup_maskdino_cfg
+from hrsbench.stages import PREFETCH, collect_images, run_segmentation
 
 
 # constants
@@ -42,13 +34,12 @@ MASKDINO_ROOT = Path(__file__).resolve().parent.parent
 
 def setup_cfg(args):
     # load config from file and command-line arguments
-    cfg = get_cfg()
-    add_deeplab_config(cfg)
-    add_maskdino_config(cfg)
-    cfg.merge_from_file(args.config_file)
-    cfg.merge_from_list(args.opts)
-    cfg.freeze()
-    return cfg
+    opts = list(args.opts)
+    if args.precision != "fp32":
+        opts += ["MODEL.PRECISION", args.precision]
+    if args.compile:
+        opts += ["MODEL.COMPILE.ENABLED", "True"]
+    return setup_maskdino_cfg(args.config_file, opts)
 
 
 def get_parser():
@@ -79,6 +70,62 @@ def get_parser():
         default=0.5,
         help="Minimum score for instance predictions to be shown",
     )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip images already committed to the journal of an interrupted run",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="Directory of a content-addressed cache of per-image model outputs (disabled by default)",
+    )
+    parser.add_argument(
+        "--cache-size-gb",
+        type=float,
+        default=20.0,
+        help="Size bound of the inference cache",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Run the model in this many CPU worker processes, each pinned to its share of the cores "
+        "(default: in this process)",
+    )
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        default=None,
+        help="Intra-op threads of each worker (default: its number of cores)",
+    )
+    parser.add_argument(
+        "--precision",
+        choices=PRECISIONS,
+        default="fp32",
+        help="fp32, or bf16 (the Swin backbone and transformer decoder under bf16 autocast)",
+    )
+    parser.add_argument(
+        "--compile",
+        action="store_true",
+        help="Run the Swin backbone compiled by AOTInductor for the most common padded input shapes "
+        "(compiled once, saved next to the weights)",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=PREFETCH,
+        help="Threads decoding and preprocessing the next images while the model runs (0: none)",
+    )
+    parser.add_argument(
+        "--num-shards",
+        type=int,
+        default=1,
+        help="Split the input by prompt index into this many shards and only process --shard-id; "
+        "the shard files are combined with `hrsbench merge-shards`",
+    )
+    parser.add_argument("--shard-id", type=int, default=0, help="Shard processed by this run, in [0, --num-shards)")
+    add_metrics_arguments(parser)
     parser.add_argument(
         "--opts",
         help="Modify config options using the command-line 'KEY VALUE' pairs",
@@ -92,56 +139,34 @@ if __name__ == "__main__":
     mp.set_start_method("spawn", force=True)
     args = get_parser().parse_args()
     setup_logger(name="fvcore")
+    setup_logger(name="hrsbench")
     logger = setup_logger()
     logger.info("Arguments: " + str(args))
 
     cfg = setup_cfg(args)
 
-    demo = VisualizationDemo(cfg)
-
-    if len(args.input) == 1:
-        args.input = glob.glob(os.path.expanduser(args.input[0]))
-        assert args.input, "The input path(s) was not found"
-    for path in tqdm.tqdm(args.input, disable=not args.output_base_dir):
-        if ("png" not in path) and ("jpg" not in path):
-            continue
-        if ("layout.jpg" in path) or ("layout.png" in path):
-            continue
-
-        # use PIL, to be consistent with evaluation
-        img = read_image(path, format="BGR")
-        start_time = time.time()
-        predictions = demo.run_on_image(img)
-        logger.info(
-            "{}: {} in {:.2f}s".format(
-                path,
-                "detected {} instances".format(len(predictions["instances"]))
-                if "instances" in predictions
-                else "finished",
-                time.time() - start_time,
-            )
+    demo = VisualizationDemo(cfg, parallel=args.workers > 0, num_workers=args.workers, num_threads=args.threads_per_worker)
+
+    cache = None
+    if args.cache_dir:
+        cache = InferenceCache(args.cache_dir, model_fingerprint(cfg), max_bytes=int(args.cache_size_gb * 1024**3))
+
+    exporter = None
+    if args.metrics_file or args.metrics_port is not None:
+        exporter = MetricsExporter(args.metrics_file, args.metrics_port, interval=args.metrics_interval)
+        exporter.start()
+    try:
+        run_segmentation(
+            demo,
+            collect_images(args.input, exclude=("layout.jpg", "layout.png")),
+            output_base_dir=args.output_base_dir,
+            score_thresh=args.confidence_threshold,
+            resume=args.resume,
+            cache=cache,
+            num_shards=args.num_shards,
+            shard_id=args.shard_id,
+            prefetch=args.prefetch,
         )
-
-        out_dir = Path(args.output_base_dir) / "color_detected_images"
-        os.makedirs(out_dir, exist_ok=True)
-        if os.path.isdir(out_dir):
-            assert os.path.isdir(out_dir), out_dir
-            print('save')
-            # os.makedirs(folder_name, exist_ok=True)
-            
-
-            # import pdb; pdb.set_trace()
-            instances = predictions["instances"].to('cpu')
-            # Eslam: Filter the output based on the confidence-score:
-            mask = predictions["instances"].scores >= 0.5
-            mask = mask.nonzero()
-            mask = mask.to('cpu')
-
-            img_name = Path(path).stem
-            # loop on predictions:
-            for mask_idx in range(len(mask)):
-                filtered_masks = instances.pred_masks[mask[mask_idx].to('cpu')][0]
-                filtered_classes = instances.pred_classes[mask[mask_idx]]
-                filtered_scores = instances.scores[mask[mask_idx]]
-                out_filename = os.path.join(out_dir, img_name+"_mask_"+str(mask_idx)+"_"+str(filtered_classes.cpu().item())+".png")
-                cv2.imwrite(out_filename, filtered_masks.cpu().numpy()*255)
+    finally:
+        if exporter is not None:
+            exporter.stop()
@@ -10,19 +10,70 @@ import torch
 import os
 
 from detectron2.data import MetadataCatalog
-from detectron2.engine.defaults import DefaultPredictor
 from detectron2.utils.video_visualizer import VideoVisualizer
 from detectron2.utils.visualizer import ColorMode, Visualizer
 
+from hrsbench.weights import build_predictor
+from hrsbench.workers import available_cores, init_worker, split_cores
+
+
+PRECISIONS = ("fp32", "bf16")
+# config subtrees that change the compiled backbone; the weights are hashed separately
+COMPILED_GRAPH_KEYS = ("BACKBONE", "SWIN")
+
+
+def prepare_bf16(model):
+    """
+    Run the Swin backbone and the transformer decoder of `model` under bf16 autocast
+    (see `hrsbench.autocast`). The pixel decoder (`MaskDINOEncoder`, whose deformable
+    attention casts its inputs to fp32) runs outside autocast, and inside the decoder
+    the deformable cross-attention, the box MLP (reference point refinement) and the
+    class head stay in fp32, so reference points, query selection and scores do not
+    lose precision.
+    """
+    from hrsbench.autocast import Autocast, Float32, check_bf16, wrap_modules
+    from maskdino.modeling.pixel_decoder.ops.modules import MSDeformAttn
+
+    device_type = check_bf16(model)
+    decoder = model.sem_seg_head.predictor
+    fp32_modules = [m for m in decoder.modules() if isinstance(m, MSDeformAttn)]
+    fp32_modules += [decoder._bbox_embed, decoder.class_embed]
+    wrap_modules(decoder, fp32_modules, Float32, device_type)
+    model.backbone = Autocast(model.backbone, device_type)
+    model.sem_seg_head.predictor = Autocast(decoder, device_type)
+    return model
+
+
+def build_maskdino_predictor(cfg):
+    """
+    `build_predictor` prepared for inference: with MODEL.PRECISION bf16, see `prepare_bf16`;
+    with MODEL.COMPILE.ENABLED, the Swin backbone runs compiled for the most common padded
+    input shapes (see `hrsbench.compiled`).
+    """
+    if cfg.MODEL.PRECISION not in PRECISIONS:
+        raise ValueError("Unknown MODEL.PRECISION {!r}, expected one of {}".format(cfg.MODEL.PRECISION, PRECISIONS))
+    if cfg.MODEL.COMPILE.ENABLED and cfg.MODEL.PRECISION != "fp32":
+        raise ValueError("MODEL.COMPILE.ENABLED runs with MODEL.PRECISION fp32 only")
+    predictor = build_predictor(cfg)
+    if cfg.MODEL.PRECISION == "bf16":
+        prepare_bf16(predictor.model)
+    if cfg.MODEL.COMPILE.ENABLED:
+        from hrsbench.compiled import compile_backbone
+
+        compile_backbone(predictor.model, cfg, "maskdino", COMPILED_GRAPH_KEYS)
+    return predictor
+
 
 class VisualizationDemo(object):
-    def __init__(self, cfg, instance_mode=ColorMode.IMAGE, parallel=False):
+    def __init__(self, cfg, instance_mode=ColorMode.IMAGE, parallel=False, num_workers=None, num_threads=None):
         """
         Args:
             cfg (CfgNode):
             instance_mode (ColorMode):
             parallel (bool): whether to run the model in different processes from visualization.
                 Useful since the visualization logic can be slow.
+            num_workers (int): number of CPU worker processes when parallel and MODEL.DEVICE is cpu.
+            num_threads (int): intra-op threads of each CPU worker (default: its share of the cores).
         """
         self.metadata = MetadataCatalog.get(
             cfg.DATASETS.TEST[0] if len(cfg.DATASETS.TEST) else "__unused"
@@ -32,10 +83,10 @@ class VisualizationDemo(object):
 
         self.parallel = parallel
         if parallel:
-            num_gpu = torch.cuda.device_count()
-            self.predictor = AsyncPredictor(cfg, num_gpus=num_gpu)
+            num_gpu = torch.cuda.device_count() if cfg.MODEL.DEVICE != "cpu" else 0
+            self.predictor = AsyncPredictor(cfg, num_gpus=num_gpu, num_workers=num_workers, num_threads=num_threads)
         else:
-            self.predictor = DefaultPredictor(cfg)
+            self.predictor = build_maskdino_predictor(cfg)
 
     def run_on_image(self, image):
         """
@@ -139,14 +190,18 @@ class AsyncPredictor:
         pass
 
     class _PredictWorker(mp.Process):
-        def __init__(self, cfg, task_queue, result_queue):
+        def __init__(self, cfg, task_queue, result_queue, cores=None, num_threads=None):
             self.cfg = cfg
             self.task_queue = task_queue
             self.result_queue = result_queue
+            self.cores = cores
+            self.num_threads = num_threads
             super().__init__()
 
         def run(self):
-            predictor = DefaultPredictor(self.cfg)
+            if self.cores is not None:
+                init_worker(self.cores, self.num_threads)
+            predictor = build_maskdino_predictor(self.cfg)
 
             while True:
                 task = self.task_queue.get()
@@ -156,22 +211,31 @@ class AsyncPredictor:
                 result = predictor(data)
                 self.result_queue.put((idx, result))
 
-    def __init__(self, cfg, num_gpus: int = 1):
+    def __init__(self, cfg, num_gpus: int = 1, num_workers: int = None, num_threads: int = None):
         """
         Args:
             cfg (CfgNode):
             num_gpus (int): if 0, will run on CPU
+            num_workers (int): number of CPU worker processes when num_gpus is 0 (default 1).
+                The available cores are split evenly between them and each worker is pinned
+                to its share.
+            num_threads (int): intra-op threads of each CPU worker (default: its number of cores)
         """
-        num_workers = max(num_gpus, 1)
+        if num_gpus > 0:
+            num_workers = num_gpus
+            core_budgets = [None] * num_workers
+        else:
+            num_workers = max(num_workers or 1, 1)
+            core_budgets = split_cores(available_cores(), [None] * num_workers)
         self.task_queue = mp.Queue(maxsize=num_workers * 3)
         self.result_queue = mp.Queue(maxsize=num_workers * 3)
         self.procs = []
-        for gpuid in range(max(num_gpus, 1)):
+        for worker_id, cores in enumerate(core_budgets):
             cfg = cfg.clone()
             cfg.defrost()
-            cfg.MODEL.DEVICE = "cuda:{}".format(gpuid) if num_gpus > 0 else "cpu"
+            cfg.MODEL.DEVICE = "cuda:{}".format(worker_id) if num_gpus > 0 else "cpu"
             self.procs.append(
-                AsyncPredictor._PredictWorker(cfg, self.task_queue, self.result_queue)
+                AsyncPredictor._PredictWorker(cfg, self.task_queue, self.result_queue, cores, num_threads)
             )
 
         self.put_idx = 0
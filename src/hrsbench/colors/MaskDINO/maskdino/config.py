@@ -101,6 +101,15 @@ def add_maskdino_config(cfg):
     # you can use this config to override
     cfg.MODEL.MaskDINO.SIZE_DIVISIBILITY = 32
 
+    # 'fp32' or 'bf16': the Swin backbone and the transformer decoder under bf16 autocast, see demo/predictor.py
+    cfg.MODEL.PRECISION = "fp32"
+    # static-shape AOTInductor Swin backbone, see hrsbench/compiled.py
+    cfg.MODEL.COMPILE = CN()
+    cfg.MODEL.COMPILE.ENABLED = False
+    cfg.MODEL.COMPILE.CACHE_DIR = ""  # where the compiled packages are saved (default: compiled/ next to the weights)
+    cfg.MODEL.COMPILE.MAX_SHAPES = 2  # padded input shapes compiled; other shapes run eager
+    cfg.MODEL.COMPILE.MIN_COUNT = 2  # inputs of a shape seen before it is compiled
+
     # pixel decoder config
     cfg.MODEL.SEM_SEG_HEAD.MASK_DIM = 256
     # adding transformer in pixel decoder
@@ -5,9 +5,9 @@ import os.path
 from typing import Any
 from pathlib import Path
 
-import cv2
 import numpy as np
 from hrsbench import HRSBENCH_ROOT
+from hrsbench.masks import read_mask
 
 
 def detect_color_hue_based(hue_value):
@@ -154,9 +154,76 @@ def load_pred(pred_masks_names, data_len, gt_data):
     return img_masks_names_dict
 
 
+def count_correct_objs(gt_entry: dict[str, Any], img: np.ndarray, img_masks_names: list[str], in_masks_folder: str) -> int:
+    """Number of the expected objects of one BGR image found by a mask of their class with their color."""
+    import cv2
+
+    gt_objs = gt_entry["objs"]
+    gt_colors = gt_entry["colors"]
+    true_counter = 0
+    hsv_frame = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    hsv_frame = hsv_frame[:, :, 0]
+    for obj_idx in range(len(gt_objs)):  # loop on GT objs
+        # 1) make sure the classes are correct:
+        gt_obj_id = coco_class_idx[gt_objs[obj_idx]]
+        print(f"  Looking for {gt_objs[obj_idx]} (class {gt_obj_id})")
+
+        img_masks_name_per_class = []
+        detected_classes = set()
+        for img_masks_name in img_masks_names:
+            try:
+                detected_class_id = int(img_masks_name.split("_")[-1].split(".")[0])
+                detected_classes.add(detected_class_id)
+                if detected_class_id == gt_obj_id:
+                    img_masks_name_per_class.append(img_masks_name)
+            except (ValueError, IndexError):
+                print(f"  Warning: Could not parse class ID from {img_masks_name}")
+
+        print(f"  Detected classes: {sorted(detected_classes)}")
+        print(f"  Matching masks for {gt_objs[obj_idx]}: {len(img_masks_name_per_class)}")
+
+        if len(img_masks_name_per_class):
+            # found some predictions match GT class
+            # 2) make sure the color is correct:
+            for i in range(len(img_masks_name_per_class)):
+                mask = read_mask(os.path.join(in_masks_folder, img_masks_name_per_class[i]))
+                if mask is None:
+                    print(f"Warning: Could not load mask {img_masks_name_per_class[i]}")
+                    continue
+                mask = mask / 255.0
+                mask = mask.astype(np.uint8)  # [0->1]
+                hsv_frame_masked = np.multiply(hsv_frame, mask)
+                avg_hue = hsv_frame_masked.sum() / np.count_nonzero(
+                    hsv_frame_masked
+                )  # average hue component
+                detected_color = detect_color_hue_based(avg_hue)
+                if detected_color == gt_colors[obj_idx]:
+                    true_counter += 1
+                    break
+    return true_counter
+
+
+def image_correct(gt_entry: dict[str, Any], img_path: str, img_masks_names: list[str], in_masks_folder: str) -> bool:
+    """
+    Whether every expected object of one image has its prompt color, as counted by `cal_acc`.
+
+    Takes a raw JSONL entry, the generated image and the names of its masks in `in_masks_folder`.
+    """
+    import cv2
+
+    img = cv2.imread(img_path)
+    if img is None:
+        print(f"Warning: Could not load image {img_path}")
+        return False
+    return count_correct_objs(gt_entry, img, img_masks_names, in_masks_folder) == len(gt_entry["objs"])
+
+
 def cal_acc(
     gt_data, img_masks_names_dict, level, t2i_out_dir, in_masks_folder
 ):
+    # OpenCV is only needed to decode the generated images, masks are read with NumPy
+    import cv2
+
     true_counter = 0
     total_num_objs = 0
 
@@ -166,7 +233,6 @@ def cal_acc(
 
         gt_objs = gt_entry["objs"]
         total_num_objs += len(gt_objs)
-        gt_colors = gt_entry["colors"]
         prompt = gt_entry["prompt"]
         img_name = str(idx) + "_" + str(level) + "_" + prompt.replace(" ", "_")
         img = cv2.imread(os.path.join(t2i_out_dir, img_name) + ".jpg")
@@ -181,82 +247,21 @@ def cal_acc(
             continue
         
         print(f"Processing sample {idx}: {len(gt_objs)} objects, {len(img_masks_names_per_sample)} masks")
-        
-        hsv_frame = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        hsv_frame = hsv_frame[:, :, 0]
-        # import pdb; pdb.set_trace()
-        for obj_idx in range(len(gt_objs)):  # loop on GT objs
-            # 1) make sure the classes are correct:
-            gt_obj_id = coco_class_idx[gt_objs[obj_idx]]
-            print(f"  Looking for {gt_objs[obj_idx]} (class {gt_obj_id})")
-            
-            img_masks_name_per_class = []
-            detected_classes = set()
-            for img_masks_name in img_masks_names_per_sample:
-                try:
-                    detected_class_id = int(img_masks_name.split("_")[-1].split(".")[0])
-                    detected_classes.add(detected_class_id)
-                    if detected_class_id == gt_obj_id:
-                        img_masks_name_per_class.append(img_masks_name)
-                except (ValueError, IndexError):
-                    print(f"  Warning: Could not parse class ID from {img_masks_name}")
-            
-            print(f"  Detected classes: {sorted(detected_classes)}")
-            print(f"  Matching masks for {gt_objs[obj_idx]}: {len(img_masks_name_per_class)}")
-            
-            if len(img_masks_name_per_class):
-                # found some predictions match GT class
-                # 2) make sure the color is correct:
-                for i in range(len(img_masks_name_per_class)):
-                    mask = cv2.imread(
-                        os.path.join(in_masks_folder, img_masks_name_per_class[i]),
-                        cv2.IMREAD_GRAYSCALE,
-                    )
-                    if mask is None:
-                        print(f"Warning: Could not load mask {img_masks_name_per_class[i]}")
-                        continue
-                    mask = mask / 255.0
-                    mask = mask.astype(np.uint8)  # [0->1]
-                    hsv_frame_masked = np.multiply(hsv_frame, mask)
-                    avg_hue = hsv_frame_masked.sum() / np.count_nonzero(
-                        hsv_frame_masked
-                    )  # average hue component
-                    detected_color = detect_color_hue_based(avg_hue)
-                    if detected_color == gt_colors[obj_idx]:
-                        true_counter += 1
-                        break
+        true_counter += count_correct_objs(gt_entry, img, img_masks_names_per_sample, in_masks_folder)
         print(true_counter, "/", total_num_objs)
     return 100 * true_counter / total_num_objs
 
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(
-        description="Evaluate color classification accuracy using hue-based classifier"
-    )
-    parser.add_argument(
-        "--input_image_dir", 
-        type=str, 
-        required=True,
-        help="Path to the generated images directory"
-    )
-    
-    parser.add_argument(
-        "--input_mask_dir", 
-        type=str, 
-        required=True,
-        help="Path to the mask directory"
-    )
-    parser.add_argument(
-        "--gt_jsonl_path", 
-        type=str, 
-        default=f"{HRSBENCH_ROOT}/hrs_dataset/color.jsonl",
-        help="Path to ground truth JSONL file"
-    )
-    args = parser.parse_args()
-    
+def evaluate(input_image_dir: str, input_mask_dir: str, gt_jsonl_path: str = f"{HRSBENCH_ROOT}/hrs_dataset/color.jsonl") -> dict[str, Any]:
+    """
+    Score the MaskDINO color masks, print the summary and save it next to the mask directory.
+
+    Returns:
+        dict[str, Any]: per-level accuracy and its average.
+    """
     # Load GT:
-    gt_data = load_gt(jsonl_pth=args.gt_jsonl_path)
-    pred_masks_names = os.listdir(args.input_mask_dir)
+    gt_data = load_gt(jsonl_pth=gt_jsonl_path)
+    pred_masks_names = os.listdir(input_mask_dir)
 
     # Load Predictions:
     img_masks_names_dict = load_pred(
@@ -274,8 +279,8 @@ if __name__ == "__main__":
             gt_data,
             img_masks_names_dict,
             level=level,
-            t2i_out_dir=args.input_image_dir,
-            in_masks_folder=args.input_mask_dir,
+            t2i_out_dir=input_image_dir,
+            in_masks_folder=input_mask_dir,
         )
         avg_acc.append(acc)
         acc_per_level[level].append(acc)
@@ -288,7 +293,7 @@ if __name__ == "__main__":
     all_results = {"acc": acc_per_level, "avg": sum(avg_acc) / len(avg_acc)}
     
     # Save results to JSON file
-    result_dir = Path(args.input_mask_dir).resolve().parent
+    result_dir = Path(input_mask_dir).resolve().parent
     result_path = os.path.join(result_dir, "color_results.json")
     with open(result_path, "w") as f:
         json.dump(all_results, f, sort_keys=True, indent=4)
@@ -309,3 +314,33 @@ if __name__ == "__main__":
 
     print(f"\nResults saved to {result_path}")
     print("Done!")
+
+    return all_results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Evaluate color classification accuracy using hue-based classifier"
+    )
+    parser.add_argument(
+        "--input_image_dir", 
+        type=str, 
+        required=True,
+        help="Path to the generated images directory"
+    )
+    
+    parser.add_argument(
+        "--input_mask_dir", 
+        type=str, 
+        required=True,
+        help="Path to the mask directory"
+    )
+    parser.add_argument(
+        "--gt_jsonl_path", 
+        type=str, 
+        default=f"{HRSBENCH_ROOT}/hrs_dataset/color.jsonl",
+        help="Path to ground truth JSONL file"
+    )
+    args = parser.parse_args()
+
+    evaluate(args.input_image_dir, args.input_mask_dir, args.gt_jsonl_path)
@@ -0,0 +1,128 @@
+"""
+Static-shape compiled backbones, for MODEL.COMPILE.ENABLED inference.
+
+HRS images of a run almost all have the generator's fixed resolution, so the padded
+batches fed to a backbone almost all have the same shape. `CompiledBackbone` buckets
+its inputs by that shape: the first `MAX_SHAPES` shapes seen `MIN_COUNT` times are
+exported with `torch.export` and compiled ahead of time by AOTInductor into one
+`.pt2` package each, specialized to that exact shape. Later inputs of a compiled
+shape run the package; any other shape runs the eager backbone, as does a shape
+whose export or compilation fails.
+
+Packages are saved in `compiled_dir(cfg, ...)`, keyed by the weights, the backbone
+architecture, the torch version and the device, and loaded in milliseconds by later
+runs and worker processes. Compiling a shape takes minutes, once.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+import torch
+from torch import nn
+
+from hrsbench.cache import weights_digest
+
+logger = logging.getLogger(__name__)
+
+
+def compiled_dir(cfg, name: str, graph_keys) -> Path:
+    """
+    Directory of the compiled packages of `cfg`: `<name>-<hash>` under
+    MODEL.COMPILE.CACHE_DIR (default: `compiled/` next to the weights), where the hash
+    covers the weights content, the `graph_keys` subtrees of cfg.MODEL, the torch
+    version and the device type.
+    """
+    h = hashlib.sha256(weights_digest(cfg.MODEL.WEIGHTS).encode())
+    for key in graph_keys:
+        h.update(f"{key}={cfg.MODEL[key]}".encode())
+    h.update(f"torch={torch.__version__} device={torch.device(cfg.MODEL.DEVICE).type}".encode())
+    root = Path(cfg.MODEL.COMPILE.CACHE_DIR) if cfg.MODEL.COMPILE.CACHE_DIR else Path(cfg.MODEL.WEIGHTS).parent / "compiled"
+    return root / f"{name}-{h.hexdigest()[:16]}"
+
+
+class CompiledBackbone(nn.Module):
+    """
+    Drop-in for a detectron2 backbone that runs AOTInductor packages of it for the
+    padded input shapes it was compiled for, and the eager backbone otherwise.
+    """
+
+    def __init__(self, backbone: nn.Module, package_dir: str | Path, max_shapes: int = 2, min_count: int = 2):
+        super().__init__()
+        self.backbone = backbone
+        self.package_dir = Path(package_dir)
+        self.max_shapes = max_shapes
+        self.min_count = min_count
+        # padded input shape -> compiled package, or None for a shape that failed to compile
+        self.packages = {}
+        self.counts = Counter()
+        self.compiled_calls = 0
+        self.eager_calls = 0
+
+    def __getattr__(self, name):
+        try:
+            return super().__getattr__(name)
+        except AttributeError:
+            return getattr(self.backbone, name)
+
+    def output_shape(self):
+        return self.backbone.output_shape()
+
+    def _package_path(self, shape) -> Path:
+        return self.package_dir / ("x".join(str(s) for s in shape) + ".pt2")
+
+    def _compile(self, x, path: Path):
+        logger.info(f"Compiling the backbone for inputs of shape {tuple(x.shape)}; this takes a few minutes, once")
+        program = torch.export.export(self.backbone, (x,))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # AOTInductor only writes to paths ending in .pt2
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.stem}.", suffix=".pt2")
+        os.close(fd)
+        try:
+            torch._inductor.aoti_compile_and_package(program, package_path=tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        logger.info(f"Saved the compiled backbone to {path}")
+
+    def _package(self, x):
+        shape = tuple(x.shape)
+        if shape in self.packages:
+            return self.packages[shape]
+        if len(self.packages) >= self.max_shapes:
+            return None
+        self.counts[shape] += 1
+        path = self._package_path(shape)
+        if not path.is_file() and self.counts[shape] < self.min_count:
+            return None
+        try:
+            if not path.is_file():
+                self._compile(x, path)
+            package = torch._inductor.aoti_load_package(str(path))
+        except Exception as e:
+            logger.warning(f"Could not compile the backbone for inputs of shape {shape}, running it eager: {e}")
+            package = None
+        self.packages[shape] = package
+        return package
+
+    def forward(self, x):
+        package = None if self.backbone.training or torch.is_grad_enabled() else self._package(x)
+        if package is None:
+            self.eager_calls += 1
+            return self.backbone(x)
+        self.compiled_calls += 1
+        return package(x)
+
+
+def compile_backbone(model: nn.Module, cfg, name: str, graph_keys):
+    """Replace the backbone of `model` by a `CompiledBackbone` set up from MODEL.COMPILE of `cfg`."""
+    model.backbone = CompiledBackbone(
+        model.backbone,
+        compiled_dir(cfg, name, graph_keys),
+        max_shapes=cfg.MODEL.COMPILE.MAX_SHAPES,
+        min_count=cfg.MODEL.COMPILE.MIN_COUNT,
+    )
+    return model
@@ -317,25 +317,25 @@ def cal_acc(gt_objs: list[dict[str, Any]], pred_objs: dict[str, dict[int, dict[s
     acc = 100 * (true_count / total_count) if total_count > 0 else 0.0
     return acc
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Calculate spatial relation accuracy.")
-    parser.add_argument(
-        "--in_pkl_path", 
-        type=str, 
-        required=True,
-        help="Path to the input pickle file."
-    )
-    parser.add_argument(
-        "--gt_jsonl_path", 
-        type=str, 
-        default=f"{HRSBENCH_ROOT}/hrs_dataset/spatial.jsonl",
-        help="Path to the ground truth JSONL file.",
-    )
-    args = parser.parse_args()
+def image_correct(gt_entry: dict[str, Any], pred_entry: dict[int, list[Any]]) -> bool:
+    """
+    Whether one image satisfies its spatial relation prompt, as counted by `cal_acc`.
+
+    Takes a raw JSONL entry and a raw pickle entry.
+    """
+    gt = convert_gt_format([gt_entry])
+    return cal_acc(gt, convert_pred_format({"0": pred_entry}), gt[0]["level"]) == 100
+
+def evaluate(in_pkl_path: str, gt_jsonl_path: str = f"{HRSBENCH_ROOT}/hrs_dataset/spatial.jsonl") -> dict[str, Any]:
+    """
+    Score a UniDet spatial pickle, print the summary and save it next to the pickle.
 
+    Returns:
+        dict[str, Any]: per-level accuracy and its average.
+    """
     # Load data
-    gt_data_raw = load_gt(jsonl_path=args.gt_jsonl_path)
-    pred_data_raw = load_pred(pkl_pth=args.in_pkl_path)
+    gt_data_raw = load_gt(jsonl_path=gt_jsonl_path)
+    pred_data_raw = load_pred(pkl_pth=in_pkl_path)
     
     # Convert formats
     gt_data = convert_gt_format(gt_data_raw)
@@ -367,7 +367,7 @@ if __name__ == "__main__":
     }
     
     # Save results to JSON file
-    result_path = args.in_pkl_path.replace('.pkl', '_results.json')
+    result_path = in_pkl_path.replace('.pkl', '_results.json')
     with open(result_path, 'w') as f:
         json.dump(all_results, f, sort_keys=True, indent=4)
 
@@ -389,3 +389,24 @@ if __name__ == "__main__":
     
     print(f"\nResults saved to: {result_path}")
     print("Done!")
+
+    return all_results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calculate spatial relation accuracy.")
+    parser.add_argument(
+        "--in_pkl_path", 
+        type=str, 
+        required=True,
+        help="Path to the input pickle file."
+    )
+    parser.add_argument(
+        "--gt_jsonl_path", 
+        type=str, 
+        default=f"{HRSBENCH_ROOT}/hrs_dataset/spatial.jsonl",
+        help="Path to the ground truth JSONL file.",
+    )
+    args = parser.parse_args()
+
+    evaluate(args.in_pkl_path, args.gt_jsonl_path)
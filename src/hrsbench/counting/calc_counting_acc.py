@@ -76,6 +76,11 @@ def compare_entry(gt_entry: dict[str, Any], pred_entry: dict[int, list[Any]]) ->
 
     return true_pos, false_pos, false_neg
 
+def image_correct(gt_entry: dict[str, Any], pred_entry: dict[int, list[Any]]) -> bool:
+    """Whether one image has exactly the expected counts (no false positive or negative)."""
+    _, false_pos, false_neg = compare_entry(gt_entry, pred_entry)
+    return false_pos == 0 and false_neg == 0
+
 def calc_accuracy(gt_data: list[dict[str, Any]], pred_data: dict[str, dict[int, list[Any]]], level : int) -> tuple[float, float]:
     """
     Calculate precision and recall based on ground truth and predicted data. Only consider objects at the given level.
@@ -105,24 +110,15 @@ def calc_accuracy(gt_data: list[dict[str, Any]], pred_data: dict[str, dict[int,
 
     return precision, recall
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Calculate counting accuracy.")
-    parser.add_argument(
-        "--in_pkl_path", 
-        type=str, 
-        required=True,
-        help="Path to the input pickle file."
-    )
-    parser.add_argument(
-        "--gt_jsonl_path", 
-        type=str, 
-        default=f"{HRSBENCH_ROOT}/hrs_dataset/counting.jsonl",
-        help="Path to the ground truth JSONL file.",
-    )
-    args = parser.parse_args()
+def evaluate(in_pkl_path: str, gt_jsonl_path: str = f"{HRSBENCH_ROOT}/hrs_dataset/counting.jsonl") -> dict[str, Any]:
+    """
+    Score a UniDet counting pickle, print the summary and save it next to the pickle.
 
-    gt_data = load_gt(jsonl_path=args.gt_jsonl_path)
-    pred_data = load_pred(pkl_pth=args.in_pkl_path)
+    Returns:
+        dict[str, Any]: per-level precision/recall/F1 and their averages.
+    """
+    gt_data = load_gt(jsonl_path=gt_jsonl_path)
+    pred_data = load_pred(pkl_pth=in_pkl_path)
 
     NUM_LEVEL = 3
     # Initialize result storage
@@ -176,7 +172,7 @@ if __name__ == "__main__":
     }
 
     # Save results to JSON file
-    result_path = args.in_pkl_path.replace('.pkl', '_results.json')
+    result_path = in_pkl_path.replace('.pkl', '_results.json')
     with open(result_path, "w") as f:
         json.dump(all_results, f, sort_keys=True, indent=4)
     
@@ -204,3 +200,24 @@ if __name__ == "__main__":
     
     print(f"\nResults saved to: {result_path}")
     print("Done!")
+
+    return all_results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calculate counting accuracy.")
+    parser.add_argument(
+        "--in_pkl_path", 
+        type=str, 
+        required=True,
+        help="Path to the input pickle file."
+    )
+    parser.add_argument(
+        "--gt_jsonl_path", 
+        type=str, 
+        default=f"{HRSBENCH_ROOT}/hrs_dataset/counting.jsonl",
+        help="Path to the ground truth JSONL file.",
+    )
+    args = parser.parse_args()
+
+    evaluate(args.in_pkl_path, args.gt_jsonl_path)
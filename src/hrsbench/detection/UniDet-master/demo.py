@@ -1,21 +1,17 @@
 # (c) Facebook, Inc. and its affiliates. All Rights Reserved
 import argparse
-import glob
 import multiprocessing as mp
-import os
-import pickle
-import time
 
-import cv2
-import numpy as np
-import tqdm
-from detectron2.config import get_cfg
-from detectron2.data.detection_utils import read_image
 from detectron2.utils.logger import setup_logger
 from pathlib import Path
 
-from unidet.config import add_unidet_config
-from unidet.predictor import UnifiedVisualizationDemo
+from unidet.predictor import BACKENDS, PRECISIONS, UnifiedVisualizationDemo
+from hrsbench.cache import InferenceCache, model_fingerprint
+from hrsbench.cli import add_metrics_arguments
+from hrsbench.metrics import MetricsExporter
+from hrsbench.models import UNIDET_PROFILES, setup_unidet_cfg, unidet_profile_opts
+from hrsbench.render import render_spec
+from hrsbench.stages import PREFETCH, collect_images, run_detection
 
 # constants
 WINDOW_NAME = "Unified detections"
@@ -24,19 +20,16 @@ UNIDET_ROOT = Path(__file__).resolve().parent
 
 def setup_cfg(args):
     # load config from file and command-line arguments
-    cfg = get_cfg()
-    add_unidet_config(cfg)
-    cfg.merge_from_file(args.config_file)
-    cfg.merge_from_list(args.opts)
-    # Set score_threshold for builtin models
-    cfg.MODEL.RETINANET.SCORE_THRESH_TEST = args.confidence_threshold
-    cfg.MODEL.ROI_HEADS.SCORE_THRESH_TEST = args.confidence_threshold
-    cfg.MODEL.PANOPTIC_FPN.COMBINE.INSTANCES_CONFIDENCE_THRESH = (
-        args.confidence_threshold
-    )
-    cfg.MULTI_DATASET.UNIFIED_LABEL_FILE = str(UNIDET_ROOT / cfg.MULTI_DATASET.UNIFIED_LABEL_FILE)
-    cfg.freeze()
-    return cfg
+    opts = [*unidet_profile_opts(args.profile), *args.opts]
+    if args.backend != "pytorch":
+        opts += ["MODEL.BACKEND", args.backend]
+    if args.precision != "fp32":
+        opts += ["MODEL.PRECISION", args.precision]
+    if args.calibration_dir:
+        opts += ["MODEL.QUANT.CALIBRATION_DIR", args.calibration_dir]
+    if args.compile:
+        opts += ["MODEL.COMPILE.ENABLED", "True"]
+    return setup_unidet_cfg(args.config_file, opts, args.confidence_threshold)
 
 
 def get_parser():
@@ -77,6 +70,101 @@ def get_parser():
         "--pkl_pth",
         help="the path and the name of the pkl file which will store the detection output, to be used in evaluation",
     )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip images already committed to the journal of an interrupted run",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="Directory of a content-addressed cache of per-image model outputs (disabled by default)",
+    )
+    parser.add_argument(
+        "--cache-size-gb",
+        type=float,
+        default=20.0,
+        help="Size bound of the inference cache",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Run the model in this many CPU worker processes, each pinned to its share of the cores "
+        "(default: in this process)",
+    )
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        default=None,
+        help="Intra-op threads of each worker (default: its number of cores)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="Images per forward of the in-process model (not combined with --workers)",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=tuple(UNIDET_PROFILES),
+        default="accurate",
+        help="Speed/accuracy profile: test size, RPN proposal budgets and detections per image (--opts override it)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="pytorch",
+        help="Runtime of the backbone, RPN head and box heads: pytorch or onnxruntime (CPU, exported to ONNX "
+        "on first use next to the weights)",
+    )
+    parser.add_argument(
+        "--precision",
+        choices=PRECISIONS,
+        default="fp32",
+        help="fp32, int8 (CPU post-training quantization, calibrated once on --calibration-dir), or bf16 "
+        "(the backbone, RPN head and box heads under bf16 autocast)",
+    )
+    parser.add_argument(
+        "--calibration-dir",
+        default=None,
+        help="Directory (or glob) of HRS images to calibrate the int8 model on",
+    )
+    parser.add_argument(
+        "--compile",
+        action="store_true",
+        help="Run the backbone and FPN compiled by AOTInductor for the most common padded input shapes "
+        "(compiled once, saved next to the weights)",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=PREFETCH,
+        help="Threads decoding and preprocessing the next images while the model runs (0: none)",
+    )
+    parser.add_argument(
+        "--render",
+        type=render_spec,
+        default="all",
+        help="Images that get a visualization: all, none, first:N, every:K or failures (images the scorer "
+        "of --task judges wrong)",
+    )
+    parser.add_argument(
+        "--classes",
+        choices=("prompt", "all"),
+        default="all",
+        help="Classes to keep: all (the full vocabulary) or prompt (those the prompt of each image of --task "
+        "expects, dropping the others before NMS)",
+    )
+    parser.add_argument(
+        "--num-shards",
+        type=int,
+        default=1,
+        help="Split the input by prompt index into this many shards and only process --shard-id; "
+        "the shard files are combined with `hrsbench merge-shards`",
+    )
+    parser.add_argument("--shard-id", type=int, default=0, help="Shard processed by this run, in [0, --num-shards)")
+    add_metrics_arguments(parser)
     parser.add_argument(
         "--opts",
         help="Modify config options using the command-line 'KEY VALUE' pairs",
@@ -88,95 +176,49 @@ def get_parser():
 
 if __name__ == "__main__":
     mp.set_start_method("spawn", force=True)
-    args = get_parser().parse_args()
+    parser = get_parser()
+    args = parser.parse_args()
+    if args.classes == "prompt" and args.task is None:
+        parser.error("--classes prompt needs --task")
     setup_logger(name="fvcore")
+    setup_logger(name="hrsbench")
     logger = setup_logger()
 
     logger.info("Arguments: " + str(args))
 
     cfg = setup_cfg(args)
 
-    demo = UnifiedVisualizationDemo(cfg)
-
-    output_lst_dict = {}
-    if len(args.input) == 1:
-        # import pdb; pdb.set_trace()
-        args.input = glob.glob(os.path.expanduser(args.input[0]))
-        assert args.input, "The input path(s) was not found"
-    for path in tqdm.tqdm(args.input, disable=not args.output_base_dir):
-        if ("png" not in path) and ("jpg" not in path):
-            continue
-        if ("layout" in path):
-            continue
-        # img_name = path.split("/")[-1].split(".")[0]
-        # if int(img_name.split("_")[0]) > 200 or int(img_name.split("_")[0]) < 100: continue
-        # use PIL, to be consistent with evaluation
-        img = read_image(path, format="BGR")
-        start_time = time.time()
-        predictions, visualized_output = demo.run_on_image(img)
-
-        pred_objs_cord = predictions["instances"].pred_boxes.tensor.cpu().numpy()
-        pred_objs_cls_name = np.array(
-            [
-                demo.metadata.thing_classes[cls_id]
-                for cls_id in predictions["instances"].pred_classes.cpu().numpy()
-            ]
-        )
-        pred_objs_cls_name = np.reshape(pred_objs_cls_name, (-1, 1))
-        pred_objs = np.hstack((pred_objs_cord, pred_objs_cls_name))
-        if len(pred_objs) > 0:  # handle the case of empty predictions
-            # Remove repeated cord
-            # pred_filtered = {0: [pred_objs[0]]}
-            pred_filtered = {}
-            for idx in range(pred_objs.shape[0]):
-                found = False
-                for k, v in pred_filtered.items():
-                    if (
-                        pred_objs[idx][0:4].astype(float).astype(int)
-                        == v[0][0:4].astype(float).astype(int)
-                    ).all():
-                        found = True
-                        pred_filtered[k].append(pred_objs[idx])
-                        break
-                if not found:
-                    pred_filtered[idx] = [pred_objs[idx]]
-        else:
-            pred_filtered = {0: [[0, 0, 0, 0, ""]]}
-
-        img_name = path.split("/")[-1].split(".")[0]
-
-        img_idx = Path(path).stem.split("_")[0]
-        # level = int(Path(path).stem.split("_")[1])
+    demo = UnifiedVisualizationDemo(
+        cfg,
+        parallel=args.workers > 0,
+        num_workers=args.workers,
+        num_threads=args.threads_per_worker,
+        batch_size=args.batch_size,
+    )
 
-        if img_idx not in output_lst_dict.keys():
-            output_lst_dict[img_idx] = {}
-        output_lst_dict[img_idx] = pred_filtered
-        # output_lst_dict[img_idx]["level"] = level
-        # with open(args.pkl_pth, 'wb') as f:
-        #     pickle.dump(output_lst_dict, f)
-        # assert False
-        logger.info(
-            "{}: {} in {:.2f}s".format(
-                path,
-                "detected {} instances".format(len(predictions["instances"]))
-                if "instances" in predictions
-                else "finished",
-                time.time() - start_time,
-            )
+    cache = None
+    if args.cache_dir:
+        cache = InferenceCache(args.cache_dir, model_fingerprint(cfg), max_bytes=int(args.cache_size_gb * 1024**3))
+
+    exporter = None
+    if args.metrics_file or args.metrics_port is not None:
+        exporter = MetricsExporter(args.metrics_file, args.metrics_port, interval=args.metrics_interval)
+        exporter.start()
+    try:
+        run_detection(
+            demo,
+            collect_images(args.input),
+            task=args.task,
+            output_base_dir=args.output_base_dir,
+            pkl_path=args.pkl_pth,
+            resume=args.resume,
+            cache=cache,
+            num_shards=args.num_shards,
+            shard_id=args.shard_id,
+            prefetch=args.prefetch,
+            render=args.render,
+            classes=args.classes,
         )
-        out_dir = os.path.join(args.output_base_dir, f"{args.task}_detected_images")
-        os.makedirs(out_dir, exist_ok=True)
-        if os.path.isdir(out_dir):
-            assert os.path.isdir(out_dir), out_dir
-            out_filename = os.path.join(out_dir, os.path.basename(path))
-        else:
-            assert len(args.input) == 1, (
-                "Please specify a directory with args.output_base_dir"
-            )
-            out_filename = out_dir
-        visualized_output.save(out_filename)
-
-
-    with open(args.pkl_pth, "wb") as f:
-        pickle.dump(output_lst_dict, f)
-
+    finally:
+        if exporter is not None:
+            exporter.stop()
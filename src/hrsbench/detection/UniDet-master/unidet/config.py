@@ -25,6 +25,18 @@ def add_unidet_config(cfg):
     _C.MODEL.RESNETS.AVG_DOWN = False
     _C.MODEL.RESNETS.RADIX = 1
     _C.MODEL.RESNETS.BOTTLENECK_WIDTH = 64
+    _C.MODEL.FOLD_BN = False # fold the batch norms into the preceding convs at inference, see unidet/modeling/fold_bn.py
+    _C.MODEL.BACKEND = 'pytorch' # 'pytorch' or 'onnxruntime' (CPU), see unidet/modeling/onnx_backend.py
+    _C.MODEL.PRECISION = 'fp32' # 'fp32', 'int8' (CPU, post-training quantization, see unidet/modeling/quantize.py) or 'bf16' (autocast, see unidet/modeling/bf16.py)
+    _C.MODEL.QUANT = CN()
+    _C.MODEL.QUANT.CALIBRATION_DIR = '' # directory (or glob) of HRS images the int8 activation ranges are calibrated on
+    _C.MODEL.QUANT.NUM_CALIBRATION_IMAGES = 32
+    _C.MODEL.COMPILE = CN() # static-shape AOTInductor backbone/FPN, see hrsbench/compiled.py
+    _C.MODEL.COMPILE.ENABLED = False
+    _C.MODEL.COMPILE.CACHE_DIR = '' # where the compiled packages are saved (default: compiled/ next to the weights)
+    _C.MODEL.COMPILE.MAX_SHAPES = 2 # padded input shapes compiled; other shapes run eager
+    _C.MODEL.COMPILE.MIN_COUNT = 2 # inputs of a shape seen before it is compiled
+    _C.MODEL.ROI_BOX_CASCADE_HEAD.NUM_TEST_STAGES = 0 # run only the first k cascade stages at inference (0: all)
 
     _C.MULTI_DATASET = CN()
     _C.MULTI_DATASET.ENABLED = False
@@ -39,6 +51,7 @@ def add_unidet_config(cfg):
     _C.MULTI_DATASET.CAS_LAMBDA = 1. # Class aware sampling weight from https://arxiv.org/abs/2005.08455, not used in this project
     _C.MULTI_DATASET.UNIFIED_NOVEL_CLASSES_EVAL = False # zero-shot cross dataset evaluation
     _C.MULTI_DATASET.MATCH_NOVEL_CLASSES_FILE = '' 
+    _C.MULTI_DATASET.INFERENCE_DATASET = '' # inference-only model keeping the classifier of this dataset only (see hrsbench.weights.prune_unidet)
     
 
     _C.SOLVER.RESET_ITER = False # used when loading a checkpoint for finetuning
@@ -28,7 +28,12 @@ class DropBlock2D(RFConv2d):
 
 class SplAtConv2d(Module):
     """Split-Attention Conv2d
+
+    At inference with radix > 1, `forward` takes the fused path of `_forward_fused`;
+    set `fused` to False to run the reference split path.
     """
+    fused = True
+
     def __init__(self, in_channels, channels, kernel_size, stride=(1, 1), padding=(0, 0),
                  dilation=(1, 1), groups=1, bias=True,
                  radix=2, reduction_factor=4,
@@ -59,6 +64,8 @@ class SplAtConv2d(Module):
             self.dropblock = DropBlock2D(dropblock_prob, 3)
 
     def forward(self, x):
+        if self.fused and not self.training and self.radix > 1 and self.dropblock_prob == 0.0:
+            return self._forward_fused(x)
         x = self.conv(x)
         if self.use_bn:
             x = self.bn0(x)
@@ -92,6 +99,33 @@ class SplAtConv2d(Module):
             out = atten * x
         return out.contiguous()
 
+    def _forward_fused(self, x):
+        """
+        Inference path of `forward` for radix > 1 on a single (B, radix, C, H, W) view
+        of the conv output: the radix splits are pooled without summing the full maps,
+        the softmax runs over the radix axis of one (B, radix, C) tensor, and the splits
+        are reduced with their attention weights by in-place multiply-adds.
+        """
+        x = self.conv(x)
+        if self.use_bn:
+            x = self.bn0(x)
+        x = self.relu(x)
+
+        batch, rchannel, height, width = x.shape
+        x = x.view(batch, self.radix, rchannel // self.radix, height, width)
+        gap = x.mean((3, 4)).sum(1)[:, :, None, None]
+        gap = self.fc1(gap)
+        if self.use_bn:
+            gap = self.bn1(gap)
+        gap = self.relu(gap)
+
+        atten = F.softmax(self.fc2(gap).view(batch, self.radix, self.channels), dim=1)
+        atten = atten[:, :, :, None, None]
+        out = x[:, 0] * atten[:, 0]
+        for r in range(1, self.radix):
+            out.addcmul_(x[:, r], atten[:, r])
+        return out
+
 
 class rSoftMax(nn.Module):
     def __init__(self, radix, cardinality):
@@ -0,0 +1,24 @@
+"""
+bfloat16 autocast inference of UniDet.
+
+The ResNeSt backbone and FPN, the RPN head and the box heads of the cascade stages
+run under bf16 autocast (see `hrsbench.autocast`). Their outputs come back as fp32,
+so anchors and proposal selection, ROIAlign, the per-dataset classifiers and box
+regressors, box decoding, the score averaging over the cascade stages and NMS all
+stay in fp32.
+"""
+from hrsbench.autocast import Autocast, check_bf16
+
+__all__ = ['prepare_bf16']
+
+
+def prepare_bf16(model):
+    """Run the backbone, RPN head and cascade box heads of `model` under bf16 autocast."""
+    device_type = check_bf16(model)
+    model.backbone = Autocast(model.backbone, device_type)
+    rpn = model.proposal_generator
+    rpn.rpn_head = Autocast(rpn.rpn_head, device_type)
+    box_head = model.roi_heads.box_head
+    for k in range(len(box_head)):
+        box_head[k] = Autocast(box_head[k], device_type)
+    return model
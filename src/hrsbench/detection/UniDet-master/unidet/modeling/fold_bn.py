@@ -0,0 +1,55 @@
+"""
+Inference preparation: batch norms folded into the convolutions that feed them.
+
+The ResNeSt backbone (including `SplAtConv2d`), the FPN and the convs of the box
+head are trained with SyncBN. At inference a batch norm is the per-channel affine
+map of its running statistics, so it is frozen (`FrozenBatchNorm2d`) and merged
+into the preceding convolution:
+
+    w' = w * gamma / sqrt(var + eps)
+    b' = (b - mean) * gamma / sqrt(var + eps) + beta
+"""
+import torch
+from torch import nn
+
+from detectron2.layers import Conv2d, FrozenBatchNorm2d
+
+from .backbone.splat import SplAtConv2d
+
+__all__ = ['fold_batchnorm']
+
+
+def _fold(conv, norm):
+    scale = norm.weight * (norm.running_var + norm.eps).rsqrt()
+    bias = conv.bias if conv.bias is not None else torch.zeros_like(norm.running_mean)
+    conv.weight = nn.Parameter(conv.weight * scale.reshape(-1, 1, 1, 1), requires_grad=False)
+    conv.bias = nn.Parameter((bias - norm.running_mean) * scale + norm.bias, requires_grad=False)
+
+
+@torch.no_grad()
+def fold_batchnorm(model):
+    """
+    Freeze the batch norms of `model` and fold those that follow a convolution into it.
+
+    Covers detectron2 `Conv2d`s with a norm (stem, bottlenecks, shortcuts, FPN, box
+    head convs) and the `bn0` / `bn1` of `SplAtConv2d`. Only for inference: the folded
+    model cannot be trained anymore.
+
+    Returns:
+        int: the number of folded norms.
+    """
+    assert not model.training, "batch norms can only be folded at inference"
+    FrozenBatchNorm2d.convert_frozen_batchnorm(model)
+    num_folded = 0
+    for module in list(model.modules()):
+        if isinstance(module, SplAtConv2d) and module.use_bn:
+            _fold(module.conv, module.bn0)
+            _fold(module.fc1, module.bn1)
+            module.use_bn = False
+            del module.bn0, module.bn1
+            num_folded += 2
+        elif isinstance(module, Conv2d) and isinstance(module.norm, FrozenBatchNorm2d):
+            _fold(module, module.norm)
+            module.norm = None
+            num_folded += 1
+    return num_folded
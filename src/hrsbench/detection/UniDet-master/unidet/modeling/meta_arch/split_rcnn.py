@@ -24,10 +24,15 @@ class SplitClassifierRCNN(GeneralizedRCNN):
         self.num_datasets = len(self.datasets)
         self.dataset_name_to_id = {k: i for i, k in enumerate(self.datasets)}
         self.eval_dataset = 1  # Eslam
+        self.inference_only = bool(cfg.MULTI_DATASET.INFERENCE_DATASET)
+        if self.inference_only:
+            self.eval_dataset = self.dataset_name_to_id[cfg.MULTI_DATASET.INFERENCE_DATASET]
 
     def forward(self, batched_inputs):
         if not self.training:
             return self.inference(batched_inputs)
+        if self.inference_only:
+            raise RuntimeError("An inference-only UniDet (MULTI_DATASET.INFERENCE_DATASET) cannot be trained")
         images = self.preprocess_image(batched_inputs)
         gt_instances = [x["instances"].to(self.device) for x in batched_inputs]
         for i in range(len(gt_instances)):
@@ -57,8 +62,13 @@ class SplitClassifierRCNN(GeneralizedRCNN):
         images = self.preprocess_image(batched_inputs)
         features = self.backbone(images.tensor)
         proposals, _ = self.proposal_generator(images, features, None)
+        # optional per-image "allowed_classes": the class ids to keep, the others are dropped before NMS
+        allowed_classes = [x.get("allowed_classes") for x in batched_inputs]
+        if all(classes is None for classes in allowed_classes):
+            allowed_classes = None
         results, _ = self.roi_heads(
-            images, features, proposals, None, eval_dataset=self.eval_dataset)
+            images, features, proposals, None, eval_dataset=self.eval_dataset,
+            allowed_classes=allowed_classes)
         
         if do_postprocess:
             return GeneralizedRCNN._postprocess(
@@ -68,5 +78,7 @@ class SplitClassifierRCNN(GeneralizedRCNN):
 
     def set_eval_dataset(self, dataset_name):
         meta_datase_name = dataset_name[:dataset_name.find('_')]
+        if self.inference_only and self.dataset_name_to_id[meta_datase_name] != self.eval_dataset:
+            raise ValueError("This inference-only UniDet cannot evaluate {}".format(dataset_name))
         self.eval_dataset = \
             self.dataset_name_to_id[meta_datase_name]
@@ -0,0 +1,228 @@
+"""
+ONNX Runtime backend: the dense parts of UniDet exported to ONNX and run by ONNX Runtime.
+
+Three kinds of graphs are exported, once per checkpoint and architecture:
+
+    backbone.onnx       ResNeSt + FPN, padded image -> FPN levels
+    rpn_head.onnx       RPN head, FPN levels -> objectness logits and anchor deltas per level
+    box_head{k}.onnx    box head of cascade stage k, pooled ROI features -> box features
+
+The rest of the model stays in PyTorch, unchanged: normalization and padding of the
+images, anchors and proposal selection, ROIAlign, the per-dataset classifiers and
+box regressors, box decoding, the averaging of the cascade scores, NMS and the
+rescaling to the input size. So the outputs are the ones of the PyTorch model up to
+the float rounding of the ORT kernels, and the allowed classes of a prompt work the
+same way.
+"""
+import hashlib
+import inspect
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import torch
+from torch import nn
+
+from hrsbench.cache import weights_digest
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['onnx_dir', 'export_onnx', 'prepare_onnxruntime']
+
+OPSET = 17
+
+# config subtrees that change the exported graphs; the weights are hashed separately
+_GRAPH_KEYS = ('BACKBONE', 'RESNETS', 'FPN', 'ANCHOR_GENERATOR', 'ROI_BOX_HEAD', 'FOLD_BN')
+
+
+def onnx_dir(cfg):
+    """
+    Directory of the exported graphs of `cfg`: `onnx/unidet-<hash>` next to the weights,
+    where the hash covers the weights content and the architecture options.
+    """
+    h = hashlib.sha256(weights_digest(cfg.MODEL.WEIGHTS).encode())
+    for key in _GRAPH_KEYS:
+        h.update(f"{key}={cfg.MODEL[key]}".encode())
+    h.update(f"RPN.HEAD_NAME={cfg.MODEL.RPN.HEAD_NAME}".encode())
+    return Path(cfg.MODEL.WEIGHTS).parent / "onnx" / f"unidet-{h.hexdigest()[:16]}"
+
+
+class _BackboneGraph(nn.Module):
+    def __init__(self, backbone):
+        super().__init__()
+        self.backbone = backbone
+        self.names = list(backbone.output_shape())
+
+    def forward(self, image):
+        features = self.backbone(image)
+        return tuple(features[name] for name in self.names)
+
+
+class _RPNHeadGraph(nn.Module):
+    def __init__(self, rpn_head):
+        super().__init__()
+        self.rpn_head = rpn_head
+
+    def forward(self, *features):
+        logits, deltas = self.rpn_head(list(features))
+        return (*logits, *deltas)
+
+
+def _export(module, args, path, input_names, output_names, dynamic_axes):
+    # the TorchScript exporter: the dynamo one is the default from torch 2.9 on
+    kwargs = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+    torch.onnx.export(
+        module, args, str(path),
+        input_names=input_names, output_names=output_names, dynamic_axes=dynamic_axes,
+        opset_version=OPSET, do_constant_folding=True, **kwargs)
+
+
+def _write_graphs(model, out_dir):
+    backbone = model.backbone
+    rpn = model.proposal_generator
+    roi_heads = model.roi_heads
+    names = list(backbone.output_shape())
+
+    def axes(name):
+        return {0: 'batch', 2: f'{name}_height', 3: f'{name}_width'}
+
+    # a padded image of a typical size; height and width are dynamic axes
+    divisibility = max(backbone.size_divisibility, 32)
+    side = (512 + divisibility - 1) // divisibility * divisibility
+    image = torch.zeros(1, 3, side, side)
+    _export(
+        _BackboneGraph(backbone), (image,), out_dir / 'backbone.onnx',
+        ['image'], names, {'image': axes('image'), **{name: axes(name) for name in names}})
+
+    features = backbone(image)
+    levels = [features[f] for f in rpn.in_features]
+    logit_names = [f'logits_{f}' for f in rpn.in_features]
+    delta_names = [f'deltas_{f}' for f in rpn.in_features]
+    _export(
+        _RPNHeadGraph(rpn.rpn_head), tuple(levels), out_dir / 'rpn_head.onnx',
+        list(rpn.in_features), logit_names + delta_names,
+        {name: axes(f) for f in rpn.in_features for name in (f, f'logits_{f}', f'deltas_{f}')})
+
+    channels = backbone.output_shape()[roi_heads.box_in_features[0]].channels
+    rois = torch.zeros(8, channels, *roi_heads.box_pooler.output_size)
+    for k, box_head in enumerate(roi_heads.box_head):
+        _export(
+            box_head, (rois,), out_dir / f'box_head{k}.onnx',
+            ['rois'], ['box_features'], {'rois': {0: 'num_rois'}, 'box_features': {0: 'num_rois'}})
+
+
+@torch.no_grad()
+def export_onnx(model, cfg):
+    """
+    Export the backbone, RPN head and cascade box heads of `model` to `onnx_dir(cfg)`,
+    unless they are there already.
+
+    The graphs are written to a temporary directory that is renamed into place, so
+    concurrent exports (e.g. several worker processes) never see a partial directory.
+
+    Returns:
+        Path: the directory of the graphs.
+    """
+    out_dir = onnx_dir(cfg)
+    if out_dir.is_dir():
+        return out_dir
+    out_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(dir=out_dir.parent, prefix=f'.{out_dir.name}.'))
+    try:
+        logger.info(f"Exporting UniDet to ONNX in {out_dir}")
+        _write_graphs(model, tmp_dir)
+        try:
+            os.rename(tmp_dir, out_dir)
+        except OSError:
+            # another process finished the same export first
+            if not out_dir.is_dir():
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return out_dir
+
+
+class _Session:
+    """An ONNX Runtime CPU session fed and read as torch tensors."""
+
+    def __init__(self, path):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError(
+                "MODEL.BACKEND onnxruntime needs ONNX Runtime: pip install 'hrsbench[onnx]'") from e
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = torch.get_num_threads()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(path), options, providers=['CPUExecutionProvider'])
+        self.input_names = [x.name for x in self.session.get_inputs()]
+
+    def __call__(self, *inputs):
+        feeds = {name: x.contiguous().numpy() for name, x in zip(self.input_names, inputs)}
+        return [torch.from_numpy(y) for y in self.session.run(None, feeds)]
+
+
+class OrtBackbone(nn.Module):
+    """Drop-in for the backbone of a `GeneralizedRCNN`, run by ONNX Runtime."""
+
+    def __init__(self, session, backbone):
+        super().__init__()
+        self.session = session
+        self.size_divisibility = backbone.size_divisibility
+        self.padding_constraints = getattr(backbone, 'padding_constraints', {})
+        self._output_shape = backbone.output_shape()
+
+    def output_shape(self):
+        return self._output_shape
+
+    def forward(self, image):
+        return dict(zip(self._output_shape, self.session(image)))
+
+
+class OrtRPNHead(nn.Module):
+    """Drop-in for `StandardRPNHead`, run by ONNX Runtime."""
+
+    def __init__(self, session, num_levels):
+        super().__init__()
+        self.session = session
+        self.num_levels = num_levels
+
+    def forward(self, features):
+        outputs = self.session(*features)
+        return outputs[:self.num_levels], outputs[self.num_levels:]
+
+
+class OrtBoxHead(nn.Module):
+    """Drop-in for the box head of a cascade stage, run by ONNX Runtime."""
+
+    def __init__(self, session, box_head):
+        super().__init__()
+        self.session = session
+        self.output_shape = box_head.output_shape
+
+    def forward(self, x):
+        if x.shape[0] == 0:
+            return x.new_zeros((0, self.output_shape.channels))
+        return self.session(x)[0]
+
+
+def prepare_onnxruntime(model, cfg):
+    """
+    Replace the backbone, RPN head and cascade box heads of `model` by ONNX Runtime
+    sessions of their exported graphs, exporting them first if needed.
+
+    The sessions use as many intra-op threads as torch does in the calling process,
+    so worker processes keep their share of the cores.
+    """
+    if any(p.device.type != 'cpu' for p in model.parameters()):
+        raise ValueError("MODEL.BACKEND onnxruntime runs on CPU only; set MODEL.DEVICE cpu")
+    out_dir = export_onnx(model, cfg)
+    rpn = model.proposal_generator
+    model.backbone = OrtBackbone(_Session(out_dir / 'backbone.onnx'), model.backbone)
+    rpn.rpn_head = OrtRPNHead(_Session(out_dir / 'rpn_head.onnx'), len(rpn.in_features))
+    model.roi_heads.box_head = nn.ModuleList(
+        OrtBoxHead(_Session(out_dir / f'box_head{k}.onnx'), box_head)
+        for k, box_head in enumerate(model.roi_heads.box_head))
+    return model
@@ -0,0 +1,220 @@
+"""
+INT8 post-training quantization of UniDet for CPU inference.
+
+- The convs of the ResNeSt backbone (stem, bottlenecks, split-attention convs,
+  shortcuts) and of the FPN are statically quantized: per-channel int8 weights and
+  uint8 activations, whose ranges are calibrated once on HRS images.
+- The linear layers of the cascade box heads (`FastRCNNConvFCHead` FCs) and box
+  predictors (per-dataset classifiers, box regressors) are dynamically quantized:
+  int8 weights, activations quantized on the fly.
+
+Each quantized conv takes and returns float tensors, so the code around it (the
+residual adds, split attention, RPN, ROIAlign, box decoding, NMS) is unchanged and
+runs in fp32. The calibrated activation ranges are saved as JSON next to the
+weights and reused by later runs and worker processes.
+"""
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+import torch
+from torch import nn
+import torch.ao.nn.quantized as nnq
+from torch.ao.quantization import HistogramObserver, PerChannelMinMaxObserver, quantize_dynamic
+
+from detectron2.layers import Conv2d
+
+from hrsbench.cache import file_digest, weights_digest
+from hrsbench.journal import atomic_write_bytes
+
+from .backbone.splat import SplAtConv2d
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['int8_convs', 'calibrate_int8', 'quantize_int8', 'int8_qparams_path', 'prepare_int8']
+
+# config subtrees that change the quantized convs; the weights are hashed separately
+_GRAPH_KEYS = ('BACKBONE', 'RESNETS', 'FPN', 'FOLD_BN')
+
+
+def int8_convs(model):
+    """
+    The statically quantized convs of `model`: every detectron2 `Conv2d` of the
+    backbone and FPN, except the attention FCs of `SplAtConv2d`, which run on 1x1
+    pooled maps.
+
+    Returns:
+        dict[str, Conv2d]: the convs by qualified name.
+    """
+    attention = {id(m.fc1) for m in model.backbone.modules() if isinstance(m, SplAtConv2d)}
+    attention |= {id(m.fc2) for m in model.backbone.modules() if isinstance(m, SplAtConv2d)}
+    return {
+        name: m for name, m in model.named_modules()
+        if name.startswith('backbone.') and isinstance(m, Conv2d) and id(m) not in attention
+    }
+
+
+def _replace(model, name, module):
+    parent, _, child = name.rpartition('.')
+    setattr(model.get_submodule(parent), child, module)
+
+
+class _ObservedConv(nn.Module):
+    """A conv recording the ranges of its input and output during calibration."""
+
+    def __init__(self, conv):
+        super().__init__()
+        self.conv = conv
+        self.input_observer = HistogramObserver(dtype=torch.quint8)
+        self.output_observer = HistogramObserver(dtype=torch.quint8)
+
+    def forward(self, x):
+        self.input_observer(x)
+        x = nn.functional.conv2d(
+            x, self.conv.weight, self.conv.bias, self.conv.stride, self.conv.padding,
+            self.conv.dilation, self.conv.groups)
+        self.output_observer(x)
+        if self.conv.norm is not None:
+            x = self.conv.norm(x)
+        if self.conv.activation is not None:
+            x = self.conv.activation(x)
+        return x
+
+    def qparams(self):
+        in_scale, in_zero_point = self.input_observer.calculate_qparams()
+        out_scale, out_zero_point = self.output_observer.calculate_qparams()
+        return [float(in_scale), int(in_zero_point), float(out_scale), int(out_zero_point)]
+
+
+class Int8Conv(nn.Module):
+    """
+    Drop-in for a detectron2 `Conv2d`: quantizes its float input, runs the int8 conv
+    and returns a float output (after the norm and activation, if any).
+    """
+
+    def __init__(self, conv, qparams):
+        super().__init__()
+        in_scale, in_zero_point, out_scale, out_zero_point = qparams
+        self.input_scale = in_scale
+        self.input_zero_point = in_zero_point
+        weight = conv.weight.detach().float()
+        observer = PerChannelMinMaxObserver(ch_axis=0, dtype=torch.qint8, qscheme=torch.per_channel_symmetric)
+        observer(weight)
+        scales, zero_points = observer.calculate_qparams()
+        self.conv = nnq.Conv2d(
+            conv.in_channels, conv.out_channels, conv.kernel_size, conv.stride, conv.padding,
+            conv.dilation, conv.groups, bias=conv.bias is not None)
+        self.conv.set_weight_bias(
+            torch.quantize_per_channel(weight, scales.double(), zero_points, 0, torch.qint8),
+            None if conv.bias is None else conv.bias.detach().float())
+        self.conv.scale = out_scale
+        self.conv.zero_point = out_zero_point
+        self.norm = conv.norm
+        self.activation = conv.activation
+
+    def forward(self, x):
+        x = torch.quantize_per_tensor(x, self.input_scale, self.input_zero_point, torch.quint8)
+        x = self.conv(x).dequantize()
+        if self.norm is not None:
+            x = self.norm(x)
+        if self.activation is not None:
+            x = self.activation(x)
+        return x
+
+
+@torch.no_grad()
+def calibrate_int8(model, run):
+    """
+    Record the input and output ranges of the convs of `int8_convs(model)` while
+    `run()` feeds calibration images through `model`. The model is left unchanged.
+
+    Returns:
+        dict[str, list]: [input scale, input zero point, output scale, output zero point] by conv name.
+    """
+    convs = int8_convs(model)
+    observed = {name: _ObservedConv(conv) for name, conv in convs.items()}
+    for name, module in observed.items():
+        _replace(model, name, module)
+    try:
+        run()
+    finally:
+        for name, conv in convs.items():
+            _replace(model, name, conv)
+    return {name: module.qparams() for name, module in observed.items()}
+
+
+@torch.no_grad()
+def quantize_int8(model, qparams):
+    """
+    Quantize `model` in place: the convs of `int8_convs` statically with the calibrated
+    `qparams` (see `calibrate_int8`), the linear layers of the ROI heads dynamically.
+    """
+    convs = int8_convs(model)
+    missing = sorted(set(convs) - set(qparams))
+    if missing:
+        raise ValueError("No calibrated ranges for {} convs, e.g. {}; recalibrate".format(len(missing), missing[0]))
+    for name, conv in convs.items():
+        _replace(model, name, Int8Conv(conv, qparams[name]))
+    roi_heads = model.roi_heads
+    roi_heads.box_head = quantize_dynamic(roi_heads.box_head, {nn.Linear}, dtype=torch.qint8)
+    roi_heads.box_predictor = quantize_dynamic(roi_heads.box_predictor, {nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+def _calibration_images(cfg):
+    from hrsbench.stages import collect_images
+
+    if not cfg.MODEL.QUANT.CALIBRATION_DIR:
+        raise ValueError(
+            "MODEL.PRECISION int8 needs calibration images: set MODEL.QUANT.CALIBRATION_DIR "
+            "to a directory (or glob) of HRS images")
+    paths = sorted(collect_images(cfg.MODEL.QUANT.CALIBRATION_DIR))
+    if not paths:
+        raise ValueError(f"No images found in MODEL.QUANT.CALIBRATION_DIR {cfg.MODEL.QUANT.CALIBRATION_DIR}")
+    num_images = cfg.MODEL.QUANT.NUM_CALIBRATION_IMAGES
+    # spread over the whole set rather than taking the first prompts
+    step = max(len(paths) // num_images, 1)
+    return paths[::step][:num_images]
+
+
+def int8_qparams_path(cfg, image_paths):
+    """
+    Calibrated ranges of `cfg` for `image_paths`: `quant/unidet-int8-<hash>.json` next to
+    the weights, where the hash covers the weights, the architecture and the content
+    of the calibration images.
+    """
+    h = hashlib.sha256(weights_digest(cfg.MODEL.WEIGHTS).encode())
+    for key in _GRAPH_KEYS:
+        h.update(f"{key}={cfg.MODEL[key]}".encode())
+    for path in image_paths:
+        h.update(file_digest(path).encode())
+    return Path(cfg.MODEL.WEIGHTS).parent / "quant" / f"unidet-int8-{h.hexdigest()[:16]}.json"
+
+
+def prepare_int8(predictor, cfg):
+    """
+    Quantize the model of `predictor` for MODEL.PRECISION int8, calibrating it first on
+    MODEL.QUANT.CALIBRATION_DIR unless ranges for those images were saved already.
+    """
+    from hrsbench.stages import _read_inputs
+
+    model = predictor.model
+    if any(p.device.type != 'cpu' for p in model.parameters()):
+        raise ValueError("MODEL.PRECISION int8 runs on CPU only; set MODEL.DEVICE cpu")
+    image_paths = _calibration_images(cfg)
+    path = int8_qparams_path(cfg, image_paths)
+    if path.is_file():
+        qparams = json.loads(path.read_text())
+    else:
+        logger.info(f"Calibrating the INT8 UniDet on {len(image_paths)} images")
+
+        def run():
+            for *_, model_input in _read_inputs(image_paths, preprocess=predictor.preprocess):
+                predictor.predict_inputs([model_input])
+
+        qparams = calibrate_int8(model, run)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_bytes(path, json.dumps(qparams, indent=1).encode())
+        logger.info(f"Saved the INT8 calibration to {path}")
+    return quantize_int8(model, qparams)
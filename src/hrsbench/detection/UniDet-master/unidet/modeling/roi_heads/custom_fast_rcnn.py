@@ -92,8 +92,10 @@ class CustomFastRCNNOutputLayers(FastRCNNOutputLayers):
             bias_value = -math.log((1 - prior_prob) / prior_prob)
             nn.init.constant_(self.cls_score.bias, bias_value)
         
-        self.freq_weight = _load_class_freq(cfg)
-        hierarchy_weight = _load_class_hierarchy(cfg)
+        # the class frequencies and hierarchy only weight the training losses
+        inference_only = bool(cfg.MULTI_DATASET.INFERENCE_DATASET)
+        self.freq_weight = None if inference_only else _load_class_freq(cfg)
+        hierarchy_weight = None if inference_only else _load_class_hierarchy(cfg)
         if self.pos_parents and (hierarchy_weight is not None):
             self.hierarchy_weight = hierarchy_weight[0] # (C + 1) x C
             self.is_parents = hierarchy_weight[1]
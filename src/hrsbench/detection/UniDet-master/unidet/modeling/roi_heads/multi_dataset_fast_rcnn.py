@@ -29,6 +29,11 @@ class MultiDatasetFastRCNNOutputLayers(CustomFastRCNNOutputLayers):
         if 'oid' in cfg.MULTI_DATASET.DATASETS:
             self.openimage_index = cfg.MULTI_DATASET.DATASETS.index('oid')
         self.num_datasets = len(num_classes_list)
+        # inference-only model: a single classifier, the one of the evaluated dataset
+        self.inference_dataset = None
+        if cfg.MULTI_DATASET.INFERENCE_DATASET:
+            self.inference_dataset = cfg.MULTI_DATASET.DATASETS.index(cfg.MULTI_DATASET.INFERENCE_DATASET)
+            num_classes_list = [num_classes_list[self.inference_dataset]]
         self.cls_score = nn.ModuleList()
         for num_classes in num_classes_list:
             self.cls_score.append(nn.Linear(input_size, num_classes + 1))
@@ -39,7 +44,13 @@ class MultiDatasetFastRCNNOutputLayers(CustomFastRCNNOutputLayers):
         if x.dim() > 2:
             x = torch.flatten(x, start_dim=1)
         proposal_deltas = self.bbox_pred(x)
-        if dataset_source >= 0:
+        if self.inference_dataset is not None:
+            if dataset_source != self.inference_dataset:
+                raise ValueError(
+                    "This model only has the classifier of dataset {}, not of {}".format(
+                        self.inference_dataset, dataset_source))
+            scores = self.cls_score[0](x)
+        elif dataset_source >= 0:
             scores = self.cls_score[dataset_source](x)
         else:
             scores = [self.cls_score[d](x) for d in range(self.num_datasets)]
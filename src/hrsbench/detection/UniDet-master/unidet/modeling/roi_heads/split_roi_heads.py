@@ -5,6 +5,7 @@ from torch.autograd.function import Function
 import torch.nn.functional as F
 import numpy as np
 
+from detectron2.config import configurable
 from detectron2.modeling.roi_heads.fast_rcnn import fast_rcnn_inference
 from detectron2.modeling.roi_heads.roi_heads import ROI_HEADS_REGISTRY, StandardROIHeads
 from detectron2.modeling.roi_heads.cascade_rcnn import _ScaleGradient
@@ -14,8 +15,47 @@ from .custom_roi_heads import CustomCascadeROIHeads
 
 from detectron2.utils.events import get_event_storage
 
+
+def _restrict_classes(boxes, scores, classes):
+    """
+    Keep the score columns (and class-specific boxes) of `classes` plus background.
+
+    Returns the restricted boxes and scores, and `classes` as a tensor that maps the
+    restricted class ids back to the original ones (None if not restricted).
+    """
+    if classes is None:
+        return boxes, scores, None
+    classes = torch.as_tensor(classes, dtype=torch.long, device=scores.device)
+    background = classes.new_tensor([scores.shape[1] - 1])
+    scores = scores[:, torch.cat([classes, background])]
+    if boxes.shape[1] > 4 and len(classes):
+        # one box per class
+        boxes = boxes.view(boxes.shape[0], -1, 4)[:, classes].reshape(boxes.shape[0], -1)
+    elif boxes.shape[1] > 4:
+        # no class left: a single box column keeps the shapes valid
+        boxes = boxes[:, :4]
+    return boxes, scores, classes
+
 @ROI_HEADS_REGISTRY.register()
 class MultiDatasetCascadeROIHeads(CustomCascadeROIHeads):
+    @configurable
+    def __init__(self, *, num_test_stages=0, **kwargs):
+        """
+        num_test_stages: at inference, run only the first k cascade stages and average
+            the scores of those (0: all stages).
+        """
+        super().__init__(**kwargs)
+        if not 0 <= num_test_stages <= self.num_cascade_stages:
+            raise ValueError("NUM_TEST_STAGES must be in [0, {}], got {}".format(
+                self.num_cascade_stages, num_test_stages))
+        self.num_test_stages = num_test_stages or self.num_cascade_stages
+
+    @classmethod
+    def from_config(cls, cfg, input_shape):
+        ret = super().from_config(cfg, input_shape)
+        ret['num_test_stages'] = cfg.MODEL.ROI_BOX_CASCADE_HEAD.NUM_TEST_STAGES
+        return ret
+
     @classmethod
     def _init_box_head(self, cfg, input_shape):
         ret = super()._init_box_head(cfg, input_shape)
@@ -34,7 +74,9 @@ class MultiDatasetCascadeROIHeads(CustomCascadeROIHeads):
             )
         ret['box_predictors'] = box_predictors
 
-        self.unify_label_test = cfg.MULTI_DATASET.UNIFY_LABEL_TEST
+        # an inference-only model has a single classifier: no unified label space, no score dumps
+        inference_only = bool(cfg.MULTI_DATASET.INFERENCE_DATASET)
+        self.unify_label_test = cfg.MULTI_DATASET.UNIFY_LABEL_TEST and not inference_only
         if self.unify_label_test:
             unified_label_data = json.load(
                 open(cfg.MULTI_DATASET.UNIFIED_LABEL_FILE, 'r'))
@@ -54,14 +96,14 @@ class MultiDatasetCascadeROIHeads(CustomCascadeROIHeads):
                 self.class_count[self.label_map[d]] = \
                     self.class_count[self.label_map[d]] + 1
 
-        self.dump_cls_score = cfg.DUMP_CLS_SCORE
+        self.dump_cls_score = cfg.DUMP_CLS_SCORE and not inference_only
         if self.dump_cls_score:
             self.dump_num_img = cfg.DUMP_NUM_IMG
             self.dump_num_per_img = cfg.DUMP_NUM_PER_IMG
             self.class_scores = []
         return ret
 
-    def forward(self, images, features, proposals, targets=None, eval_dataset=-1):
+    def forward(self, images, features, proposals, targets=None, eval_dataset=-1, allowed_classes=None):
         if self.training:
             proposals = self.label_and_sample_proposals(proposals, targets)
             dataset_sources = [target._dataset_source for target in targets]
@@ -78,16 +120,26 @@ class MultiDatasetCascadeROIHeads(CustomCascadeROIHeads):
             return proposals, losses
         else:
             pred_instances = self._forward_box(
-                features, proposals, dataset_source=dataset_source)
+                features, proposals, dataset_source=dataset_source,
+                allowed_classes=allowed_classes)
             pred_instances = self.forward_with_given_boxes(features, pred_instances)
             return pred_instances, {}
 
-    def _forward_box(self, features, proposals, targets=None, dataset_source=-1):
+    def _forward_box(self, features, proposals, targets=None, dataset_source=-1, allowed_classes=None):
+        """
+        allowed_classes: at inference, optional list (one entry per image) of the
+            class ids to keep, or None for all classes. Other classes are dropped
+            before thresholding and NMS.
+
+        At inference only the first `num_test_stages` stages run; the boxes of the last
+        of them are kept and the scores are averaged over them.
+        """
         features = [features[f] for f in self.box_in_features]
         head_outputs = [] # (predictor, predictions, proposals)
         prev_pred_boxes = None
         image_sizes = [x.image_size for x in proposals]
-        for k in range(self.num_cascade_stages):
+        num_stages = self.num_cascade_stages if self.training else self.num_test_stages
+        for k in range(num_stages):
             if k > 0:
                 # The output boxes of the previous stage are the input proposals of the next stage
                 proposals = self._create_proposals_from_boxes(
@@ -115,13 +167,16 @@ class MultiDatasetCascadeROIHeads(CustomCascadeROIHeads):
             # Each is a list[Tensor] of length #image. Each tensor is Ri x (K+1)
             scores_per_stage = [h[0].predict_probs(h[1], h[2]) for h in head_outputs]
 
-            # Average the scores across heads
+            # Average the scores across the heads that ran
             scores = [
-                sum(list(scores_per_image)) * (1.0 / self.num_cascade_stages)
+                sum(list(scores_per_image)) * (1.0 / num_stages)
                 for scores_per_image in zip(*scores_per_stage)
             ]
             predictor, predictions, proposals = head_outputs[-1]
             boxes = predictor.predict_boxes(predictions, proposals)
+            if allowed_classes is not None:
+                boxes, scores, allowed_classes = zip(*[
+                    _restrict_classes(b, s, c) for b, s, c in zip(boxes, scores, allowed_classes)])
             pred_instances, _ = fast_rcnn_inference(
                 boxes,
                 scores,
@@ -130,6 +185,10 @@ class MultiDatasetCascadeROIHeads(CustomCascadeROIHeads):
                 predictor.test_nms_thresh,
                 predictor.test_topk_per_image,
             )
+            if allowed_classes is not None:
+                for instances, classes in zip(pred_instances, allowed_classes):
+                    if classes is not None:
+                        instances.pred_classes = classes[instances.pred_classes]
             return pred_instances
 
     def _run_stage(self, features, proposals, stage, dataset_source):
@@ -10,20 +10,75 @@ import torch
 import json
 
 from detectron2.data import MetadataCatalog
-from detectron2.engine.defaults import DefaultPredictor
 from detectron2.utils.video_visualizer import VideoVisualizer
 from detectron2.utils.visualizer import ColorMode, Visualizer
 
+from hrsbench.weights import build_predictor
+from hrsbench.workers import available_cores, init_worker, split_cores
+
+from .modeling.fold_bn import fold_batchnorm
+
+
+BACKENDS = ("pytorch", "onnxruntime")
+PRECISIONS = ("fp32", "int8", "bf16")
+# config subtrees that change the compiled backbone; the weights are hashed separately
+COMPILED_GRAPH_KEYS = ("BACKBONE", "RESNETS", "FPN", "FOLD_BN")
+
+
+def build_unidet_predictor(cfg):
+    """
+    `build_predictor` prepared for inference: with MODEL.FOLD_BN, the batch norms are
+    folded into the preceding convs (see `unidet.modeling.fold_bn`), with MODEL.PRECISION
+    int8 the convs and linear layers are quantized (see `unidet.modeling.quantize`), with
+    MODEL.PRECISION bf16 the dense parts run under bf16 autocast (see `unidet.modeling.bf16`),
+    with MODEL.BACKEND onnxruntime the dense parts run in ONNX Runtime (see
+    `unidet.modeling.onnx_backend`), and with MODEL.COMPILE.ENABLED the backbone and FPN run
+    compiled for the most common padded input shapes (see `hrsbench.compiled`).
+    """
+    if cfg.MODEL.BACKEND not in BACKENDS:
+        raise ValueError("Unknown MODEL.BACKEND {!r}, expected one of {}".format(cfg.MODEL.BACKEND, BACKENDS))
+    if cfg.MODEL.PRECISION not in PRECISIONS:
+        raise ValueError("Unknown MODEL.PRECISION {!r}, expected one of {}".format(cfg.MODEL.PRECISION, PRECISIONS))
+    if cfg.MODEL.PRECISION != "fp32" and cfg.MODEL.BACKEND != "pytorch":
+        raise ValueError("MODEL.PRECISION {} runs on the pytorch backend only".format(cfg.MODEL.PRECISION))
+    if cfg.MODEL.COMPILE.ENABLED and (cfg.MODEL.PRECISION != "fp32" or cfg.MODEL.BACKEND != "pytorch"):
+        raise ValueError("MODEL.COMPILE.ENABLED runs with MODEL.PRECISION fp32 on the pytorch backend only")
+    predictor = build_predictor(cfg)
+    if cfg.MODEL.FOLD_BN:
+        fold_batchnorm(predictor.model)
+    if cfg.MODEL.PRECISION == "int8":
+        from .modeling.quantize import prepare_int8
+
+        prepare_int8(predictor, cfg)
+    if cfg.MODEL.PRECISION == "bf16":
+        from .modeling.bf16 import prepare_bf16
+
+        prepare_bf16(predictor.model)
+    if cfg.MODEL.BACKEND == "onnxruntime":
+        from .modeling.onnx_backend import prepare_onnxruntime
+
+        prepare_onnxruntime(predictor.model, cfg)
+    if cfg.MODEL.COMPILE.ENABLED:
+        from hrsbench.compiled import compile_backbone
+
+        compile_backbone(predictor.model, cfg, "unidet", COMPILED_GRAPH_KEYS)
+    return predictor
+
 
 class UnifiedVisualizationDemo(object):
-    def __init__(self, cfg, instance_mode=ColorMode.IMAGE, parallel=False):
+    def __init__(self, cfg, instance_mode=ColorMode.IMAGE, parallel=False, num_workers=None, num_threads=None, batch_size=1):
         """
         Args:
             cfg (CfgNode):
             instance_mode (ColorMode):
             parallel (bool): whether to run the model in different processes from visualization.
                 Useful since the visualization logic can be slow.
+            num_workers (int): number of CPU worker processes when parallel and MODEL.DEVICE is cpu.
+            num_threads (int): intra-op threads of each CPU worker (default: its share of the cores).
+            batch_size (int): images per forward of the in-process model, see `BatchPredictor`.
         """
+        if parallel and batch_size > 1:
+            raise ValueError("Batched inference runs in process; it cannot be combined with parallel workers")
         self.metadata = MetadataCatalog.get("__unused")
         unified_label_file = json.load(open(cfg.MULTI_DATASET.UNIFIED_LABEL_FILE))
         self.metadata.thing_classes = [
@@ -34,13 +89,16 @@ class UnifiedVisualizationDemo(object):
 
         self.parallel = parallel
         if parallel:
-            num_gpu = torch.cuda.device_count()
-            self.predictor = AsyncPredictor(cfg, num_gpus=num_gpu)
+            num_gpu = torch.cuda.device_count() if cfg.MODEL.DEVICE != "cpu" else 0
+            self.predictor = AsyncPredictor(cfg, num_gpus=num_gpu, num_workers=num_workers, num_threads=num_threads)
+        elif batch_size > 1:
+            self.predictor = BatchPredictor(cfg, batch_size)
         else:
-            self.predictor = DefaultPredictor(cfg)
+            self.predictor = build_unidet_predictor(cfg)
 
         # Eslam
-        self.metadata = self.predictor.metadata
+        # same metadata as DefaultPredictor, which the worker pool does not expose
+        self.metadata = MetadataCatalog.get(cfg.DATASETS.TEST[0]) if parallel else self.predictor.metadata
         print("In Progress")
 
     def run_on_image(self, image):
@@ -53,8 +111,21 @@ class UnifiedVisualizationDemo(object):
             predictions (dict): the output of the model.
             vis_output (VisImage): the visualized image output.
         """
-        vis_output = None
         predictions = self.predictor(image)
+        vis_output = self.visualize(image, predictions)
+
+        return predictions, vis_output
+
+    def visualize(self, image, predictions):
+        """
+        Args:
+            image (np.ndarray): an image of shape (H, W, C) (in BGR order).
+            predictions (dict): the output of the model, possibly restored from a cache.
+
+        Returns:
+            vis_output (VisImage): the visualized image output.
+        """
+        vis_output = None
         # Convert image from OpenCV BGR format to Matplotlib RGB format.
         image = image[:, :, ::-1]
         visualizer = Visualizer(image, self.metadata, instance_mode=self.instance_mode)
@@ -72,7 +143,7 @@ class UnifiedVisualizationDemo(object):
                 instances = predictions["instances"].to(self.cpu_device)
                 vis_output = visualizer.draw_instance_predictions(predictions=instances)
 
-        return predictions, vis_output
+        return vis_output
 
     def _frame_from_video(self, video):
         while video.isOpened():
@@ -138,6 +209,68 @@ class UnifiedVisualizationDemo(object):
                 yield process_predictions(frame, self.predictor(frame))
 
 
+class BatchPredictor:
+    """
+    A predictor that runs the model on several images per forward.
+
+    Every image is preprocessed exactly like `DefaultPredictor` does. Images are then
+    grouped by padded size, so each one is padded into the `ImageList` of its batch
+    the same way as when it runs alone, and the backbone, RPN and cascade heads run
+    once per batch of up to `batch_size` images. Results are split back per image
+    and returned in input order.
+    """
+
+    def __init__(self, cfg, batch_size: int = 8):
+        self.predictor = build_unidet_predictor(cfg)
+        self.model = self.predictor.model
+        self.metadata = self.predictor.metadata
+        self.batch_size = batch_size
+
+    def __call__(self, image, allowed_classes=None):
+        return self.predictor(image, allowed_classes)
+
+    def preprocess(self, image, allowed_classes=None):
+        return self.predictor.preprocess(image, allowed_classes)
+
+    def _padded_size(self, image):
+        divisibility = self.model.backbone.size_divisibility
+        height, width = image.shape[-2:]
+        if divisibility > 1:
+            height = (height + divisibility - 1) // divisibility * divisibility
+            width = (width + divisibility - 1) // divisibility * divisibility
+        return height, width
+
+    def predict_inputs(self, inputs):
+        """
+        Args:
+            inputs (list[dict]): preprocessed images, see `preprocess`.
+
+        Returns:
+            list[dict]: the output of the model for each image, as returned by `__call__`.
+        """
+        groups = {}
+        for i, x in enumerate(inputs):
+            groups.setdefault(self._padded_size(x["image"]), []).append(i)
+
+        predictions = [None] * len(inputs)
+        for indices in groups.values():
+            for start in range(0, len(indices), self.batch_size):
+                batch = indices[start:start + self.batch_size]
+                for i, output in zip(batch, self.predictor.predict_inputs([inputs[i] for i in batch])):
+                    predictions[i] = output
+        return predictions
+
+    def predict_batch(self, images):
+        """
+        Args:
+            images (list[np.ndarray]): images of shape (H, W, C) (in BGR order).
+
+        Returns:
+            list[dict]: the output of the model for each image, as returned by `__call__`.
+        """
+        return self.predict_inputs([self.preprocess(image) for image in images])
+
+
 class AsyncPredictor:
     """
     A predictor that runs the model asynchronously, possibly on >1 GPUs.
@@ -149,39 +282,52 @@ class AsyncPredictor:
         pass
 
     class _PredictWorker(mp.Process):
-        def __init__(self, cfg, task_queue, result_queue):
+        def __init__(self, cfg, task_queue, result_queue, cores=None, num_threads=None):
             self.cfg = cfg
             self.task_queue = task_queue
             self.result_queue = result_queue
+            self.cores = cores
+            self.num_threads = num_threads
             super().__init__()
 
         def run(self):
-            predictor = DefaultPredictor(self.cfg)
+            if self.cores is not None:
+                init_worker(self.cores, self.num_threads)
+            predictor = build_unidet_predictor(self.cfg)
 
             while True:
                 task = self.task_queue.get()
                 if isinstance(task, AsyncPredictor._StopToken):
                     break
-                idx, data = task
-                result = predictor(data)
+                idx, data, allowed_classes = task
+                result = predictor(data, allowed_classes)
                 self.result_queue.put((idx, result))
 
-    def __init__(self, cfg, num_gpus: int = 1):
+    def __init__(self, cfg, num_gpus: int = 1, num_workers: int = None, num_threads: int = None):
         """
         Args:
             cfg (CfgNode):
             num_gpus (int): if 0, will run on CPU
+            num_workers (int): number of CPU worker processes when num_gpus is 0 (default 1).
+                The available cores are split evenly between them and each worker is pinned
+                to its share.
+            num_threads (int): intra-op threads of each CPU worker (default: its number of cores)
         """
-        num_workers = max(num_gpus, 1)
+        if num_gpus > 0:
+            num_workers = num_gpus
+            core_budgets = [None] * num_workers
+        else:
+            num_workers = max(num_workers or 1, 1)
+            core_budgets = split_cores(available_cores(), [None] * num_workers)
         self.task_queue = mp.Queue(maxsize=num_workers * 3)
         self.result_queue = mp.Queue(maxsize=num_workers * 3)
         self.procs = []
-        for gpuid in range(max(num_gpus, 1)):
+        for worker_id, cores in enumerate(core_budgets):
             cfg = cfg.clone()
             cfg.defrost()
-            cfg.MODEL.DEVICE = "cuda:{}".format(gpuid) if num_gpus > 0 else "cpu"
+            cfg.MODEL.DEVICE = "cuda:{}".format(worker_id) if num_gpus > 0 else "cpu"
             self.procs.append(
-                AsyncPredictor._PredictWorker(cfg, self.task_queue, self.result_queue)
+                AsyncPredictor._PredictWorker(cfg, self.task_queue, self.result_queue, cores, num_threads)
             )
 
         self.put_idx = 0
@@ -193,9 +339,9 @@ class AsyncPredictor:
             p.start()
         atexit.register(self.shutdown)
 
-    def put(self, image):
+    def put(self, image, allowed_classes=None):
         self.put_idx += 1
-        self.task_queue.put((self.put_idx, image))
+        self.task_queue.put((self.put_idx, image, allowed_classes))
 
     def get(self):
         self.get_idx += 1  # the index needed for this request
@@ -216,8 +362,8 @@ class AsyncPredictor:
     def __len__(self):
         return self.put_idx - self.get_idx
 
-    def __call__(self, image):
-        self.put(image)
+    def __call__(self, image, allowed_classes=None):
+        self.put(image, allowed_classes)
         return self.get()
 
     def shutdown(self):
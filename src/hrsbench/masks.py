@@ -0,0 +1,104 @@
+"""
+Dependency-light reader of the instance masks saved by the segmentation stage.
+
+The masks are 8-bit grayscale PNGs, which only need zlib and NumPy to decode, so
+scoring does not have to import OpenCV for them. Other PNG flavours are handed to
+OpenCV.
+"""
+import struct
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def read_mask(path: str | Path) -> np.ndarray | None:
+    """
+    Read a grayscale mask like `cv2.imread(path, cv2.IMREAD_GRAYSCALE)`.
+
+    Returns:
+        np.ndarray | None: (H, W) uint8 array, or None if the file cannot be read.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    try:
+        mask = decode_gray_png(data)
+    except (ValueError, zlib.error, struct.error):
+        return None
+    if mask is None:
+        import cv2
+
+        return cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+    return mask
+
+
+def decode_gray_png(data: bytes) -> np.ndarray | None:
+    """
+    Decode a non-interlaced 8-bit grayscale PNG.
+
+    Returns None for any other kind of PNG and raises ValueError for corrupt data.
+    """
+    if not data.startswith(_PNG_SIGNATURE):
+        raise ValueError("Not a PNG file")
+    offset = len(_PNG_SIGNATURE)
+    header = None
+    idat = []
+    while offset < len(data):
+        length, chunk_type = struct.unpack_from(">I4s", data, offset)
+        chunk = data[offset + 8:offset + 8 + length]
+        offset += 12 + length
+        if chunk_type == b"IHDR":
+            header = struct.unpack(">IIBBBBB", chunk)
+        elif chunk_type == b"IDAT":
+            idat.append(chunk)
+        elif chunk_type == b"IEND":
+            break
+    if header is None or not idat:
+        raise ValueError("Truncated PNG file")
+    width, height, bit_depth, color_type, _, _, interlace = header
+    if bit_depth != 8 or color_type != 0 or interlace != 0:
+        return None
+
+    raw = np.frombuffer(zlib.decompress(b"".join(idat)), dtype=np.uint8)
+    if raw.size != height * (width + 1):
+        raise ValueError("Corrupt PNG image data")
+    rows = raw.reshape(height, width + 1)
+    image = np.empty((height, width), dtype=np.uint8)
+    prev = np.zeros(width, dtype=np.uint8)
+    for y in range(height):
+        image[y] = prev = _unfilter_row(rows[y, 0], rows[y, 1:], prev)
+    return image
+
+
+def _unfilter_row(filter_type: int, row: np.ndarray, prev: np.ndarray) -> np.ndarray:
+    """Undo the PNG filter of one scanline (one byte per pixel)."""
+    if filter_type == 0:  # None
+        return row
+    if filter_type == 1:  # Sub
+        return np.cumsum(row, dtype=np.uint8)
+    if filter_type == 2:  # Up
+        return row + prev
+    # Average and Paeth depend on the pixel just decoded on the left
+    out = bytearray(row.tobytes())
+    up = prev.tobytes()
+    left = 0
+    if filter_type == 3:  # Average
+        for x in range(len(out)):
+            left = out[x] = (out[x] + ((left + up[x]) >> 1)) & 0xFF
+    elif filter_type == 4:  # Paeth
+        up_left = 0
+        for x in range(len(out)):
+            b = up[x]
+            p = left + b - up_left
+            pa, pb, pc = abs(p - left), abs(p - b), abs(p - up_left)
+            predictor = left if pa <= pb and pa <= pc else (b if pb <= pc else up_left)
+            left = out[x] = (out[x] + predictor) & 0xFF
+            up_left = b
+    else:
+        raise ValueError(f"Unknown PNG filter type {filter_type}")
+    return np.frombuffer(bytes(out), dtype=np.uint8)
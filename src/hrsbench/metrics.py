@@ -0,0 +1,300 @@
+"""
+Live progress metrics of the model stages, in Prometheus text format.
+
+The stages report to the process-wide `REGISTRY`: one `TaskProgress` per
+(stage, task, run) with images done/cached/total, throughput over the last minute,
+ETA, the depth of the inference queue, the time of the last finished image and
+latency percentiles of every pipeline phase (decode, model, output).
+
+`MetricsExporter` publishes them while a run is in flight, as a text file that is
+rewritten periodically (e.g. for the node_exporter textfile collector) and/or on a
+localhost `/metrics` endpoint. Worker processes that run stages (the `--concurrent`
+branches) write JSON snapshots with `SnapshotWriter`, which the exporter of the
+parent process merges in.
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+from hrsbench.journal import atomic_write_bytes
+
+logger = logging.getLogger(__name__)
+
+PHASES = ("decode", "model", "output")
+QUANTILES = (0.5, 0.9, 0.99)
+# throughput is measured over the images finished in this window
+RATE_WINDOW = 60.0
+# latency samples kept per phase
+MAX_SAMPLES = 2048
+
+
+class TaskProgress:
+    """Progress of one stage over the images of one task."""
+
+    def __init__(self, stage: str, task: str, run: str, total: int, done: int = 0):
+        self.labels = {"stage": stage, "task": task, "run": run}
+        self.total = total
+        self.done = done
+        self.cached = 0
+        self.started = time.time()
+        self.last_progress = self.started
+        self.finished = False
+        self.queue_depth = 0
+        self._finish_times = deque()
+        self._latencies = {phase: deque(maxlen=MAX_SAMPLES) for phase in PHASES}
+        self._latency_sums = dict.fromkeys(PHASES, 0.0)
+        self._latency_counts = dict.fromkeys(PHASES, 0)
+        self._lock = threading.Lock()
+
+    def observe(self, phase: str, seconds: float):
+        """Record the latency of one image in a pipeline phase."""
+        with self._lock:
+            self._latencies[phase].append(seconds)
+            self._latency_sums[phase] += seconds
+            self._latency_counts[phase] += 1
+
+    def set_queue_depth(self, depth: int):
+        self.queue_depth = depth
+
+    def image_done(self, cached: bool = False):
+        now = time.time()
+        with self._lock:
+            self.done += 1
+            self.cached += int(cached)
+            self.last_progress = now
+            self._finish_times.append(now)
+
+    def finish(self):
+        self.finished = True
+        self.queue_depth = 0
+
+    def snapshot(self) -> dict[str, Any]:
+        """Current values, JSON serializable."""
+        now = time.time()
+        with self._lock:
+            while self._finish_times and self._finish_times[0] < now - RATE_WINDOW:
+                self._finish_times.popleft()
+            window = min(RATE_WINDOW, max(now - self.started, 1e-6))
+            rate = len(self._finish_times) / window
+            latencies = {}
+            for phase in PHASES:
+                samples = sorted(self._latencies[phase])
+                latencies[phase] = {
+                    "quantiles": {str(q): _quantile(samples, q) for q in QUANTILES},
+                    "sum": self._latency_sums[phase],
+                    "count": self._latency_counts[phase],
+                }
+        remaining = self.total - self.done
+        return {
+            "labels": self.labels,
+            "total": self.total,
+            "done": self.done,
+            "cached": self.cached,
+            "rate": rate,
+            "eta": 0.0 if remaining <= 0 else (remaining / rate if rate > 0 else math.nan),
+            "queue_depth": self.queue_depth,
+            "running": not self.finished,
+            "started": self.started,
+            "last_progress": self.last_progress,
+            "latencies": latencies,
+        }
+
+
+def _quantile(samples: list[float], q: float) -> float:
+    if not samples:
+        return math.nan
+    return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+class MetricsRegistry:
+    """The `TaskProgress` of every task run by this process."""
+
+    def __init__(self):
+        self._tasks: dict[tuple[str, str, str], TaskProgress] = {}
+        self._lock = threading.Lock()
+
+    def task(self, stage: str, task: str, run: str, total: int, done: int = 0) -> TaskProgress:
+        """Start tracking a task; replaces an earlier entry with the same labels."""
+        progress = TaskProgress(stage, task, run, total, done)
+        with self._lock:
+            self._tasks[(stage, task, run)] = progress
+        return progress
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        with self._lock:
+            tasks = list(self._tasks.values())
+        return [progress.snapshot() for progress in tasks]
+
+
+REGISTRY = MetricsRegistry()
+
+# (name, type, help, value of a snapshot)
+_GAUGES = (
+    ("hrsbench_images_total", "gauge", "Images of the task", lambda s: s["total"]),
+    ("hrsbench_images_done", "gauge", "Images finished, including resumed and cached ones", lambda s: s["done"]),
+    ("hrsbench_images_cached", "gauge", "Images served from the inference cache", lambda s: s["cached"]),
+    ("hrsbench_images_per_second", "gauge", f"Throughput over the last {RATE_WINDOW:.0f} seconds", lambda s: s["rate"]),
+    ("hrsbench_eta_seconds", "gauge", "Estimated time to finish the task", lambda s: s["eta"]),
+    ("hrsbench_queue_depth", "gauge", "Images submitted to the model and not yet returned", lambda s: s["queue_depth"]),
+    ("hrsbench_task_running", "gauge", "1 while the task is in flight", lambda s: int(s["running"])),
+    ("hrsbench_task_start_timestamp_seconds", "gauge", "Start time of the task", lambda s: s["started"]),
+    (
+        "hrsbench_last_progress_timestamp_seconds",
+        "gauge",
+        "Time the last image of the task finished; a stalled node stops advancing it",
+        lambda s: s["last_progress"],
+    ),
+)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float) and math.isnan(value):
+        return "NaN"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(snapshots: list[dict[str, Any]]) -> str:
+    """Prometheus text exposition of task snapshots."""
+    lines = []
+    for name, metric_type, help_text, value in _GAUGES:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for snapshot in snapshots:
+            lines.append(f"{name}{_format_labels(snapshot['labels'])} {_format_value(value(snapshot))}")
+    name = "hrsbench_image_latency_seconds"
+    lines.append(f"# HELP {name} Per-image latency of each pipeline phase")
+    lines.append(f"# TYPE {name} summary")
+    for snapshot in snapshots:
+        for phase, latency in snapshot["latencies"].items():
+            labels = {**snapshot["labels"], "phase": phase}
+            for q, v in latency["quantiles"].items():
+                lines.append(f"{name}{_format_labels({**labels, 'quantile': q})} {_format_value(v)}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(latency['sum'])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {latency['count']}")
+    return "\n".join(lines) + "\n"
+
+
+class _PeriodicThread(threading.Thread):
+    def __init__(self, interval: float):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.tick()
+
+    def tick(self):
+        raise NotImplementedError
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        # publish the final state
+        self.tick()
+
+
+class SnapshotWriter(_PeriodicThread):
+    """Periodically dump the snapshot of this process to a JSON file for a `MetricsExporter`."""
+
+    def __init__(self, path: str | Path, interval: float = 10.0):
+        super().__init__(interval)
+        self.path = Path(path)
+
+    def tick(self):
+        try:
+            atomic_write_bytes(self.path, json.dumps(REGISTRY.snapshot()).encode())
+        except OSError as e:
+            logger.warning(f"Could not write metrics snapshot {self.path}: {e}")
+
+
+class MetricsExporter(_PeriodicThread):
+    """
+    Publish the metrics of this process and of its stage workers.
+
+    Args:
+        path: Prometheus text file rewritten every `interval` seconds.
+        port: serve `GET /metrics` on `host:port` as well.
+        child_snapshots: JSON files written by `SnapshotWriter`s of worker processes.
+    """
+
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        port: int | None = None,
+        host: str = "127.0.0.1",
+        interval: float = 10.0,
+        child_snapshots: list[str | Path] = (),
+    ):
+        super().__init__(interval)
+        self.path = Path(path) if path else None
+        self.child_snapshots = [Path(p) for p in child_snapshots]
+        self.server = None
+        if port is not None:
+            self.server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            self.server.exporter = self
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        snapshots = REGISTRY.snapshot()
+        for path in self.child_snapshots:
+            try:
+                snapshots.extend(json.loads(path.read_bytes()))
+            except (OSError, ValueError):
+                # not written yet
+                pass
+        return snapshots
+
+    def render(self) -> str:
+        return render_prometheus(self.snapshot())
+
+    def tick(self):
+        if self.path is None:
+            return
+        try:
+            os.makedirs(self.path.parent, exist_ok=True)
+            atomic_write_bytes(self.path, self.render().encode())
+        except OSError as e:
+            logger.warning(f"Could not write metrics file {self.path}: {e}")
+
+    def start(self):
+        self.tick()
+        super().start()
+
+    def stop(self):
+        super().stop()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        data = self.server.exporter.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,192 @@
+"""
+Construction of the two evaluation model stacks (UniDet for counting/spatial/size,
+MaskDINO for color) so that they can be built once and reused across tasks.
+
+Both stacks live in vendored source trees that are not regular Python packages,
+so their roots are put on `sys.path` before anything is imported from them.
+"""
+import os
+import re
+import sys
+import urllib.request
+from pathlib import Path
+
+from hrsbench import HRSBENCH_ROOT
+
+UNIDET_ROOT = HRSBENCH_ROOT / "detection" / "UniDet-master"
+MASKDINO_ROOT = HRSBENCH_ROOT / "colors" / "MaskDINO"
+WEIGHTS_ROOT = HRSBENCH_ROOT / "pretrained_weights"
+
+UNIDET_CONFIG = UNIDET_ROOT / "configs/Partitioned_COI_RS101_2x.yaml"
+UNIDET_WEIGHTS = WEIGHTS_ROOT / "Partitioned_COI_RS101_2x.pth"
+UNIDET_WEIGHTS_GDRIVE_ID = "110JSpmfNU__7T3IMSJwv0QSfLLo_AqtZ"
+
+MASKDINO_CONFIG = MASKDINO_ROOT / "configs/coco/instance-segmentation/swin/maskdino_R50_bs16_50ep_4s_dowsample1_2048.yaml"
+MASKDINO_WEIGHTS = WEIGHTS_ROOT / "maskdino_swinl_50ep_300q_hid2048_3sd1_instance_maskenhanced_mask52.3ap_box59.0ap.pth"
+MASKDINO_WEIGHTS_URL = (
+    "https://github.com/IDEA-Research/detrex-storage/releases/download/maskdino-v0.1.0/"
+    + MASKDINO_WEIGHTS.name
+)
+
+# suffix of weights converted by `hrsbench convert-weights`, see `hrsbench.weights`
+MMAP_SUFFIX = ".mmap.pth"
+# the UniDet classifier used by the evaluation (`SplitClassifierRCNN.eval_dataset`)
+PRUNED_DATASET = "coco"
+
+
+# named speed/accuracy trade-offs of UniDet: test size, RPN proposal budgets (pre-NMS per
+# FPN level, post-NMS per image) and detections kept per image. "accurate" is the
+# COCO-scale setup of the config; generated images are typically 512x512, which
+# "fast" keeps at its native size instead of upscaling it. The faster profiles also
+# fold the batch norms into the convs (MODEL.FOLD_BN), which only changes rounding.
+UNIDET_PROFILES = {
+    "accurate": {
+        "INPUT.MIN_SIZE_TEST": 800,
+        "MODEL.RPN.PRE_NMS_TOPK_TEST": 1000,
+        "MODEL.RPN.POST_NMS_TOPK_TEST": 1000,
+        "TEST.DETECTIONS_PER_IMAGE": 300,
+    },
+    "balanced": {
+        "INPUT.MIN_SIZE_TEST": 640,
+        "MODEL.RPN.PRE_NMS_TOPK_TEST": 1000,
+        "MODEL.RPN.POST_NMS_TOPK_TEST": 500,
+        "TEST.DETECTIONS_PER_IMAGE": 100,
+        "MODEL.FOLD_BN": True,
+    },
+    "fast": {
+        "INPUT.MIN_SIZE_TEST": 512,
+        "MODEL.RPN.PRE_NMS_TOPK_TEST": 500,
+        "MODEL.RPN.POST_NMS_TOPK_TEST": 250,
+        "TEST.DETECTIONS_PER_IMAGE": 100,
+        "MODEL.FOLD_BN": True,
+    },
+}
+
+
+def unidet_profile_opts(profile: str) -> list:
+    """The UniDet config options of a profile of `UNIDET_PROFILES`, as 'KEY VALUE' pairs."""
+    if profile not in UNIDET_PROFILES:
+        raise ValueError(f"Unknown UniDet profile {profile!r}, expected one of {', '.join(UNIDET_PROFILES)}")
+    return [item for key, value in UNIDET_PROFILES[profile].items() for item in (key, str(value))]
+
+
+def mmap_weights_path(path: str | Path) -> Path:
+    """Path of the memory-mappable conversion of a weights file."""
+    path = Path(path)
+    return path.with_name(path.stem + MMAP_SUFFIX)
+
+
+def resolve_weights(path: str | Path) -> Path:
+    """Prefer the memory-mappable conversion of a weights file when it exists."""
+    mmap_path = mmap_weights_path(path)
+    return mmap_path if mmap_path.is_file() else Path(path)
+
+
+def pruned_weights_path(path: str | Path, dataset: str = PRUNED_DATASET) -> Path:
+    """Path of the inference-only UniDet checkpoint keeping the classifier of `dataset`."""
+    path = Path(path)
+    return path.with_name(f"{path.stem}.{dataset}-only{MMAP_SUFFIX}")
+
+
+def resolve_unidet_weights(path: str | Path = UNIDET_WEIGHTS) -> Path:
+    """Prefer the inference-only (pruned) UniDet checkpoint, then the memory-mappable conversion."""
+    pruned_path = pruned_weights_path(path)
+    return pruned_path if pruned_path.is_file() else resolve_weights(path)
+
+
+def pruned_dataset(path: str | Path) -> str | None:
+    """Dataset whose classifier a pruned UniDet checkpoint keeps, from its file name."""
+    match = re.search(rf"\.([A-Za-z0-9_]+)-only{re.escape(MMAP_SUFFIX)}$", str(path))
+    return match.group(1) if match else None
+
+
+def add_model_paths():
+    """Make `unidet`, `maskdino` and the MaskDINO demo `predictor` module importable."""
+    for path in (UNIDET_ROOT, MASKDINO_ROOT, MASKDINO_ROOT / "demo"):
+        if str(path) not in sys.path:
+            sys.path.insert(0, str(path))
+
+
+def download_weights(unidet: bool = True, maskdino: bool = True):
+    """Download the pretrained weights into `WEIGHTS_ROOT` if they are not already present."""
+    os.makedirs(WEIGHTS_ROOT, exist_ok=True)
+    if maskdino and not MASKDINO_WEIGHTS.is_file():
+        print("MaskDINO weights not found. Downloading...")
+        urllib.request.urlretrieve(MASKDINO_WEIGHTS_URL, MASKDINO_WEIGHTS)
+    if unidet and not UNIDET_WEIGHTS.is_file():
+        print("UniDet weights not found. Downloading...")
+        import gdown
+
+        gdown.download(id=UNIDET_WEIGHTS_GDRIVE_ID, output=str(UNIDET_WEIGHTS))
+
+
+def setup_unidet_cfg(config_file=UNIDET_CONFIG, opts=(), confidence_threshold: float = 0.5):
+    """Build the frozen detectron2 config of the UniDet detector."""
+    add_model_paths()
+    from detectron2.config import get_cfg
+    from unidet.config import add_unidet_config
+
+    # load config from file and command-line arguments
+    cfg = get_cfg()
+    add_unidet_config(cfg)
+    cfg.merge_from_file(str(config_file))
+    cfg.merge_from_list(list(opts))
+    # Set score_threshold for builtin models
+    cfg.MODEL.RETINANET.SCORE_THRESH_TEST = confidence_threshold
+    cfg.MODEL.ROI_HEADS.SCORE_THRESH_TEST = confidence_threshold
+    cfg.MODEL.PANOPTIC_FPN.COMBINE.INSTANCES_CONFIDENCE_THRESH = confidence_threshold
+    cfg.MULTI_DATASET.UNIFIED_LABEL_FILE = str(UNIDET_ROOT / cfg.MULTI_DATASET.UNIFIED_LABEL_FILE)
+    # a pruned checkpoint only fits the inference-only model
+    if not cfg.MULTI_DATASET.INFERENCE_DATASET:
+        cfg.MULTI_DATASET.INFERENCE_DATASET = pruned_dataset(cfg.MODEL.WEIGHTS) or ""
+    cfg.freeze()
+    return cfg
+
+
+def setup_maskdino_cfg(config_file=MASKDINO_CONFIG, opts=()):
+    """Build the frozen detectron2 config of the MaskDINO segmenter."""
+    add_model_paths()
+    from detectron2.config import get_cfg
+    from detectron2.projects.deeplab import add_deeplab_config
+    from maskdino import add_maskdino_config
+
+    cfg = get_cfg()
+    add_deeplab_config(cfg)
+    add_maskdino_config(cfg)
+    cfg.merge_from_file(str(config_file))
+    cfg.merge_from_list(list(opts))
+    cfg.freeze()
+    return cfg
+
+
+def build_unidet(cfg, num_workers: int = 0, num_threads: int | None = None, batch_size: int = 1):
+    """
+    Load the UniDet weights and return a ready `UnifiedVisualizationDemo`.
+
+    With `num_workers` > 0, the model runs in a pool of that many worker processes
+    (`AsyncPredictor`, one per GPU unless MODEL.DEVICE is cpu), each with `num_threads`
+    intra-op threads (default: its share of the cores). Otherwise, with `batch_size` > 1,
+    the in-process model runs on batches of that many images (`BatchPredictor`).
+    """
+    add_model_paths()
+    from unidet.predictor import UnifiedVisualizationDemo
+
+    if num_workers > 0:
+        return UnifiedVisualizationDemo(cfg, parallel=True, num_workers=num_workers, num_threads=num_threads)
+    return UnifiedVisualizationDemo(cfg, batch_size=batch_size)
+
+
+def build_maskdino(cfg, num_workers: int = 0, num_threads: int | None = None):
+    """
+    Load the MaskDINO weights and return a ready `VisualizationDemo`.
+
+    With `num_workers` > 0, the model runs in a pool of that many worker processes
+    (`AsyncPredictor`, one per GPU unless MODEL.DEVICE is cpu), each with `num_threads`
+    intra-op threads (default: its share of the cores).
+    """
+    add_model_paths()
+    from predictor import VisualizationDemo
+
+    if num_workers > 0:
+        return VisualizationDemo(cfg, parallel=True, num_workers=num_workers, num_threads=num_threads)
+    return VisualizationDemo(cfg)
@@ -0,0 +1,5 @@
+"""
+Performance checks and micro-benchmarks of the HRS benchmark tooling.
+
+Each module is runnable with `python -m hrsbench.perf.<module>`.
+"""
@@ -0,0 +1,61 @@
+"""
+HRS accuracy parity and CPU throughput of bf16 autocast inference against fp32.
+
+Runs the counting, spatial and size detection stages with UniDet and the color
+segmentation stage with MaskDINO, once in fp32 and once with MODEL.PRECISION bf16,
+scores each run and reports the images/sec of each stage, the speedup of bf16 and
+the change of every averaged HRS metric:
+
+    python -m hrsbench.perf.bf16 /path/to/images --limit 200
+
+bf16 only pays off on CPUs with native bf16 kernels (AMX or AVX512-BF16); elsewhere
+it is emulated and slower than fp32.
+"""
+import argparse
+import os
+import tempfile
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HRS accuracy and throughput of bf16 inference.")
+    parser.add_argument("image_root", metavar="IMAGE_ROOT", help="Directory holding the <task>_seed<seed> directories")
+    parser.add_argument("--seed", type=int, default=42, help="Generation seed of the task directories")
+    parser.add_argument("--limit", type=int, default=200, help="Images per task; 0 for all")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads (default: torch's)")
+    parser.add_argument("--unidet-opts", nargs="*", default=[], help="Extra UniDet config options of both runs")
+    parser.add_argument("--maskdino-opts", nargs="*", default=[], help="Extra MaskDINO config options of both runs")
+    args = parser.parse_args(argv)
+
+    import torch
+
+    from hrsbench import benchmark, models
+    from hrsbench.perf.variants import detection_task_dirs, report, run_color, run_variants
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    if not torch.ops.mkldnn._is_mkldnn_bf16_supported():
+        print("Warning: this CPU has no native bf16 support; bf16 timings are emulated")
+    limit = args.limit or None
+    task_dirs = detection_task_dirs(args.image_root, args.seed)
+    color_dir = benchmark.find_task_dirs(args.image_root, args.seed).get("color")
+    if not task_dirs and color_dir is None:
+        parser.error(f"no task directory for seed {args.seed} in {args.image_root}")
+
+    precisions = ("fp32", "bf16")
+    runs = {name: {} for name in precisions}
+    if task_dirs:
+        variants = [(name, [*args.unidet_opts, "MODEL.PRECISION", name]) for name in precisions]
+        for name, task_runs in run_variants(variants, task_dirs, limit).items():
+            runs[name].update(task_runs)
+    if color_dir is not None:
+        models.download_weights(unidet=False)
+        with tempfile.TemporaryDirectory(prefix="hrsbench-bf16-") as tmp_dir:
+            for name in precisions:
+                output_dir = os.path.join(tmp_dir, name)
+                os.makedirs(output_dir)
+                runs[name].update(run_color([*args.maskdino_opts, "MODEL.PRECISION", name], color_dir, limit, output_dir))
+    report(runs)
+
+
+if __name__ == "__main__":
+    main()
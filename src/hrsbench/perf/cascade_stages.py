@@ -0,0 +1,37 @@
+"""
+Latency and HRS accuracy of UniDet with fewer cascade stages at inference.
+
+Runs the counting, spatial and size detection stages with the first k cascade
+stages only (MODEL.ROI_BOX_CASCADE_HEAD.NUM_TEST_STAGES, scores averaged over the
+stages that ran) for each k, and reports images/sec, the speedup over the first k
+given and the change of every averaged HRS metric:
+
+    python -m hrsbench.perf.cascade_stages /path/to/images --limit 200 --stages 3 2 1
+"""
+import argparse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latency and HRS accuracy of UniDet cascade early exit.")
+    parser.add_argument("image_root", metavar="IMAGE_ROOT", help="Directory holding the <task>_seed<seed> directories")
+    parser.add_argument("--seed", type=int, default=42, help="Generation seed of the task directories")
+    parser.add_argument("--limit", type=int, default=200, help="Images per task; 0 for all")
+    parser.add_argument(
+        "--stages", type=int, nargs="+", default=[3, 2, 1], help="Values of k; the first one is the reference"
+    )
+    parser.add_argument("--unidet-opts", nargs="*", default=[], help="Extra UniDet config options of every run")
+    args = parser.parse_args(argv)
+
+    from hrsbench.perf.variants import detection_task_dirs, report, run_variants
+
+    task_dirs = detection_task_dirs(args.image_root, args.seed)
+    if not task_dirs:
+        parser.error(f"no counting/spatial/size task directory for seed {args.seed} in {args.image_root}")
+    variants = [
+        (f"k={k}", [*args.unidet_opts, "MODEL.ROI_BOX_CASCADE_HEAD.NUM_TEST_STAGES", str(k)]) for k in args.stages
+    ]
+    report(run_variants(variants, task_dirs, args.limit or None))
+
+
+if __name__ == "__main__":
+    main()
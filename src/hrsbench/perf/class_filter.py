@@ -0,0 +1,94 @@
+"""
+Equivalence check and timing of the prompt-conditioned class filter of UniDet.
+
+Runs the detection stage of a task over the same images with the full vocabulary
+(`--classes all`) and with the classes of each prompt (`--classes prompt`), scores
+both pickles and reports the time of each run, whether the scored metrics are
+identical and which images the scorer judges differently:
+
+    python -m hrsbench.perf.class_filter counting /path/to/counting_seed42 --limit 200
+
+The two can legitimately differ on an image when dropping the other classes lets
+an expected detection survive the `DETECTIONS_PER_IMAGE` cap, or when a box of
+another class with the same integer coordinates hid it in the pickle.
+"""
+import argparse
+import os
+import tempfile
+import time
+import warnings
+
+
+def run(demo, task: str, image_paths: list[str], output_dir: str, classes: str):
+    """
+    Detect and score `image_paths` with `classes`.
+
+    Returns:
+        tuple: (seconds spent in the detection stage, pickle entries by prompt index, scorer results)
+    """
+    from hrsbench import benchmark, stages
+
+    pkl_path = os.path.join(output_dir, f"{task}.pkl")
+    start = time.perf_counter()
+    entries = stages.run_detection(
+        demo, image_paths, task=task, output_base_dir=output_dir, pkl_path=pkl_path, render="none", classes=classes
+    )
+    seconds = time.perf_counter() - start
+    with warnings.catch_warnings():
+        # images beyond --limit are missing from the pickle
+        warnings.simplefilter("ignore")
+        results = benchmark.load_scorer(task)(pkl_path)
+    return seconds, entries, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scored metrics and time of UniDet with and without prompt classes.")
+    parser.add_argument("task", choices=("counting", "spatial", "size"))
+    parser.add_argument("image_dir", metavar="IMAGE_DIR", help="Directory of the images of the task")
+    parser.add_argument("--limit", type=int, default=None, help="Number of images to run (default: all)")
+    parser.add_argument("--opts", nargs="*", default=[], help="Extra UniDet config options as 'KEY VALUE' pairs")
+    args = parser.parse_args(argv)
+
+    from hrsbench import HRSBENCH_DATA_ROOT, benchmark, models, stages
+
+    models.download_weights(maskdino=False)
+    image_paths = stages.collect_images(args.image_dir)[:args.limit]
+    demo, _ = benchmark.load_unidet(args.opts)
+    # the first image pays one-time allocations
+    list(stages._predict(demo, stages._read_inputs(image_paths[:1])))
+
+    runs = {}
+    with tempfile.TemporaryDirectory(prefix="hrsbench-classes-") as tmp_dir:
+        for classes in ("all", "prompt"):
+            output_dir = os.path.join(tmp_dir, classes)
+            os.makedirs(output_dir)
+            runs[classes] = run(demo, args.task, image_paths, output_dir, classes)
+
+    scorer = benchmark.load_scorer_module(args.task)
+    gt_data = scorer.load_gt(jsonl_path=str(HRSBENCH_DATA_ROOT / f"{args.task}.jsonl"))
+    verdicts = {
+        classes: {
+            idx: scorer.image_correct(gt_data[int(idx)], entry)
+            for idx, entry in entries.items() if idx.isdigit() and int(idx) < len(gt_data)
+        }
+        for classes, (_, entries, _) in runs.items()
+    }
+    changed = sorted((idx for idx in verdicts["all"] if verdicts["all"][idx] != verdicts["prompt"][idx]), key=int)
+
+    print(f"\n{'classes':>8} {'seconds':>9} {'images/s':>9} {'correct':>8}")
+    for classes, (seconds, _, _) in runs.items():
+        print(
+            f"{classes:>8} {seconds:>9.2f} {len(image_paths) / seconds:>9.2f} "
+            f"{sum(verdicts[classes].values()):>8}"
+        )
+    print(f"speedup: {runs['all'][0] / runs['prompt'][0]:.2f}x")
+    same = runs["all"][2] == runs["prompt"][2]
+    print(f"scored metrics identical: {same}")
+    if not same:
+        print(f"  all:    {runs['all'][2]}")
+        print(f"  prompt: {runs['prompt'][2]}")
+    print(f"images judged differently: {len(changed)}" + (f" ({', '.join(changed[:20])})" if changed else ""))
+
+
+if __name__ == "__main__":
+    main()
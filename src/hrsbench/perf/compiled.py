@@ -0,0 +1,98 @@
+"""
+Warm-up and steady-state latency of the compiled backbones against eager.
+
+Builds the in-process UniDet or MaskDINO three times, each run over the same images
+one at a time:
+
+    eager      MODEL.COMPILE.ENABLED False
+    cold       compiled, into an empty package directory: the warm-up images pay the
+               export and AOTInductor compilation of their padded shape
+    warm       compiled again, loading the packages the cold run saved
+
+and reports separately the model build time, the time of the first `--warmup`
+images and the steady-state per-image latency after them, the share of backbone
+calls that ran a compiled package, and the output parity of the warm run with eager:
+
+    python -m hrsbench.perf.compiled unidet /path/to/counting_seed42 --limit 64
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+
+def run(model: str, image_paths: list[str], opts=(), score_thresh: float = 0.5):
+    """
+    Build `model` with `opts` and run it on `image_paths`.
+
+    Returns:
+        tuple: (build seconds, per-image model seconds, per-image outputs as in
+        `hrsbench.perf.throughput`, share of backbone calls run compiled)
+    """
+    from hrsbench import benchmark, stages
+    from hrsbench.perf.throughput import _outputs
+
+    load = benchmark.load_unidet if model == "unidet" else benchmark.load_maskdino
+    start = time.perf_counter()
+    demo, _ = load(opts)
+    build_seconds = time.perf_counter() - start
+    predictor = demo.predictor
+
+    seconds = []
+    outputs = []
+    for _, img, _, _, model_input in stages._read_inputs(image_paths, preprocess=predictor.preprocess):
+        start = time.perf_counter()
+        predictions = predictor.predict_inputs([model_input])[0]
+        seconds.append(time.perf_counter() - start)
+        outputs.append(_outputs(model, predictions, score_thresh))
+    backbone = predictor.model.backbone
+    calls = getattr(backbone, "compiled_calls", 0) + getattr(backbone, "eager_calls", 0)
+    compiled_share = getattr(backbone, "compiled_calls", 0) / calls if calls else 0.0
+    return build_seconds, seconds, outputs, compiled_share
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm-up and steady-state latency of the compiled backbones.")
+    parser.add_argument("model", choices=("unidet", "maskdino"))
+    parser.add_argument("image_dir", metavar="IMAGE_DIR", help="Directory of images to run on, e.g. a task directory")
+    parser.add_argument("--limit", type=int, default=64, help="Number of images to run")
+    parser.add_argument("--warmup", type=int, default=2, help="Images counted as warm-up")
+    parser.add_argument("--opts", nargs="*", default=[], help="Extra config options of every run")
+    args = parser.parse_args(argv)
+
+    from hrsbench import models, stages
+    from hrsbench.perf.parity import compare
+
+    models.download_weights(unidet=args.model == "unidet", maskdino=args.model == "maskdino")
+    image_paths = stages.collect_images(args.image_dir)[:args.limit]
+    if len(image_paths) <= args.warmup:
+        parser.error(f"need more than --warmup {args.warmup} images in {args.image_dir}")
+
+    runs = {}
+    with tempfile.TemporaryDirectory(prefix="hrsbench-compiled-") as package_dir:
+        # compile the first shape right away, so the cold warm-up includes it
+        compiled_opts = [
+            "MODEL.COMPILE.ENABLED", "True", "MODEL.COMPILE.CACHE_DIR", package_dir, "MODEL.COMPILE.MIN_COUNT", "1"
+        ]
+        runs["eager"] = run(args.model, image_paths, args.opts)
+        runs["cold"] = run(args.model, image_paths, [*args.opts, *compiled_opts])
+        runs["warm"] = run(args.model, image_paths, [*args.opts, *compiled_opts])
+
+    eager_steady = statistics.median(runs["eager"][1][args.warmup:])
+    print(
+        f"\n{'run':>6} {'build s':>8} {'warm-up s':>10} {'steady ms':>10} {'images/s':>9} {'speedup':>8} "
+        f"{'compiled':>9}"
+    )
+    for name, (build_seconds, seconds, _, compiled_share) in runs.items():
+        steady = statistics.median(seconds[args.warmup:])
+        print(
+            f"{name:>6} {build_seconds:>8.1f} {sum(seconds[:args.warmup]):>10.1f} {steady * 1e3:>10.1f} "
+            f"{1 / steady:>9.2f} {eager_steady / steady:>7.2f}x {compiled_share:>8.0%}"
+        )
+    print("warm vs eager outputs:")
+    for key, value in compare(args.model, runs["eager"][2], runs["warm"][2]).items():
+        print(f"  {key}: {value:g}" + (f" of {len(image_paths)}" if key == "images changed" else ""))
+
+
+if __name__ == "__main__":
+    main()
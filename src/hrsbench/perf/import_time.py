@@ -0,0 +1,93 @@
+"""
+Import-time benchmark guarding the fast startup of the CLI and the scorers.
+
+Every target module is imported in a fresh interpreter, which reports the wall time
+of the import and the modules it pulled in. The check fails (exit code 1) when a
+target imports one of its forbidden modules (e.g. torch for a scorer) or exceeds its
+time budget:
+
+    python -m hrsbench.perf.import_time [--repeat N] [--budget-scale S]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# model stacks that must never be imported by the CLI or the scoring path
+MODEL_STACKS = ("torch", "torchvision", "detectron2", "cv2", "timm", "fvcore")
+
+# (module, forbidden top-level modules, time budget in ms)
+TARGETS = (
+    ("hrsbench.cli", MODEL_STACKS + ("numpy",), 100),
+    ("hrsbench.benchmark", MODEL_STACKS + ("numpy",), 100),
+    ("hrsbench.client", MODEL_STACKS + ("numpy",), 100),
+    ("hrsbench.counting.calc_counting_acc", MODEL_STACKS, 100),
+    ("hrsbench.compositions.calc_spatial_relation_acc", MODEL_STACKS, 100),
+    ("hrsbench.compositions.calc_size_comp_acc", MODEL_STACKS, 100),
+    # NumPy is needed to read the masks
+    ("hrsbench.colors.hue_based_color_classifier", MODEL_STACKS, 400),
+)
+
+_PROBE = """
+import json, sys, time
+before = set(sys.modules)
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1000, "modules": sorted(set(sys.modules) - before)}}))
+"""
+
+
+def measure(module: str, repeat: int = 5) -> tuple[float, set[str]]:
+    """
+    Import `module` in `repeat` fresh interpreters.
+
+    Returns:
+        tuple[float, set[str]]: median import time in ms and the top-level modules it imported.
+    """
+    times = []
+    imported = set()
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module)], capture_output=True, text=True, check=True
+        ).stdout
+        report = json.loads(out.strip().splitlines()[-1])
+        times.append(report["ms"])
+        imported.update(name.split(".")[0] for name in report["modules"])
+    return statistics.median(times), imported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per target (median is reported)")
+    parser.add_argument(
+        "--budget-scale", type=float, default=1.0, help="Multiply every time budget, e.g. for slow CI machines"
+    )
+    args = parser.parse_args(argv)
+
+    failures = []
+    print(f"{'module':<50} {'ms':>8} {'budget':>8}  forbidden imports")
+    for module, forbidden, budget_ms in TARGETS:
+        try:
+            ms, imported = measure(module, args.repeat)
+        except subprocess.CalledProcessError as e:
+            failures.append(f"{module}: import failed\n{e.stderr}")
+            print(f"{module:<50} {'error':>8}")
+            continue
+        budget_ms *= args.budget_scale
+        leaked = sorted(imported.intersection(forbidden))
+        print(f"{module:<50} {ms:8.1f} {budget_ms:8.0f}  {', '.join(leaked) or '-'}")
+        if leaked:
+            failures.append(f"{module} imports {', '.join(leaked)}")
+        if ms > budget_ms:
+            failures.append(f"{module} takes {ms:.1f} ms to import (budget {budget_ms:.0f} ms)")
+
+    if failures:
+        print("\nImport-time regressions:\n" + "\n".join(f"  {failure}" for failure in failures), file=sys.stderr)
+        sys.exit(1)
+    print("\nNo import-time regression")
+
+
+if __name__ == "__main__":
+    main()
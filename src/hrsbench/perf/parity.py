@@ -0,0 +1,105 @@
+"""
+Output parity and latency of a model variant against the reference model.
+
+Builds the in-process UniDet or MaskDINO once with the reference config options and
+once with the variant options, runs both over the same images one at a time and
+reports the per-image model latency (preprocessing excluded, after a warm-up) and
+how far the outputs of the variant are from the reference:
+
+    python -m hrsbench.perf.parity unidet /path/to/counting_seed42 --limit 32 \\
+        --reference-opts MODEL.FOLD_BN False --variant-opts MODEL.FOLD_BN True
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+
+def run(model: str, image_paths: list[str], opts=(), warmup: int = 2, score_thresh: float = 0.5):
+    """
+    Build `model` with `opts` and run it on `image_paths`.
+
+    Returns:
+        tuple: (per-image model seconds, per-image outputs as in `hrsbench.perf.throughput`)
+    """
+    from hrsbench import benchmark, stages
+    from hrsbench.perf.throughput import _outputs
+
+    load = benchmark.load_unidet if model == "unidet" else benchmark.load_maskdino
+    demo, _ = load(opts)
+    predictor = demo.predictor
+    for _, img, _, _, model_input in stages._read_inputs(image_paths[:warmup], preprocess=predictor.preprocess):
+        predictor.predict_inputs([model_input])
+
+    seconds = []
+    outputs = []
+    for _, img, _, _, model_input in stages._read_inputs(image_paths, preprocess=predictor.preprocess):
+        start = time.perf_counter()
+        predictions = predictor.predict_inputs([model_input])[0]
+        seconds.append(time.perf_counter() - start)
+        outputs.append(_outputs(model, predictions, score_thresh))
+    return seconds, outputs
+
+
+def compare(model: str, reference: list, variant: list) -> dict[str, float]:
+    """
+    Distance of the variant outputs from the reference outputs, image by image.
+
+    Images whose detected classes (UniDet) or kept mask classes (MaskDINO) differ
+    are counted; boxes and scores (UniDet) or mask pixels (MaskDINO) are compared on
+    the other images.
+    """
+    from hrsbench import stages
+
+    changed = 0
+    box_diff = score_diff = pixel_diff = 0.0
+    for a, b in zip(reference, variant):
+        if model == "unidet":
+            if not np.array_equal(a["pred_classes"], b["pred_classes"]):
+                changed += 1
+            elif len(a["pred_classes"]):
+                box_diff = max(box_diff, float(np.abs(a["pred_boxes"] - b["pred_boxes"]).max()))
+                score_diff = max(score_diff, float(np.abs(a["scores"] - b["scores"]).max()))
+        else:
+            masks_a, masks_b = stages._unpack_masks(a), stages._unpack_masks(b)
+            if [c for c, _ in masks_a] != [c for c, _ in masks_b]:
+                changed += 1
+            else:
+                for (_, mask_a), (_, mask_b) in zip(masks_a, masks_b):
+                    pixel_diff = max(pixel_diff, float(np.mean(mask_a != mask_b)))
+    if model == "unidet":
+        return {"images changed": changed, "max box diff (px)": box_diff, "max score diff": score_diff}
+    return {"images changed": changed, "max mask pixels changed": pixel_diff}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Output parity and latency of a model variant.")
+    parser.add_argument("model", choices=("unidet", "maskdino"))
+    parser.add_argument("image_dir", metavar="IMAGE_DIR", help="Directory of images to run on, e.g. a task directory")
+    parser.add_argument("--limit", type=int, default=32, help="Number of images to run")
+    parser.add_argument("--warmup", type=int, default=2, help="Images run before timing starts")
+    parser.add_argument("--reference-opts", nargs="*", default=[], help="Config options of the reference model")
+    parser.add_argument("--variant-opts", nargs="*", default=[], help="Config options of the variant")
+    args = parser.parse_args(argv)
+
+    from hrsbench import models, stages
+
+    models.download_weights(unidet=args.model == "unidet", maskdino=args.model == "maskdino")
+    image_paths = stages.collect_images(args.image_dir)[:args.limit]
+
+    ref_seconds, ref_outputs = run(args.model, image_paths, args.reference_opts, args.warmup)
+    var_seconds, var_outputs = run(
+        args.model, image_paths, [*args.reference_opts, *args.variant_opts], args.warmup
+    )
+
+    print(f"\n{'':>10} {'median ms':>10} {'mean ms':>10}")
+    for name, seconds in (("reference", ref_seconds), ("variant", var_seconds)):
+        print(f"{name:>10} {statistics.median(seconds) * 1e3:>10.1f} {statistics.mean(seconds) * 1e3:>10.1f}")
+    print(f"speedup: {statistics.median(ref_seconds) / statistics.median(var_seconds):.2f}x (median)")
+    for key, value in compare(args.model, ref_outputs, var_outputs).items():
+        print(f"{key}: {value:g}" + (f" of {len(image_paths)}" if key == "images changed" else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Numerical check and CPU timing of the fused `SplAtConv2d` inference path.
+
+Builds a split-attention conv (radix 2, batch norms folded as at inference) at the
+width and resolution of each ResNeSt-101 stage for an image resized to `--size`
+pixels, runs the reference split path and the fused path on the same input, and
+reports the largest output difference and the time of both, per block and for the
+blocks of a whole backbone forward:
+
+    python -m hrsbench.perf.splat --size 800 --threads 4
+"""
+import argparse
+import time
+
+# (bottleneck width, stride of the feature map, number of blocks) of the ResNeSt-101 stages
+RESNEST101_STAGES = ((64, 4, 3), (128, 8, 4), (256, 16, 23), (512, 32, 3))
+
+
+def _time(fn, x, repeat: int) -> float:
+    for _ in range(2):
+        fn(x)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(x)
+    return (time.perf_counter() - start) / repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Numerical check and timing of the fused SplAtConv2d path.")
+    parser.add_argument("--size", type=int, default=800, help="Side of the resized input image")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per path and stage")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads (default: torch's)")
+    args = parser.parse_args(argv)
+
+    import torch
+
+    from hrsbench.models import add_model_paths
+
+    add_model_paths()
+    from unidet.modeling.backbone.splat import SplAtConv2d
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+
+    print(f"{'width':>6} {'map':>9} {'max diff':>9} {'split ms':>9} {'fused ms':>9} {'speedup':>8}")
+    total_split = total_fused = 0.0
+    with torch.no_grad():
+        for width, stride, num_blocks in RESNEST101_STAGES:
+            side = args.size // stride
+            module = SplAtConv2d(width, width, 3, padding=1, radix=2, groups=1, bias=True, norm=None).eval()
+            x = torch.randn(1, width, side, side)
+
+            def split(x):
+                module.fused = False
+                try:
+                    return module(x)
+                finally:
+                    del module.fused
+
+            diff = (split(x) - module(x)).abs().max().item()
+            split_seconds = _time(split, x, args.repeat)
+            fused_seconds = _time(module, x, args.repeat)
+            total_split += num_blocks * split_seconds
+            total_fused += num_blocks * fused_seconds
+            print(
+                f"{width:>6} {f'{side}x{side}':>9} {diff:>9.1e} {split_seconds * 1e3:>9.2f} "
+                f"{fused_seconds * 1e3:>9.2f} {split_seconds / fused_seconds:>7.2f}x"
+            )
+    print(
+        f"all {sum(n for _, _, n in RESNEST101_STAGES)} blocks: {total_split * 1e3:.1f} ms split, "
+        f"{total_fused * 1e3:.1f} ms fused ({total_split / total_fused:.2f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Throughput benchmark of the CPU worker pool and of batched UniDet inference.
+
+Runs UniDet or MaskDINO over the same images in process (`--workers 0`) and with
+worker pools of several sizes, or UniDet in process with several batch sizes,
+reports images/sec and checks that every configuration reproduces the outputs of
+the first one:
+
+    python -m hrsbench.perf.throughput unidet /path/to/counting_seed42 --limit 64 --workers 0 2 4
+    python -m hrsbench.perf.throughput unidet /path/to/counting_seed42 --limit 64 --workers 0 --batch-sizes 1 2 4 8
+"""
+import argparse
+import time
+
+import numpy as np
+
+
+def _outputs(model: str, predictions, score_thresh: float):
+    from hrsbench import stages
+
+    if model == "unidet":
+        return stages._detection_outputs(predictions)
+    return stages._pack_masks(stages._kept_masks(predictions, score_thresh))
+
+
+def _same_outputs(model: str, a, b) -> bool:
+    if model == "unidet":
+        return all(np.array_equal(a[key], b[key]) for key in ("pred_boxes", "scores", "pred_classes"))
+    return len(a) == len(b) and all(
+        class_a == class_b and np.array_equal(bits_a, bits_b) for (class_a, _, bits_a), (class_b, _, bits_b) in zip(a, b)
+    )
+
+
+def run(
+    model: str,
+    image_paths: list[str],
+    num_workers: int,
+    threads_per_worker: int | None,
+    opts=(),
+    score_thresh: float = 0.5,
+    batch_size: int = 1,
+    prefetch: int | None = None,
+):
+    """
+    Build `model` with `num_workers` workers (or UniDet with `batch_size`) and push `image_paths` through it.
+
+    Returns:
+        tuple: (seconds spent on the images, per-image outputs)
+    """
+    from hrsbench import benchmark, stages
+
+    if model == "unidet":
+        demo, _ = benchmark.load_unidet(
+            opts, num_workers=num_workers, threads_per_worker=threads_per_worker, batch_size=batch_size
+        )
+    else:
+        demo, _ = benchmark.load_maskdino(opts, num_workers=num_workers, threads_per_worker=threads_per_worker)
+    try:
+        # the first images pay one-time allocations in every worker
+        list(stages._predict(demo, stages._read_inputs(image_paths[:max(num_workers, batch_size)])))
+        prefetch = stages.PREFETCH if prefetch is None else prefetch
+        inputs = stages._read_inputs(image_paths, preprocess=stages._preprocessor(demo), prefetch=prefetch)
+        start = time.perf_counter()
+        outputs = [
+            _outputs(model, predictions, score_thresh)
+            for _, predictions in stages._predict(demo, inputs)
+        ]
+        return time.perf_counter() - start, outputs
+    finally:
+        if demo.parallel:
+            demo.predictor.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput of the in-process model and of CPU worker pools.")
+    parser.add_argument("model", choices=("unidet", "maskdino"))
+    parser.add_argument("image_dir", metavar="IMAGE_DIR", help="Directory of images to run on, e.g. a task directory")
+    parser.add_argument("--limit", type=int, default=32, help="Number of images to run")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 2, 4], help="Worker counts to compare (0: in process)")
+    parser.add_argument(
+        "--batch-sizes", type=int, nargs="+", default=[1], help="UniDet batch sizes to compare, with --workers 0"
+    )
+    parser.add_argument(
+        "--prefetch", type=int, default=None, help="Threads decoding and preprocessing images ahead (0: none)"
+    )
+    parser.add_argument("--threads-per-worker", type=int, default=None, help="Intra-op threads of each worker")
+    parser.add_argument("--opts", nargs="*", default=[], help="Extra config options as 'KEY VALUE' pairs")
+    args = parser.parse_args(argv)
+
+    import multiprocessing as mp
+
+    mp.set_start_method("spawn", force=True)
+
+    from hrsbench import models, stages
+
+    models.download_weights(unidet=args.model == "unidet", maskdino=args.model == "maskdino")
+    image_paths = stages.collect_images(args.image_dir)[:args.limit]
+
+    # batching runs in process only
+    configs = [(num_workers, 1) for num_workers in args.workers if num_workers > 0]
+    if 0 in args.workers:
+        batch_sizes = args.batch_sizes if args.model == "unidet" else [1]
+        configs[:0] = [(0, batch_size) for batch_size in batch_sizes]
+
+    reference = None
+    rows = []
+    for num_workers, batch_size in configs:
+        seconds, outputs = run(
+            args.model,
+            image_paths,
+            num_workers,
+            args.threads_per_worker,
+            args.opts,
+            batch_size=batch_size,
+            prefetch=args.prefetch,
+        )
+        if reference is None:
+            reference = outputs
+        mismatches = sum(not _same_outputs(args.model, a, b) for a, b in zip(reference, outputs))
+        rows.append((num_workers, batch_size, len(image_paths) / seconds, mismatches))
+        print(
+            f"workers={num_workers} batch_size={batch_size}: {len(image_paths) / seconds:.2f} images/s, "
+            f"{mismatches} images differ"
+        )
+
+    base = rows[0][2]
+    print(f"\n{'workers':>8} {'batch':>6} {'images/s':>10} {'speedup':>8} {'mismatches':>11}")
+    for num_workers, batch_size, throughput, mismatches in rows:
+        print(f"{num_workers:>8} {batch_size:>6} {throughput:>10.2f} {throughput / base:>7.2f}x {mismatches:>11}")
+
+
+if __name__ == "__main__":
+    main()
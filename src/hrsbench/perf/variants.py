@@ -0,0 +1,154 @@
+"""
+Latency and HRS accuracy of UniDet variants against a reference configuration.
+
+Runs the detection stage of every detection task found under an HRS image root
+(counting, spatial, size) once with the reference config options and once per
+variant, scores each pickle, and reports the images/sec of each run, the speedup
+over the reference and the change of every averaged HRS metric:
+
+    python -m hrsbench.perf.variants /path/to/images --limit 200 \\
+        --variant int8 MODEL.PRECISION int8 MODEL.QUANT.CALIBRATION_DIR /path/to/calibration_images
+
+Each variant is given as a name followed by its config options, on top of the
+reference options. Models are built one at a time, in process.
+"""
+import argparse
+import contextlib
+import gc
+import io
+import os
+import tempfile
+import time
+import warnings
+
+
+def run(opts, task_dirs: dict, limit: int | None, output_dir: str) -> dict[str, tuple[float, int, dict]]:
+    """
+    Detect and score the images of each task with UniDet built with `opts`.
+
+    Returns:
+        dict: task -> (seconds spent in the detection stage, number of images, `sweep.level_metrics`)
+    """
+    from hrsbench import benchmark, stages
+    from hrsbench.sweep import level_metrics
+
+    demo, _ = benchmark.load_unidet(opts)
+    # the first image pays one-time allocations
+    first_dir = next(iter(task_dirs.values()))
+    list(stages._predict(demo, stages._read_inputs(stages.collect_images(str(first_dir))[:1])))
+
+    runs = {}
+    for task, task_dir in task_dirs.items():
+        image_paths = sorted(stages.collect_images(str(task_dir)))[:limit]
+        pkl_path = os.path.join(output_dir, f"{task}.pkl")
+        start = time.perf_counter()
+        stages.run_detection(demo, image_paths, task=task, output_base_dir=output_dir, pkl_path=pkl_path, render="none")
+        seconds = time.perf_counter() - start
+        with warnings.catch_warnings(), contextlib.redirect_stdout(io.StringIO()):
+            # images beyond --limit are missing from the pickle
+            warnings.simplefilter("ignore")
+            results = benchmark.load_scorer(task)(pkl_path)
+        runs[task] = (seconds, len(image_paths), level_metrics(task, results))
+    del demo
+    gc.collect()
+    return runs
+
+
+def run_color(opts, task_dir, limit: int | None, output_dir: str) -> dict[str, tuple[float, int, dict]]:
+    """
+    Segment and score the images of the color task with MaskDINO built with `opts`.
+
+    Returns:
+        dict: "color" -> (seconds spent in the segmentation stage, number of images, `sweep.level_metrics`)
+    """
+    from hrsbench import benchmark, stages
+    from hrsbench.sweep import level_metrics
+
+    demo, _ = benchmark.load_maskdino(opts)
+    image_paths = sorted(stages.collect_images(str(task_dir), exclude=("layout.jpg", "layout.png")))[:limit]
+    list(stages._predict(demo, stages._read_inputs(image_paths[:1])))
+    start = time.perf_counter()
+    stages.run_segmentation(demo, image_paths, output_base_dir=output_dir)
+    seconds = time.perf_counter() - start
+    with warnings.catch_warnings(), contextlib.redirect_stdout(io.StringIO()):
+        warnings.simplefilter("ignore")
+        results = benchmark.score_task("color", output_dir, task_dir)
+    del demo
+    gc.collect()
+    return {"color": (seconds, len(image_paths), level_metrics("color", results))}
+
+
+def detection_task_dirs(image_root: str, seed: int) -> dict:
+    """The counting/spatial/size directories of `seed` found under `image_root`."""
+    from hrsbench import benchmark
+
+    return {
+        task: task_dir for task, task_dir in benchmark.find_task_dirs(image_root, seed).items()
+        if task in benchmark.DETECTION_TASKS
+    }
+
+
+def run_variants(variants: list[tuple[str, list]], task_dirs: dict, limit: int | None) -> dict[str, dict]:
+    """
+    `run` each (name, opts) of `variants` in turn, the first being the reference.
+
+    Returns:
+        dict: name -> the result of `run`.
+    """
+    from hrsbench import models
+
+    models.download_weights(maskdino=False)
+    runs = {}
+    with tempfile.TemporaryDirectory(prefix="hrsbench-variants-") as tmp_dir:
+        for i, (name, opts) in enumerate(variants):
+            output_dir = os.path.join(tmp_dir, str(i))
+            os.makedirs(output_dir)
+            runs[name] = run(opts, task_dirs, limit, output_dir)
+    return runs
+
+
+def report(runs: dict[str, dict]):
+    """Print images/sec, speedup and averaged metrics of each run against the first one."""
+    names = list(runs)
+    reference = runs[names[0]]
+    print(f"\n{'variant':>12} {'task':>9} {'images/s':>9} {'speedup':>8} {'metric':>10} {'avg':>7} {'delta':>7}")
+    for name in names:
+        for task, (seconds, num_images, metrics) in runs[name].items():
+            ref_seconds, _, ref_metrics = reference[task]
+            for i, (metric, per_level) in enumerate(metrics.items()):
+                timing = (
+                    f"{num_images / seconds:>9.2f} {ref_seconds / seconds:>7.2f}x" if i == 0 else f"{'':>9} {'':>8}"
+                )
+                delta = per_level["avg"] - ref_metrics[metric]["avg"]
+                print(f"{name:>12} {task:>9} {timing} {metric:>10} {per_level['avg']:>7.2f} {delta:>+7.2f}")
+    total = {name: sum(seconds for seconds, _, _ in task_runs.values()) for name, task_runs in runs.items()}
+    for name in names[1:]:
+        print(f"{name}: {total[names[0]] / total[name]:.2f}x the throughput of {names[0]} over all tasks")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latency and HRS accuracy of UniDet variants.")
+    parser.add_argument("image_root", metavar="IMAGE_ROOT", help="Directory holding the <task>_seed<seed> directories")
+    parser.add_argument("--seed", type=int, default=42, help="Generation seed of the task directories")
+    parser.add_argument("--limit", type=int, default=None, help="Images per task (default: all)")
+    parser.add_argument("--reference-name", default="reference", help="Name of the reference in the report")
+    parser.add_argument("--reference-opts", nargs="*", default=[], help="Config options of the reference")
+    parser.add_argument(
+        "--variant",
+        nargs="+",
+        action="append",
+        default=[],
+        metavar="NAME [KEY VALUE ...]",
+        help="A variant: its name followed by its config options; repeat for several variants",
+    )
+    args = parser.parse_args(argv)
+
+    task_dirs = detection_task_dirs(args.image_root, args.seed)
+    if not task_dirs:
+        parser.error(f"no counting/spatial/size task directory for seed {args.seed} in {args.image_root}")
+    variants = [(args.reference_name, []), *((v[0], v[1:]) for v in args.variant)]
+    report(run_variants([(name, [*args.reference_opts, *opts]) for name, opts in variants], task_dirs, args.limit))
+
+
+if __name__ == "__main__":
+    main()
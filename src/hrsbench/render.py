@@ -0,0 +1,110 @@
+"""
+Sampled rendering of the detection visualizations, off the critical path.
+
+Drawing every instance with detectron2's `Visualizer` and encoding a JPEG per image
+costs a large share of the per-image time of the detection stage. A `RenderPolicy`
+selects which images get a visualization:
+
+- `all`: every image (the default, as before);
+- `none`: predictions only;
+- `first:N`: the first N images of the task;
+- `every:K`: every K-th image of the task (the 1st, the K+1-th, ...);
+- `failures`: the images the task scorer judges wrong.
+
+Selected images are drawn and saved by a `Renderer` thread, while the stage moves
+on to the next image.
+"""
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+RENDER_MODES = ("all", "none", "first", "every", "failures")
+
+
+class RenderPolicy:
+    """Which images of a task get a visualization, parsed from `all`, `none`, `first:N`, `every:K` or `failures`."""
+
+    def __init__(self, spec: str = "all"):
+        mode, _, count = spec.partition(":")
+        if mode not in RENDER_MODES:
+            raise ValueError(f"Unknown render mode {spec!r}, expected one of all, none, first:N, every:K, failures")
+        if (mode in ("first", "every")) != bool(count):
+            raise ValueError(f"Render mode {spec!r}: first and every take a count (first:N, every:K), the others none")
+        if count and (not count.isdigit() or int(count) < 1):
+            raise ValueError(f"Render mode {spec!r}: the count must be a positive integer")
+        self.spec = spec
+        self.mode = mode
+        self.count = int(count) if count else 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "none"
+
+    @property
+    def needs_failures(self) -> bool:
+        return self.mode == "failures"
+
+    def selects(self, position: int, failed: bool = False) -> bool:
+        """Whether the image at `position` (0-based, in task order) gets rendered."""
+        if self.mode == "all":
+            return True
+        if self.mode == "first":
+            return position < self.count
+        if self.mode == "every":
+            return position % self.count == 0
+        if self.mode == "failures":
+            return failed
+        return False
+
+    def __repr__(self):
+        return f"RenderPolicy({self.spec!r})"
+
+
+def render_spec(spec: str) -> str:
+    """argparse type of `--render`: validates the spec and keeps it as a string."""
+    RenderPolicy(spec)
+    return spec
+
+
+class Renderer:
+    """
+    Run rendering jobs in a background thread.
+
+    At most `max_pending` jobs are queued; `submit` blocks beyond that, so a slow
+    disk cannot make images pile up in memory. Errors are logged and do not stop
+    the stage.
+    """
+
+    def __init__(self, max_pending: int = 8):
+        self._jobs = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="hrsbench-render", daemon=True)
+        self._thread.start()
+        self.num_rendered = 0
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            fn, args = job
+            try:
+                fn(*args)
+                self.num_rendered += 1
+            except Exception:
+                logger.exception("Rendering failed")
+
+    def submit(self, fn, *args):
+        self._jobs.put((fn, args))
+
+    def close(self):
+        """Wait for the queued jobs to finish."""
+        self._jobs.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
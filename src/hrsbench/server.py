@@ -0,0 +1,263 @@
+"""
+Long-lived evaluation daemon (`hrsbench serve`).
+
+The daemon builds UniDet and MaskDINO once and answers evaluation requests over
+HTTP, either on a Unix socket (default) or on a localhost TCP port:
+
+- `GET /health`: liveness probe, `{"status": "ok", ...}`.
+- `GET /metrics`: live progress of the request in flight in Prometheus text format,
+  see `hrsbench.metrics`.
+- `POST /evaluate` with a JSON body, either
+  `{"image_root": ..., "method_name": ..., "output_root": ..., "seed": ..., "resume": ...}`
+  (plus an optional `"render"`, which overrides the `--render` of the daemon)
+  to evaluate every `<task>_seed<seed>` directory like `run_hrsbench_eval`, or
+  `{"task": ..., "task_dir": ..., "output_dir": ...}` to evaluate one task directory.
+  Returns `{"results": {task: scorer results}}`. The scorers divide by every prompt of
+  HRS; for a subset, add `"per_image": true` to get
+  `{task: {"images": {image name: correct}, "accuracy": ...}}` over the submitted
+  images instead, see `hrsbench.benchmark.score_images`.
+- `POST /images?task=<task>&name=<prompt_idx>_<level>_<prompt>.png` with raw image
+  bytes as body: judges a single image against its prompt, in the `per_image` shape.
+
+Paths are interpreted on the server side, so clients should send absolute paths.
+Requests are served one at a time, as the models are not thread safe.
+"""
+import json
+import logging
+import os
+import signal
+import socketserver
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+from hrsbench.benchmark import TASKS, detect_runs, find_task_dirs, segment_runs
+from hrsbench.metrics import REGISTRY, render_prometheus
+
+logger = logging.getLogger(__name__)
+
+
+def default_socket_path() -> Path:
+    """Unix socket of the daemon: `$XDG_RUNTIME_DIR/hrsbench.sock` or `/tmp/hrsbench-<uid>.sock`."""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / "hrsbench.sock"
+    return Path(tempfile.gettempdir()) / f"hrsbench-{os.getuid()}.sock"
+
+
+class RequestError(Exception):
+    """Malformed request, answered with HTTP 400."""
+
+
+class EvaluationService:
+    """
+    Warm UniDet and MaskDINO sessions that evaluate requests one at a time.
+
+    Args:
+        unidet_opts / maskdino_opts: extra config options of the two models.
+        cache_dir / cache_size_gb: optional per-image inference cache, see `hrsbench.cache`.
+        num_workers / threads_per_worker: optional CPU worker pool of each model.
+        batch_size: images per UniDet forward when it runs in process.
+        render: detection images that get a visualization, see `hrsbench.render`.
+        classes: classes UniDet keeps, "all" or "prompt", see `hrsbench.stages.run_detection`.
+    """
+
+    def __init__(
+        self,
+        unidet_opts=(),
+        maskdino_opts=(),
+        cache_dir: str | Path | None = None,
+        cache_size_gb: float = 20.0,
+        num_workers: int = 0,
+        threads_per_worker: int | None = None,
+        batch_size: int = 1,
+        render: str = "all",
+        classes: str = "all",
+    ):
+        from hrsbench import models
+        from hrsbench.benchmark import load_maskdino, load_unidet
+
+        models.download_weights()
+        model_kwargs = dict(
+            cache_dir=cache_dir,
+            cache_size_gb=cache_size_gb,
+            num_workers=num_workers,
+            threads_per_worker=threads_per_worker,
+        )
+        self.unidet, self.unidet_cache = load_unidet(unidet_opts, **model_kwargs, batch_size=batch_size)
+        self.maskdino, self.maskdino_cache = load_maskdino(maskdino_opts, **model_kwargs)
+        self.render = render
+        self.classes = classes
+        self.lock = threading.Lock()
+        self.num_requests = 0
+
+    def evaluate_runs(
+        self,
+        runs: list[tuple[dict[str, Path], Path]],
+        resume: bool = False,
+        per_image: bool = False,
+        render: str | None = None,
+    ) -> list[dict[str, dict[str, Any]]]:
+        for _, output_dir in runs:
+            os.makedirs(output_dir, exist_ok=True)
+        render = self.render if render is None else render
+        with self.lock:
+            self.num_requests += 1
+            det_results = detect_runs(
+                self.unidet, runs, resume, self.unidet_cache, render, self.classes, per_image=per_image
+            )
+            seg_results = segment_runs(self.maskdino, runs, resume, self.maskdino_cache, per_image=per_image)
+        return [{**det, **seg} for det, seg in zip(det_results, seg_results)]
+
+    def evaluate(self, request: dict[str, Any]) -> dict[str, dict[str, Any]]:
+        """Evaluate an image root or a single task directory, see the module docstring."""
+        resume = bool(request.get("resume", False))
+        if "image_root" in request:
+            image_root = request["image_root"]
+            seed = int(request.get("seed", 42))
+            method_name = request.get("method_name") or Path(image_root).name
+            task_dirs = find_task_dirs(image_root, seed)
+            if not task_dirs:
+                raise FileNotFoundError(f"No task directories found with seed {seed} in {image_root}")
+            output_dir = Path(request.get("output_root", "./output")) / f"{method_name}_seed{seed}"
+        elif "task" in request:
+            task = _check_task(request["task"])
+            if not Path(request["task_dir"]).is_dir():
+                raise FileNotFoundError(f"Task directory not found: {request['task_dir']}")
+            task_dirs = {task: Path(request["task_dir"])}
+            output_dir = Path(request["output_dir"])
+        else:
+            raise RequestError("Expected either 'image_root' or 'task', 'task_dir' and 'output_dir'")
+        results, = self.evaluate_runs(
+            [(task_dirs, output_dir)],
+            resume=resume,
+            per_image=bool(request.get("per_image", False)),
+            render=request.get("render"),
+        )
+        return results
+
+    def evaluate_image(self, task: str, name: str, data: bytes) -> dict[str, dict[str, Any]]:
+        """Judge one image, named `<prompt_idx>_<level>_<prompt>.<ext>`, of `task`."""
+        from hrsbench.stages import image_index
+
+        task = _check_task(task)
+        if not name or os.path.basename(name) != name or Path(name).suffix.lower() not in (".png", ".jpg", ".jpeg"):
+            raise RequestError(f"Invalid image name: {name!r}")
+        if not image_index(name).isdigit():
+            raise RequestError(f"Image name does not start with a prompt index: {name!r}")
+        with tempfile.TemporaryDirectory(prefix="hrsbench-") as tmp_dir:
+            task_dir = Path(tmp_dir) / task
+            os.makedirs(task_dir)
+            with open(task_dir / name, "wb") as f:
+                f.write(data)
+            results, = self.evaluate_runs([({task: task_dir}, Path(tmp_dir) / "output")], per_image=True)
+        return results
+
+
+def _check_task(task: str) -> str:
+    if task not in TASKS:
+        raise RequestError(f"Unknown task type: {task}")
+    return task
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server_version = "hrsbench"
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+    def _reply(self, status: int, body: dict[str, Any]):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/metrics":
+            data = render_prometheus(REGISTRY.snapshot()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        if urlparse(self.path).path != "/health":
+            return self._reply(404, {"error": f"Unknown endpoint: {self.path}"})
+        service = self.server.service
+        self._reply(200, {"status": "ok", "pid": os.getpid(), "requests": service.num_requests})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        service = self.server.service
+        try:
+            if url.path == "/evaluate":
+                results = service.evaluate(json.loads(body))
+            elif url.path == "/images":
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                results = service.evaluate_image(query.get("task", ""), query.get("name", ""), body)
+            else:
+                return self._reply(404, {"error": f"Unknown endpoint: {self.path}"})
+        except (RequestError, KeyError, ValueError) as e:
+            return self._reply(400, {"error": f"Bad request: {e}"})
+        except FileNotFoundError as e:
+            return self._reply(404, {"error": str(e)})
+        except Exception as e:
+            logger.exception("Evaluation failed")
+            return self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+        self._reply(200, {"results": results})
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def serve(
+    service: EvaluationService,
+    socket_path: str | Path | None = None,
+    host: str = "127.0.0.1",
+    port: int | None = None,
+):
+    """
+    Serve `service` until interrupted, on `host:port` if `port` is given, else on a Unix socket.
+    """
+    if port is not None:
+        server = _TCPHTTPServer((host, port), _RequestHandler)
+        address = f"http://{host}:{port}"
+    else:
+        socket_path = Path(socket_path or default_socket_path())
+        if socket_path.exists():
+            from hrsbench.client import ping
+
+            if ping(f"unix:{socket_path}") is not None:
+                raise RuntimeError(f"An hrsbench server is already listening on {socket_path}")
+            # left behind by a server that did not shut down cleanly
+            os.remove(socket_path)
+        server = _UnixHTTPServer(str(socket_path), _RequestHandler)
+        os.chmod(socket_path, 0o600)
+        address = f"unix:{socket_path}"
+    server.service = service
+    # stop cleanly (and remove the socket) on SIGTERM too
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    logger.info(f"hrsbench server listening on {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down")
+    finally:
+        server.server_close()
+        if port is None:
+            os.remove(socket_path)
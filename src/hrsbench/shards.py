@@ -0,0 +1,178 @@
+"""
+Deterministic sharding of a stage over several processes or hosts, and merging.
+
+Images are assigned to shards by prompt index, so every sample of a prompt lands
+in the same shard on every host. A sharded stage writes one self-describing shard
+file (`<output>.shard-<id>-of-<n>`) holding its per-image results, which prompt
+indices the whole input had and a digest of the input file names. `merge_shards`
+checks that the given shards come from the same input, that every shard id is
+present exactly once and that every prompt index is covered exactly once, then
+writes the usual scorer inputs (the task pickle, or the color mask directory).
+"""
+import hashlib
+import os
+import pickle
+import zlib
+from pathlib import Path
+from typing import Any
+
+from hrsbench.journal import atomic_pickle_dump, atomic_write_bytes
+
+SHARD_FORMAT = "hrsbench-shard"
+SHARD_VERSION = 1
+
+
+class ShardError(ValueError):
+    """Shard files that do not merge into a complete, duplicate-free output."""
+
+
+def shard_of(prompt_idx: str, num_shards: int) -> int:
+    """Shard of a prompt index; stable across hosts and Python processes."""
+    if prompt_idx.isdigit():
+        return int(prompt_idx) % num_shards
+    return zlib.crc32(prompt_idx.encode()) % num_shards
+
+
+def select_shard(image_paths: list[str], num_shards: int, shard_id: int) -> list[str]:
+    """Images of `image_paths` that belong to shard `shard_id` of `num_shards`."""
+    from hrsbench.stages import image_index
+
+    if not 0 <= shard_id < num_shards:
+        raise ValueError(f"Shard id {shard_id} out of range for {num_shards} shards")
+    return [path for path in image_paths if shard_of(image_index(path), num_shards) == shard_id]
+
+
+def shard_path(output_path: str | Path, shard_id: int, num_shards: int) -> Path:
+    """Shard file standing for `output_path` (a task pickle or the mask directory)."""
+    output_path = Path(output_path)
+    return output_path.with_name(f"{output_path.name}.shard-{shard_id}-of-{num_shards}")
+
+
+def _sorted_indices(indices) -> list[str]:
+    return sorted(set(indices), key=lambda idx: (not idx.isdigit(), int(idx) if idx.isdigit() else 0, idx))
+
+
+def _inputs_digest(image_paths: list[str]) -> str:
+    names = sorted(os.path.basename(path) for path in image_paths)
+    return hashlib.sha256("\n".join(names).encode()).hexdigest()
+
+
+def write_shard(
+    path: str | Path,
+    stage: str,
+    task: str,
+    num_shards: int,
+    shard_id: int,
+    all_image_paths: list[str],
+    records: dict[str, Any],
+):
+    """
+    Write a shard file.
+
+    Args:
+        stage: "detection" (records are the `(prompt_idx, pickle entry)` journal values) or
+            "segmentation" (records are lists of `(mask name, PNG bytes)`).
+        all_image_paths: the whole, unsharded input of the stage.
+        records: results of this shard keyed by image file name.
+    """
+    from hrsbench.stages import image_index
+
+    atomic_pickle_dump({
+        "format": SHARD_FORMAT,
+        "version": SHARD_VERSION,
+        "stage": stage,
+        "task": task,
+        "num_shards": num_shards,
+        "shard_id": shard_id,
+        "prompt_indices": _sorted_indices(image_index(p) for p in all_image_paths),
+        "inputs_digest": _inputs_digest(all_image_paths),
+        "records": records,
+    }, path)
+
+
+def load_shard(path: str | Path) -> dict[str, Any]:
+    with open(path, "rb") as f:
+        shard = pickle.load(f)
+    if not isinstance(shard, dict) or shard.get("format") != SHARD_FORMAT:
+        raise ShardError(f"{path} is not an hrsbench shard file")
+    if shard["version"] != SHARD_VERSION:
+        raise ShardError(f"{path} has shard format version {shard['version']}, expected {SHARD_VERSION}")
+    return shard
+
+
+def validate_shards(shards: list[dict[str, Any]], names: list[str] | None = None):
+    """
+    Check that `shards` together cover their input exactly once.
+
+    Raises:
+        ShardError: on mixed inputs, missing or repeated shard ids, or missing or
+            duplicate prompt indices.
+    """
+    from hrsbench.stages import image_index
+
+    names = names or [f"shard {shard['shard_id']}" for shard in shards]
+    if not shards:
+        raise ShardError("No shard given")
+    first = shards[0]
+    for key in ("stage", "task", "num_shards", "inputs_digest", "prompt_indices"):
+        for shard, name in zip(shards, names):
+            if shard[key] != first[key]:
+                raise ShardError(f"{name} does not belong to the same sharded run as {names[0]} (different {key})")
+
+    num_shards = first["num_shards"]
+    seen_ids = {}
+    for shard, name in zip(shards, names):
+        if shard["shard_id"] in seen_ids:
+            raise ShardError(f"Shard {shard['shard_id']} given twice: {seen_ids[shard['shard_id']]} and {name}")
+        seen_ids[shard["shard_id"]] = name
+    missing_ids = sorted(set(range(num_shards)) - set(seen_ids))
+    if missing_ids:
+        raise ShardError(f"Missing shard(s) {missing_ids} of {num_shards}")
+
+    owner = {}
+    for shard, name in zip(shards, names):
+        for image_name in shard["records"]:
+            prompt_idx = image_index(image_name)
+            if shard_of(prompt_idx, num_shards) != shard["shard_id"]:
+                raise ShardError(f"{name} holds prompt index {prompt_idx}, which belongs to another shard")
+            if owner.setdefault(prompt_idx, name) != name:
+                raise ShardError(f"Prompt index {prompt_idx} is covered by both {owner[prompt_idx]} and {name}")
+    missing = [idx for idx in first["prompt_indices"] if idx not in owner]
+    if missing:
+        shown = ", ".join(missing[:10]) + (", ..." if len(missing) > 10 else "")
+        raise ShardError(f"{len(missing)} prompt index(es) not covered by any shard: {shown}")
+
+
+def merge_shards(shard_paths: list[str | Path], output_path: str | Path | None = None) -> Path:
+    """
+    Validate shard files and merge them into the scorer input.
+
+    `output_path` defaults to the path the shards stand for (their name without the
+    `.shard-<id>-of-<n>` suffix): the task pickle for detection shards, the mask
+    directory for segmentation shards.
+
+    Returns:
+        Path: the merged output.
+    """
+    shard_paths = [Path(path) for path in shard_paths]
+    shards = [load_shard(path) for path in shard_paths]
+    validate_shards(shards, [str(path) for path in shard_paths])
+    if output_path is None:
+        output_path = shard_paths[0].with_name(shard_paths[0].name.rsplit(".shard-", 1)[0])
+    output_path = Path(output_path)
+
+    records = {}
+    for shard in shards:
+        records.update(shard["records"])
+    if shards[0]["stage"] == "detection":
+        output_lst_dict = {}
+        for image_name in sorted(records):
+            img_idx, pred_filtered = records[image_name]
+            output_lst_dict[img_idx] = pred_filtered
+        atomic_pickle_dump(output_lst_dict, output_path)
+    else:
+        os.makedirs(output_path, exist_ok=True)
+        for image_name in sorted(records):
+            for mask_name, data in records[image_name]:
+                atomic_write_bytes(output_path / mask_name, data)
+    return output_path
@@ -0,0 +1,593 @@
+"""
+Per-image loops of the detection (UniDet) and segmentation (MaskDINO) stages.
+
+The functions here take an already constructed demo object, so a caller can
+build each model once and run any number of tasks through it. Both stages commit
+every finished image to an append-only journal (see `hrsbench.journal`), so an
+interrupted run can be resumed without redoing the completed images. Demos built
+with a worker pool (`parallel=True`) are kept fed with several images at a time.
+"""
+import glob
+import logging
+import os
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+import numpy as np
+import tqdm
+
+from hrsbench import metrics
+from hrsbench.cache import file_digest
+from hrsbench.journal import Journal, atomic_pickle_dump, atomic_write_bytes
+from hrsbench.render import Renderer, RenderPolicy
+
+logger = logging.getLogger(__name__)
+
+
+def collect_images(inputs: Iterable[str] | str, exclude: tuple[str, ...] = ("layout",)) -> list[str]:
+    """
+    Expand the `--input` argument of the demo scripts into a list of image paths.
+
+    A single entry is treated as a glob pattern (a directory is expanded to `<dir>/*`).
+    Only png/jpg files are kept, and paths containing any `exclude` substring
+    (GPT layout renderings) are skipped.
+    """
+    if isinstance(inputs, (str, os.PathLike)):
+        inputs = [inputs]
+    inputs = [str(p) for p in inputs]
+    if len(inputs) == 1:
+        pattern = inputs[0]
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "*")
+        inputs = glob.glob(os.path.expanduser(pattern))
+        assert inputs, "The input path(s) was not found"
+    paths = []
+    for path in inputs:
+        if ("png" not in path) and ("jpg" not in path):
+            continue
+        if any(pattern in path for pattern in exclude):
+            continue
+        paths.append(path)
+    return paths
+
+
+def image_index(path: str) -> str:
+    """Prompt index of an image named `<prompt_idx>_<level>_<prompt>.<ext>`."""
+    return Path(path).stem.split("_")[0]
+
+
+def collapse_duplicate_boxes(pred_boxes: np.ndarray, pred_cls_names: list[str]) -> dict[int, list[np.ndarray]]:
+    """
+    Group detections whose integer-truncated boxes coincide.
+
+    Returns the pickle entry format consumed by the scorers:
+    {first_idx: [array([x0, y0, x1, y1, cls_name], dtype='<U32'), ...], ...}
+    Groups are keyed by the index of their first detection and ordered by it, and
+    each group lists its detections in input order.
+    """
+    pred_objs_cls_name = np.reshape(np.array(pred_cls_names), (-1, 1))
+    pred_objs = np.hstack((pred_boxes, pred_objs_cls_name))
+    if len(pred_objs) == 0:  # handle the case of empty predictions
+        return {0: [[0, 0, 0, 0, ""]]}
+
+    # Remove repeated cord: truncating the float boxes gives the same integers as
+    # parsing back their string form, so all rows are grouped in one pass
+    int_boxes = np.asarray(pred_boxes, dtype=np.float64).astype(int)
+    _, first_idx, inverse = np.unique(int_boxes, axis=0, return_index=True, return_inverse=True)
+    group_of = first_idx[inverse.reshape(-1)]
+    pred_filtered = {}
+    for idx, first in enumerate(group_of.tolist()):
+        pred_filtered.setdefault(first, []).append(pred_objs[idx])
+    return pred_filtered
+
+
+# images decoded and preprocessed ahead of the model by default
+PREFETCH = 2
+
+
+def _model_args(classes_for, path: str) -> tuple:
+    """Extra arguments of the predictor for the image at `path`: its allowed classes, if any."""
+    return () if classes_for is None else (classes_for(path),)
+
+
+def _load_input(path: str, cache, key_extra: tuple, preprocess, progress, classes_for=None) -> tuple:
+    from detectron2.data.detection_utils import read_image
+
+    start_time = time.perf_counter()
+    # use PIL, to be consistent with evaluation
+    img = read_image(path, format="BGR")
+    model_args = _model_args(classes_for, path)
+    cache_key = cache.key(file_digest(path), *key_extra, *model_args) if cache is not None else None
+    cached = cache.get(cache_key) if cache is not None else None
+    model_input = preprocess(img, *model_args) if preprocess is not None and cached is None else None
+    if progress is not None:
+        progress.observe("decode", time.perf_counter() - start_time)
+    return path, img, cache_key, cached, model_input
+
+
+def _read_inputs(
+    image_paths: Iterable[str],
+    cache=None,
+    *key_extra,
+    progress=None,
+    preprocess=None,
+    prefetch: int = 0,
+    classes_for=None,
+) -> Iterator[tuple[str, np.ndarray, str | None, Any, Any]]:
+    """
+    Read the images of a stage and look them up in its inference cache.
+
+    With `preprocess` (see `_preprocessor`), uncached images are also turned into
+    model inputs (color conversion, resize, tensor). With `prefetch` > 0, all of this
+    runs in that many threads, at most `2 * prefetch` images ahead of the consumer,
+    so the model does not wait for the next image. With `classes_for` (see
+    `_prompt_classes`), the allowed classes of each image go into its model input
+    and its cache key.
+
+    Yields:
+        tuple: (path, BGR image, cache key, cached outputs or None, model input or None)
+    """
+    if prefetch <= 0:
+        for path in image_paths:
+            yield _load_input(path, cache, key_extra, preprocess, progress, classes_for)
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(prefetch, thread_name_prefix="hrsbench-prefetch") as pool:
+        pending = deque()
+        for path in image_paths:
+            pending.append(pool.submit(_load_input, path, cache, key_extra, preprocess, progress, classes_for))
+            if len(pending) >= 2 * prefetch:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _preprocessor(demo):
+    """The preprocessing of the in-process predictor of `demo`, to run ahead in `_read_inputs`."""
+    if getattr(demo, "parallel", False):
+        # the workers preprocess their images themselves
+        return None
+    return getattr(demo.predictor, "preprocess", None)
+
+
+def _predict(demo, inputs: Iterable[tuple], progress=None, classes_for=None) -> Iterator[tuple[tuple, Any]]:
+    """
+    Run the model of `demo` on the inputs that are not cached, in input order.
+
+    With a parallel demo (worker pool behind an `AsyncPredictor`), up to
+    `default_buffer_size` images are in flight at once and results are still
+    returned in input order. The model latency of an image is measured from its
+    submission to its result, and `progress` gets the number of images in flight.
+    With a `BatchPredictor` (`batch_size` > 1), see `_predict_batched`. Images that
+    were not preprocessed ahead get their allowed classes from `classes_for`, as in
+    `_read_inputs`.
+
+    Yields:
+        tuple: (input, model predictions, or None for a cached input)
+    """
+    if getattr(demo.predictor, "batch_size", 1) > 1:
+        yield from _predict_batched(demo.predictor, inputs, progress, classes_for)
+        return
+    if not getattr(demo, "parallel", False):
+        for item in inputs:
+            path, img, _, cached, model_input = item
+            predictions = None
+            if cached is None:
+                start_time = time.perf_counter()
+                if model_input is not None:
+                    predictions = demo.predictor.predict_inputs([model_input])[0]
+                else:
+                    predictions = demo.predictor(img, *_model_args(classes_for, path))
+                if progress is not None:
+                    progress.observe("model", time.perf_counter() - start_time)
+            yield item, predictions
+        return
+
+    predictor = demo.predictor
+
+    def collect(item, submit_time):
+        if item[3] is not None:
+            return item, None
+        predictions = predictor.get()
+        if progress is not None:
+            progress.observe("model", time.perf_counter() - submit_time)
+            progress.set_queue_depth(len(predictor))
+        return item, predictions
+
+    pending = deque()
+    for item in inputs:
+        path, img, _, cached, _ = item
+        if cached is None:
+            predictor.put(img, *_model_args(classes_for, path))
+            if progress is not None:
+                progress.set_queue_depth(len(predictor))
+        pending.append((item, time.perf_counter()))
+        if len(pending) > predictor.default_buffer_size:
+            yield collect(*pending.popleft())
+    while pending:
+        yield collect(*pending.popleft())
+
+
+def _predict_batched(predictor, inputs: Iterable[tuple], progress=None, classes_for=None) -> Iterator[tuple[tuple, Any]]:
+    """
+    `_predict` with a `BatchPredictor`: uncached images are run `batch_size` at a time.
+
+    The model latency of an image is its share of the forward of its batch.
+    """
+    batch = []
+
+    def flush():
+        model_inputs = [
+            model_input if model_input is not None else predictor.preprocess(img, *_model_args(classes_for, path))
+            for path, img, _, cached, model_input in batch
+            if cached is None
+        ]
+        start_time = time.perf_counter()
+        predictions = iter(predictor.predict_inputs(model_inputs))
+        if progress is not None and model_inputs:
+            seconds = (time.perf_counter() - start_time) / len(model_inputs)
+            for _ in model_inputs:
+                progress.observe("model", seconds)
+        for item in batch:
+            yield item, next(predictions) if item[3] is None else None
+        batch.clear()
+
+    num_uncached = 0
+    for item in inputs:
+        batch.append(item)
+        num_uncached += item[3] is None
+        if num_uncached == predictor.batch_size:
+            yield from flush()
+            num_uncached = 0
+    yield from flush()
+
+
+def _detection_outputs(predictions: dict[str, Any]) -> dict[str, Any]:
+    """The parts of the UniDet predictions used downstream, as NumPy arrays (the cached value)."""
+    instances = predictions["instances"].to("cpu")
+    return {
+        "image_size": instances.image_size,
+        "pred_boxes": instances.pred_boxes.tensor.numpy(),
+        "scores": instances.scores.numpy(),
+        "pred_classes": instances.pred_classes.numpy(),
+    }
+
+
+def _detection_entry(demo, outputs: dict[str, Any]) -> tuple[dict[int, list[Any]], int]:
+    pred_cls_names = [demo.metadata.thing_classes[cls_id] for cls_id in outputs["pred_classes"]]
+    return collapse_duplicate_boxes(outputs["pred_boxes"], pred_cls_names), len(pred_cls_names)
+
+
+def _visualize_detections(demo, img: np.ndarray, outputs: dict[str, Any]):
+    return demo.visualize(img, {"instances": _instances_from_outputs(outputs)})
+
+
+def _save_visualization(demo, img: np.ndarray, outputs: dict[str, Any], out_file: str):
+    _visualize_detections(demo, img, outputs).save(out_file)
+
+
+def _failure_check(task: str):
+    """
+    Per-image check of the `task` scorer against the HRS ground truth.
+
+    Returns:
+        callable: (prompt index, pickle entry) -> whether the scorer judges the image wrong.
+    """
+    from hrsbench import HRSBENCH_DATA_ROOT
+    from hrsbench.benchmark import DETECTION_TASKS, load_scorer_module
+
+    if task not in DETECTION_TASKS:
+        raise ValueError(f"Rendering failures needs a scored detection task ({', '.join(DETECTION_TASKS)}), got {task!r}")
+    scorer = load_scorer_module(task)
+    gt_data = scorer.load_gt(jsonl_path=str(HRSBENCH_DATA_ROOT / f"{task}.jsonl"))
+
+    def failed(prompt_idx: str, pred_filtered: dict[int, list[Any]]) -> bool:
+        if not prompt_idx.isdigit() or int(prompt_idx) >= len(gt_data):
+            return False
+        return not scorer.image_correct(gt_data[int(prompt_idx)], pred_filtered)
+
+    return failed
+
+
+# classes UniDet keeps on a detection task: those of the prompt, or its whole vocabulary
+DETECTION_CLASSES = ("prompt", "all")
+
+
+def _prompt_classes(task: str, thing_classes: list[str]):
+    """
+    Allowed classes of every image of `task`: the UniDet classes named by the
+    `expected_obj*` fields of its prompt, the only detections the task scorer looks at.
+
+    Returns:
+        callable: image path -> sorted class ids, or None (every class) for an image
+            whose prompt index is not in the task ground truth.
+    """
+    from hrsbench import HRSBENCH_DATA_ROOT
+    from hrsbench.benchmark import DETECTION_TASKS, load_scorer_module
+
+    if task not in DETECTION_TASKS:
+        raise ValueError(f"Prompt classes need a scored detection task ({', '.join(DETECTION_TASKS)}), got {task!r}")
+    gt_data = load_scorer_module(task).load_gt(jsonl_path=str(HRSBENCH_DATA_ROOT / f"{task}.jsonl"))
+    class_ids = {}
+    for class_id, name in enumerate(thing_classes):
+        class_ids.setdefault(name, []).append(class_id)
+    allowed = [
+        sorted({
+            class_id
+            for key, name in gt_entry.items() if key.startswith("expected_obj") and name
+            for class_id in class_ids.get(name, ())
+        })
+        for gt_entry in gt_data
+    ]
+
+    def classes_for(path: str) -> list[int] | None:
+        prompt_idx = image_index(path)
+        if not prompt_idx.isdigit() or int(prompt_idx) >= len(allowed):
+            return None
+        return allowed[int(prompt_idx)]
+
+    return classes_for
+
+
+def detect_image(demo, img: np.ndarray, cache=None, cache_key: str | None = None) -> tuple[dict[int, list[Any]], Any, int]:
+    """
+    Run UniDet on one BGR image, or restore its outputs from `cache` under `cache_key`.
+
+    Returns:
+        tuple: (pickle entry of the image, visualized output, number of instances)
+    """
+    outputs = cache.get(cache_key) if cache is not None else None
+    if outputs is None:
+        outputs = _detection_outputs(demo.predictor(img))
+        if cache is not None:
+            cache.put(cache_key, outputs)
+    pred_filtered, num_instances = _detection_entry(demo, outputs)
+    return pred_filtered, _visualize_detections(demo, img, outputs), num_instances
+
+
+def _instances_from_outputs(outputs: dict[str, Any]):
+    """Rebuild detectron2 `Instances` from cached UniDet outputs."""
+    import torch
+    from detectron2.structures import Boxes, Instances
+
+    return Instances(
+        outputs["image_size"],
+        pred_boxes=Boxes(torch.from_numpy(outputs["pred_boxes"])),
+        scores=torch.from_numpy(outputs["scores"]),
+        pred_classes=torch.from_numpy(outputs["pred_classes"]),
+    )
+
+
+def run_detection(
+    demo,
+    image_paths: list[str],
+    task: str,
+    output_base_dir: str | Path,
+    pkl_path: str | Path,
+    resume: bool = False,
+    cache=None,
+    num_shards: int = 1,
+    shard_id: int = 0,
+    prefetch: int = PREFETCH,
+    render: str = "all",
+    classes: str = "all",
+) -> dict[str, dict[int, list[Any]]]:
+    """
+    Detect objects on every image of a task and pickle the results for the scorers.
+
+    Visualizations of the images selected by `render` (see `hrsbench.render`: `all`,
+    `none`, `first:N`, `every:K` or `failures`) are drawn in a background thread and
+    saved into `<output_base_dir>/<task>_detected_images`. Every
+    finished image is committed to `<pkl_path>.journal`; with `resume`, images already
+    in the journal are skipped and merged into the final pickle. With an
+    `InferenceCache`, images whose content was already seen by this model skip inference.
+    A parallel demo keeps its worker pool busy while results are committed in order.
+    Upcoming images are decoded and preprocessed in `prefetch` threads while the model
+    runs (0: on the calling thread).
+
+    `classes="all"` (the default) keeps the whole vocabulary. With `classes="prompt"`,
+    UniDet only keeps the classes named by the expected objects of each image's prompt
+    (see `_prompt_classes`): the other classes, which the scorers never look at, are
+    dropped before thresholding and NMS.
+
+    With `num_shards` > 1, only the prompt indices of shard `shard_id` are processed and
+    a shard file (`<pkl_path>.shard-<id>-of-<n>`, see `hrsbench.shards`) is written
+    instead of the pickle.
+    """
+    from hrsbench import shards
+
+    all_image_paths = image_paths
+    if num_shards > 1:
+        image_paths = shards.select_shard(image_paths, num_shards, shard_id)
+        out_path = shards.shard_path(pkl_path, shard_id, num_shards)
+    else:
+        out_path = pkl_path
+    if classes not in DETECTION_CLASSES:
+        raise ValueError(f"Unknown detection classes {classes!r}, expected one of {', '.join(DETECTION_CLASSES)}")
+    classes_for = _prompt_classes(task, demo.metadata.thing_classes) if classes == "prompt" else None
+    policy = RenderPolicy(render)
+    failed = _failure_check(task) if policy.needs_failures else None
+    positions = {path: position for position, path in enumerate(image_paths)}
+    out_dir = os.path.join(output_base_dir, f"{task}_detected_images")
+    if policy.enabled:
+        os.makedirs(out_dir, exist_ok=True)
+
+    with Journal(f"{out_path}.journal", resume=resume) as journal, Renderer() as renderer:
+        if resume:
+            logger.info(f"Resuming {task}: {len(journal)} images already done")
+        todo = [path for path in image_paths if os.path.basename(path) not in journal]
+        progress = metrics.REGISTRY.task("detection", task, str(output_base_dir), len(image_paths), len(image_paths) - len(todo))
+        start_time = time.time()
+        inputs = _read_inputs(
+            todo, cache, progress=progress, preprocess=_preprocessor(demo), prefetch=prefetch, classes_for=classes_for
+        )
+        results = _predict(demo, inputs, progress, classes_for)
+        for (path, img, cache_key, outputs, _), predictions in tqdm.tqdm(results, total=len(todo), desc=f"UniDet [{task}]"):
+            output_start = time.perf_counter()
+            cached = outputs is not None
+            if outputs is None:
+                outputs = _detection_outputs(predictions)
+                if cache is not None:
+                    cache.put(cache_key, outputs)
+            pred_filtered, num_instances = _detection_entry(demo, outputs)
+            logger.info(
+                "{}: detected {} instances in {:.2f}s".format(path, num_instances, time.time() - start_time)
+            )
+            if policy.selects(positions[path], failed is not None and failed(image_index(path), pred_filtered)):
+                renderer.submit(_save_visualization, demo, img, outputs, os.path.join(out_dir, os.path.basename(path)))
+            journal.commit(os.path.basename(path), (image_index(path), pred_filtered))
+            progress.observe("output", time.perf_counter() - output_start)
+            progress.image_done(cached)
+            start_time = time.time()
+        progress.finish()
+
+        output_lst_dict = {}
+        for path in image_paths:
+            img_idx, pred_filtered = journal.records[os.path.basename(path)]
+            output_lst_dict[img_idx] = pred_filtered
+        records = {os.path.basename(path): journal.records[os.path.basename(path)] for path in image_paths}
+
+    if num_shards > 1:
+        shards.write_shard(out_path, "detection", task, num_shards, shard_id, all_image_paths, records)
+    else:
+        atomic_pickle_dump(output_lst_dict, out_path)
+    return output_lst_dict
+
+
+def _kept_masks(predictions: dict[str, Any], score_thresh: float) -> list[tuple[int, np.ndarray]]:
+    instances = predictions["instances"].to("cpu")
+    keep = (instances.scores >= score_thresh).nonzero()[:, 0]
+    return [
+        (int(instances.pred_classes[i].item()), instances.pred_masks[i].numpy().astype(np.uint8) * 255)
+        for i in keep
+    ]
+
+
+def _pack_masks(masks: list[tuple[int, np.ndarray]]) -> list[tuple[int, tuple[int, int], np.ndarray]]:
+    # masks are cached bit-packed
+    return [(class_id, mask.shape, np.packbits(mask > 0)) for class_id, mask in masks]
+
+
+def _unpack_masks(packed: list[tuple[int, tuple[int, int], np.ndarray]]) -> list[tuple[int, np.ndarray]]:
+    return [
+        (class_id, np.unpackbits(bits, count=shape[0] * shape[1]).reshape(shape) * np.uint8(255))
+        for class_id, shape, bits in packed
+    ]
+
+
+def segment_image(demo, img: np.ndarray, score_thresh: float = 0.5, cache=None, cache_key: str | None = None) -> list[tuple[int, np.ndarray]]:
+    """
+    Run MaskDINO on one BGR image, or restore its kept masks from `cache` under `cache_key`.
+
+    Returns:
+        list[tuple[int, np.ndarray]]: (COCO class id, uint8 mask in {0, 255}) for every
+        instance whose score reaches `score_thresh`, in prediction order.
+    """
+    cached = cache.get(cache_key) if cache is not None else None
+    if cached is not None:
+        return _unpack_masks(cached)
+    masks = _kept_masks(demo.predictor(img), score_thresh)
+    if cache is not None:
+        cache.put(cache_key, _pack_masks(masks))
+    return masks
+
+
+def mask_filename(img_name: str, mask_idx: int, class_id: int) -> str:
+    """File name of a saved mask, parsed back by `hue_based_color_classifier.py`."""
+    return f"{img_name}_mask_{mask_idx}_{class_id}.png"
+
+
+def run_segmentation(
+    demo,
+    image_paths: list[str],
+    output_base_dir: str | Path,
+    score_thresh: float = 0.5,
+    resume: bool = False,
+    cache=None,
+    num_shards: int = 1,
+    shard_id: int = 0,
+    prefetch: int = PREFETCH,
+) -> Path:
+    """
+    Segment every image of the color task and save one PNG per kept instance mask.
+
+    Masks are written atomically and an image is committed to
+    `<output_base_dir>/color_detected_images.journal` only once all of its masks are on
+    disk. With `resume`, committed images are skipped and masks left behind by an
+    interrupted image are removed before it is segmented again. With an
+    `InferenceCache`, images whose content was already seen by this model skip inference.
+    A parallel demo keeps its worker pool busy while results are committed in order.
+    Upcoming images are decoded and preprocessed in `prefetch` threads while the model
+    runs (0: on the calling thread).
+
+    With `num_shards` > 1, only the prompt indices of shard `shard_id` are processed and
+    a shard file embedding the masks (`<output_base_dir>/color_detected_images.shard-<id>-of-<n>`,
+    see `hrsbench.shards`) is written as well.
+
+    Returns:
+        Path: the mask directory, `<output_base_dir>/color_detected_images`.
+    """
+    import cv2
+
+    from hrsbench import shards
+
+    all_image_paths = image_paths
+    out_dir = Path(output_base_dir) / "color_detected_images"
+    journal_path = Path(output_base_dir) / "color_detected_images.journal"
+    if num_shards > 1:
+        image_paths = shards.select_shard(image_paths, num_shards, shard_id)
+        journal_path = Path(f"{shards.shard_path(out_dir, shard_id, num_shards)}.journal")
+    os.makedirs(out_dir, exist_ok=True)
+
+    with Journal(journal_path, resume=resume) as journal:
+        stale = {}
+        if resume:
+            logger.info(f"Resuming color: {len(journal)} images already done")
+            for name in os.listdir(out_dir):
+                # temporary files of interrupted atomic writes are dot-prefixed
+                stale.setdefault(name.lstrip(".").split("_mask_")[0], []).append(name)
+        todo = [path for path in image_paths if os.path.basename(path) not in journal]
+        progress = metrics.REGISTRY.task("segmentation", "color", str(output_base_dir), len(image_paths), len(image_paths) - len(todo))
+        start_time = time.time()
+        inputs = _read_inputs(
+            todo, cache, score_thresh, progress=progress, preprocess=_preprocessor(demo), prefetch=prefetch
+        )
+        results = _predict(demo, inputs, progress)
+        for (path, img, cache_key, cached, _), predictions in tqdm.tqdm(results, total=len(todo), desc="MaskDINO [color]"):
+            output_start = time.perf_counter()
+            img_name = Path(path).stem
+            for name in stale.get(img_name, []):
+                os.remove(out_dir / name)
+
+            if cached is None:
+                masks = _kept_masks(predictions, score_thresh)
+                if cache is not None:
+                    cache.put(cache_key, _pack_masks(masks))
+            else:
+                masks = _unpack_masks(cached)
+            logger.info("{}: kept {} instances in {:.2f}s".format(path, len(masks), time.time() - start_time))
+
+            mask_names = []
+            for mask_idx, (class_id, mask) in enumerate(masks):
+                mask_names.append(mask_filename(img_name, mask_idx, class_id))
+                atomic_write_bytes(out_dir / mask_names[-1], cv2.imencode(".png", mask)[1].tobytes())
+            journal.commit(os.path.basename(path), mask_names)
+            progress.observe("output", time.perf_counter() - output_start)
+            progress.image_done(cached is not None)
+            start_time = time.time()
+        progress.finish()
+
+    if num_shards > 1:
+        records = {}
+        for path in image_paths:
+            mask_names = journal.records[os.path.basename(path)]
+            records[os.path.basename(path)] = [(name, (out_dir / name).read_bytes()) for name in mask_names]
+        shards.write_shard(
+            shards.shard_path(out_dir, shard_id, num_shards), "segmentation", "color", num_shards, shard_id,
+            all_image_paths, records,
+        )
+    return out_dir
@@ -0,0 +1,168 @@
+"""
+Sweep mode: evaluate many (method, image_root, seed) entries with one model session
+and aggregate them into a leaderboard of per-seed mean/std for every task and level.
+"""
+import csv
+import json
+import logging
+import statistics
+from pathlib import Path
+from typing import Any
+
+from hrsbench.benchmark import find_task_dirs, run_tasks
+
+logger = logging.getLogger(__name__)
+
+LEVELS = (1, 2, 3)
+COUNTING_METRIC_KEYS = {"precision": "precisions_per_level", "recall": "recalls_per_level", "f1": "f1_per_level"}
+
+
+def load_sweep(sweep_path: str | Path) -> list[dict[str, Any]]:
+    """
+    Load the sweep entries from a JSONL file.
+
+    Example entry:
+    {"method": "SD1.5", "image_root": "/path/to/SD1.5", "seed": 42}
+
+    `method` defaults to the basename of `image_root` and `seed` to 42. Every (method, seed)
+    pair must be unique: both entries would write the same output directory and their
+    results would count twice in the leaderboard.
+    """
+    entries = []
+    seen = {}
+    with open(sweep_path, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "image_root" not in entry:
+                raise ValueError(f"{sweep_path}:{line_number}: sweep entry without an image_root")
+            entry = {
+                "method": entry.get("method") or Path(entry["image_root"]).name,
+                "image_root": entry["image_root"],
+                "seed": int(entry.get("seed", 42)),
+            }
+            pair = (entry["method"], entry["seed"])
+            if pair in seen:
+                raise ValueError(
+                    f"{sweep_path}:{line_number}: method {pair[0]!r} with seed {pair[1]} "
+                    f"is already listed on line {seen[pair]}"
+                )
+            seen[pair] = line_number
+            entries.append(entry)
+    return entries
+
+
+def level_metrics(task: str, results: dict[str, Any]) -> dict[str, dict[str, float]]:
+    """
+    Flatten the scorer output of `task` into {metric: {level: value}}.
+
+    Levels are "1", "2", "3" and "avg".
+    """
+    if task == "counting":
+        metrics = {}
+        for metric, key in COUNTING_METRIC_KEYS.items():
+            per_level = results[key]
+            metrics[metric] = {str(level): per_level[level][0] for level in LEVELS}
+            metrics[metric]["avg"] = results["average"][metric]
+        return metrics
+    elif task in ("spatial", "size"):
+        per_level = results["accuracy_per_level"]
+        accuracy = {str(level): per_level[level][0] for level in LEVELS}
+        accuracy["avg"] = results["average_accuracy"]
+        return {"accuracy": accuracy}
+    elif task == "color":
+        per_level = results["acc"]
+        accuracy = {str(level): per_level[level][0] for level in LEVELS}
+        accuracy["avg"] = results["avg"]
+        return {"accuracy": accuracy}
+    raise ValueError(f"Unknown task type: {task}")
+
+
+def build_leaderboard(entries: list[dict[str, Any]], all_results: list[dict[str, dict[str, Any]]]) -> list[dict[str, Any]]:
+    """
+    Aggregate the results of all entries over seeds.
+
+    Returns:
+        list[dict[str, Any]]: one row per (method, task, metric, level) with the
+        mean, standard deviation (0 for a single seed) and the seeds it covers.
+    """
+    # (method, task, metric, level) -> {seed: value}
+    values = {}
+    for entry, results in zip(entries, all_results):
+        for task, task_results in results.items():
+            for metric, per_level in level_metrics(task, task_results).items():
+                for level, value in per_level.items():
+                    values.setdefault((entry["method"], task, metric, level), {})[entry["seed"]] = value
+
+    leaderboard = []
+    for (method, task, metric, level), per_seed in values.items():
+        seed_values = list(per_seed.values())
+        leaderboard.append({
+            "method": method,
+            "task": task,
+            "metric": metric,
+            "level": level,
+            "mean": statistics.mean(seed_values),
+            "std": statistics.stdev(seed_values) if len(seed_values) > 1 else 0.0,
+            "seeds": sorted(per_seed),
+        })
+    return leaderboard
+
+
+def save_leaderboard(leaderboard: list[dict[str, Any]], output_root: str | Path) -> tuple[Path, Path]:
+    """Write the leaderboard as `leaderboard.json` and `leaderboard.csv` into `output_root`."""
+    json_path = Path(output_root) / "leaderboard.json"
+    csv_path = Path(output_root) / "leaderboard.csv"
+    with open(json_path, "w") as f:
+        json.dump(leaderboard, f, indent=4)
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["method", "task", "metric", "level", "mean", "std", "seeds"])
+        writer.writeheader()
+        for row in leaderboard:
+            writer.writerow({**row, "seeds": " ".join(str(seed) for seed in row["seeds"])})
+    return json_path, csv_path
+
+
+def print_leaderboard(leaderboard: list[dict[str, Any]]):
+    """Print the average-level rows as a method x task table of mean ± std."""
+    rows = [row for row in leaderboard if row["level"] == "avg" and row["metric"] in ("accuracy", "f1")]
+    methods = sorted({row["method"] for row in rows})
+    tasks = [task for task in ("counting", "spatial", "size", "color") if any(row["task"] == task for row in rows)]
+    cells = {(row["method"], row["task"]): f"{row['mean']:.2f} ± {row['std']:.2f}" for row in rows}
+
+    width = max([len(m) for m in methods] + [6])
+    print("\n" + "=" * 50)
+    print("LEADERBOARD (counting: F1, others: accuracy)")
+    print("=" * 50)
+    print("Method".ljust(width) + "".join(f"  {task:>16}" for task in tasks))
+    for method in methods:
+        print(method.ljust(width) + "".join(f"  {cells.get((method, task), '-'):>16}" for task in tasks))
+
+
+def run_sweep(entries: list[dict[str, Any]], output_root: str | Path = "./output", **kwargs) -> list[dict[str, Any]]:
+    """
+    Evaluate every sweep entry through a single UniDet and a single MaskDINO session.
+
+    Each entry is written to `<output_root>/<method>_seed<seed>/` like a single run, and the
+    combined leaderboard is saved into `output_root`. Keyword arguments are forwarded to `run_tasks`.
+    """
+    runs = []
+    kept_entries = []
+    for entry in entries:
+        task_dirs = find_task_dirs(entry["image_root"], entry["seed"])
+        if not task_dirs:
+            logger.warning(f"No task directories found with seed {entry['seed']} in {entry['image_root']}. Skipping.")
+            continue
+        runs.append((task_dirs, Path(output_root) / f"{entry['method']}_seed{entry['seed']}"))
+        kept_entries.append(entry)
+    if not runs:
+        raise FileNotFoundError("None of the sweep entries has a task directory to evaluate")
+
+    all_results = run_tasks(runs, **kwargs)
+
+    leaderboard = build_leaderboard(kept_entries, all_results)
+    json_path, csv_path = save_leaderboard(leaderboard, output_root)
+    print_leaderboard(leaderboard)
+    logger.info(f"Leaderboard saved to {json_path} and {csv_path}")
+    return leaderboard
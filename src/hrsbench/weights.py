@@ -0,0 +1,200 @@
+"""
+Memory-mappable weights for the UniDet and MaskDINO predictors.
+
+`convert_to_mmap` rewrites a training checkpoint once into a plain state dict saved in
+torch's zipfile format (`<name>.mmap.pth`). `MmapDetectionCheckpointer` loads such a
+file with `torch.load(mmap=True)` instead of unpickling it, and on CPU assigns the
+mapped tensors to the model instead of copying them, so every worker process that
+builds a predictor shares the same read-only pages of the page cache.
+
+`prune_unidet` writes an inference-only UniDet checkpoint with the classifier of the
+evaluated dataset only.
+
+`build_predictor` returns a `Predictor`, a `DefaultPredictor` whose preprocessing
+can run ahead of the model (see `hrsbench.stages._read_inputs`).
+"""
+import logging
+import os
+import re
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import torch
+from detectron2.checkpoint import DetectionCheckpointer
+from detectron2.engine.defaults import DefaultPredictor
+
+from hrsbench.cache import load_state_dict
+from hrsbench.models import MMAP_SUFFIX, PRUNED_DATASET, mmap_weights_path, pruned_weights_path
+
+logger = logging.getLogger(__name__)
+
+
+def is_mmap_weights(path: str | Path) -> bool:
+    return str(path).endswith(MMAP_SUFFIX)
+
+
+def convert_to_mmap(src: str | Path, dst: str | Path | None = None) -> Path:
+    """
+    Convert a detectron2 checkpoint into the memory-mappable format.
+
+    Only the model state dict is kept (optimizer/scheduler states are dropped), every
+    tensor gets its own contiguous storage, and the file is written atomically.
+
+    Returns:
+        Path: the converted file, `<src stem>.mmap.pth` next to `src` by default.
+    """
+    src = Path(src)
+    dst = Path(dst) if dst is not None else mmap_weights_path(src)
+    tensors = _load_tensors(src)
+    _save_tensors(tensors, dst)
+    logger.info(f"Converted {src} ({len(tensors)} tensors) to {dst}")
+    return dst
+
+
+def _load_tensors(src: Path) -> dict[str, torch.Tensor]:
+    """The model state dict of a checkpoint, one contiguous tensor per entry."""
+    return {key: value.detach().contiguous().clone() for key, value in load_state_dict(src).items()}
+
+
+def _save_tensors(tensors: dict[str, torch.Tensor], dst: Path):
+    fd, tmp_path = tempfile.mkstemp(dir=dst.parent, prefix=f".{dst.name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        torch.save({"model": tensors}, tmp_path)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# classifier of a cascade stage and dataset: roi_heads.box_predictor.<stage>.cls_score.<dataset>.<weight|bias>
+_CLS_SCORE_KEY = re.compile(r"^(roi_heads\.box_predictor\.\d+\.cls_score\.)(\d+)(\..+)$")
+
+
+def prune_unidet(
+    src: str | Path,
+    dst: str | Path | None = None,
+    dataset: str = PRUNED_DATASET,
+    datasets: tuple[str, ...] = ("objects365", "coco", "oid"),
+) -> Path:
+    """
+    Write an inference-only UniDet checkpoint that keeps only the classifier of `dataset`.
+
+    The partitioned UniDet has one classifier per training dataset (`datasets`, in
+    `MULTI_DATASET.DATASETS` order) in each cascade stage, but evaluation only uses
+    one of them. The others are dropped and the kept one becomes `cls_score.0`, as
+    built by a model configured with `MULTI_DATASET.INFERENCE_DATASET <dataset>`.
+    The result is saved in the memory-mappable format.
+
+    Returns:
+        Path: the pruned file, `<src stem>.<dataset>-only.mmap.pth` next to `src` by default.
+    """
+    src = Path(src)
+    dst = Path(dst) if dst is not None else pruned_weights_path(src, dataset)
+    keep = str(datasets.index(dataset))
+
+    tensors = {}
+    num_dropped = 0
+    for key, value in _load_tensors(src).items():
+        match = _CLS_SCORE_KEY.match(key)
+        if match is None:
+            tensors[key] = value
+        elif match.group(2) == keep:
+            tensors[match.group(1) + "0" + match.group(3)] = value
+        else:
+            num_dropped += value.numel()
+    if num_dropped == 0:
+        raise ValueError(f"{src} has no per-dataset classifier to prune; is it a partitioned UniDet checkpoint?")
+    _save_tensors(tensors, dst)
+    num_kept = sum(value.numel() for value in tensors.values())
+    logger.info(
+        f"Pruned {src} to the {dataset} classifier: dropped {num_dropped / 1e6:.1f}M of "
+        f"{(num_kept + num_dropped) / 1e6:.1f}M parameters, saved to {dst}"
+    )
+    return dst
+
+
+class MmapDetectionCheckpointer(DetectionCheckpointer):
+    """
+    `DetectionCheckpointer` that memory-maps `*.mmap.pth` files.
+
+    Other files are loaded exactly like `DetectionCheckpointer` does.
+    """
+
+    def _load_file(self, filename):
+        if not is_mmap_weights(filename):
+            return super()._load_file(filename)
+        return torch.load(filename, map_location="cpu", mmap=True, weights_only=True)
+
+    def _load_model(self, checkpoint):
+        on_cpu = all(p.device.type == "cpu" for p in self.model.parameters())
+        if not on_cpu or not self.path_is_mmap:
+            return super()._load_model(checkpoint)
+        # alias the mapped tensors instead of copying them into freshly allocated parameters
+        load_state_dict = self.model.load_state_dict
+        self.model.load_state_dict = lambda state_dict, strict=True: load_state_dict(state_dict, strict=strict, assign=True)
+        try:
+            return super()._load_model(checkpoint)
+        finally:
+            del self.model.load_state_dict
+
+    def load(self, path, *args, **kwargs):
+        self.path_is_mmap = is_mmap_weights(path)
+        return super().load(path, *args, **kwargs)
+
+
+class Predictor(DefaultPredictor):
+    """
+    `DefaultPredictor` whose preprocessing and forward can be called separately.
+
+    `preprocess` does the color conversion, resize and tensor conversion of
+    `DefaultPredictor.__call__`, so it can run ahead of time in another thread;
+    `predict_inputs` runs the model on preprocessed images.
+    """
+
+    def preprocess(self, original_image: np.ndarray, allowed_classes: list[int] | None = None) -> dict:
+        """
+        Args:
+            original_image (np.ndarray): an image of shape (H, W, C) (in BGR order).
+            allowed_classes (list[int]): class ids to keep, for models that can drop the
+                other classes before NMS (UniDet); None keeps every class.
+
+        Returns:
+            dict: the model input of the image.
+        """
+        if self.input_format == "RGB":
+            original_image = original_image[:, :, ::-1]
+        height, width = original_image.shape[:2]
+        image = self.aug.get_transform(original_image).apply_image(original_image)
+        image = torch.as_tensor(image.astype("float32").transpose(2, 0, 1)).to(self.cfg.MODEL.DEVICE)
+        inputs = {"image": image, "height": height, "width": width}
+        if allowed_classes is not None:
+            inputs["allowed_classes"] = allowed_classes
+        return inputs
+
+    def predict_inputs(self, inputs: list[dict]) -> list[dict]:
+        """Run the model on preprocessed images; one output dict per image."""
+        with torch.no_grad():
+            return self.model(inputs)
+
+    def __call__(self, original_image, allowed_classes=None):
+        return self.predict_inputs([self.preprocess(original_image, allowed_classes)])[0]
+
+
+def build_predictor(cfg) -> Predictor:
+    """
+    `Predictor(cfg)` that loads `cfg.MODEL.WEIGHTS` through `MmapDetectionCheckpointer`.
+    """
+    weights = cfg.MODEL.WEIGHTS
+    if not is_mmap_weights(weights):
+        return Predictor(cfg)
+    cfg = cfg.clone()
+    cfg.defrost()
+    # build the model without weights, then map them in
+    cfg.MODEL.WEIGHTS = ""
+    predictor = Predictor(cfg)
+    MmapDetectionCheckpointer(predictor.model).load(weights)
+    predictor.cfg.MODEL.WEIGHTS = weights
+    return predictor
@@ -0,0 +1,82 @@
+"""
+CPU core budgeting for inference worker processes.
+
+Each worker is pinned to an explicit set of cores and its intra-op thread pools
+are sized to that set, so that concurrently running model stacks do not
+oversubscribe the machine.
+"""
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Thread pools read these on first use, so they have to be set before torch/cv2 start working.
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def available_cores() -> list[int]:
+    """Cores the current process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def split_cores(cores: list[int], counts: list[int | None]) -> list[list[int]]:
+    """
+    Partition `cores` into contiguous, disjoint budgets.
+
+    Entries of `counts` that are None share the cores left over by the explicit
+    entries evenly. Every budget gets at least one core of its own; a ValueError is
+    raised when that cannot be met, rather than pinning several budgets to a core.
+    """
+    cores = list(cores)
+    if any(c is not None and c < 1 for c in counts):
+        raise ValueError(f"Core counts must be at least 1, got {counts}")
+    fixed = sum(c for c in counts if c is not None)
+    num_free = sum(1 for c in counts if c is None)
+    if fixed + num_free > len(cores):
+        raise ValueError(
+            f"Requested {fixed} cores and {num_free} more budgets of at least one core, "
+            f"but only {len(cores)} cores are available"
+        )
+    leftover = len(cores) - fixed
+    budgets = []
+    start = 0
+    free_index = 0
+    for count in counts:
+        if count is None:
+            # hand the remainder to the first free budgets
+            count = leftover // num_free + (1 if free_index < leftover % num_free else 0)
+            free_index += 1
+        budgets.append(cores[start:start + count])
+        start += count
+    return budgets
+
+
+def init_worker(cores: list[int] | None, num_threads: int | None = None, log_level: int = logging.INFO):
+    """
+    Process initializer: pin to `cores` and size the intra-op thread pools.
+
+    `num_threads` defaults to the number of pinned cores.
+    """
+    logging.basicConfig(level=log_level, format="[%(asctime)s %(name)s %(process)d]: %(message)s")
+    if cores:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+        else:
+            logger.warning("CPU affinity is not supported on this platform; only thread counts are applied.")
+    num_threads = num_threads or (len(cores) if cores else None)
+    if not num_threads:
+        return
+    for var in _THREAD_ENV_VARS:
+        os.environ[var] = str(num_threads)
+
+    import torch
+
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # already set once in this process
+        pass
+    logger.info(f"Worker pinned to {len(cores) if cores else 'all'} cores with {num_threads} intra-op threads")
@@ -0,0 +1,100 @@
+"""
+Shared fixtures: UniDet and MaskDINO built from the shipped configs with seeded random
+weights, saved once per session so that every process (worker pools included) loads
+the same model, and small synthetic HRS-style images.
+
+The model tests need torch and detectron2 (and the compiled MSDeformAttn op for
+MaskDINO); they are skipped where those are missing.
+"""
+import pytest
+
+# detections of a random-weight model are kept whatever their score, and capped
+TEST_OPTS = ["INPUT.MIN_SIZE_TEST", "160", "INPUT.MAX_SIZE_TEST", "224", "TEST.DETECTIONS_PER_IMAGE", "20"]
+
+
+def _require_detectron2():
+    pytest.importorskip("torch")
+    pytest.importorskip("detectron2")
+
+
+@pytest.fixture(scope="session")
+def unidet_weights(tmp_path_factory):
+    _require_detectron2()
+    import torch
+    from detectron2.modeling import build_model
+
+    from hrsbench import models
+
+    cfg = models.setup_unidet_cfg(opts=["MODEL.WEIGHTS", "", "MODEL.DEVICE", "cpu"])
+    import unidet  # noqa: F401  registers the UniDet architectures
+
+    torch.manual_seed(0)
+    path = tmp_path_factory.mktemp("unidet") / "unidet-random.pth"
+    torch.save({"model": build_model(cfg).state_dict()}, path)
+    return path
+
+
+@pytest.fixture
+def unidet_cfg(unidet_weights):
+    """`unidet_cfg(*opts)`: the UniDet config of the random weights, on CPU, with `opts`."""
+    from hrsbench import models
+
+    def make(*opts):
+        return models.setup_unidet_cfg(
+            opts=["MODEL.WEIGHTS", str(unidet_weights), "MODEL.DEVICE", "cpu", *TEST_OPTS, *opts],
+            confidence_threshold=0.0,
+        )
+
+    return make
+
+
+@pytest.fixture(scope="session")
+def maskdino_weights(tmp_path_factory):
+    _require_detectron2()
+    import torch
+    from detectron2.modeling import build_model
+
+    from hrsbench import models
+
+    cfg = models.setup_maskdino_cfg(opts=["MODEL.WEIGHTS", "", "MODEL.DEVICE", "cpu"])
+    try:
+        import maskdino  # noqa: F401  registers the MaskDINO architectures
+    except ImportError as e:
+        pytest.skip(f"MaskDINO is not importable: {e}")
+
+    torch.manual_seed(0)
+    path = tmp_path_factory.mktemp("maskdino") / "maskdino-random.pth"
+    torch.save({"model": build_model(cfg).state_dict()}, path)
+    return path
+
+
+@pytest.fixture
+def maskdino_cfg(maskdino_weights):
+    """`maskdino_cfg(*opts)`: the MaskDINO config of the random weights, on CPU, with `opts`."""
+    from hrsbench import models
+
+    def make(*opts):
+        return models.setup_maskdino_cfg(
+            opts=["MODEL.WEIGHTS", str(maskdino_weights), "MODEL.DEVICE", "cpu", *TEST_OPTS, *opts]
+        )
+
+    return make
+
+
+@pytest.fixture
+def images(tmp_path):
+    """Six random BGR images named like HRS images (`<prompt_idx>_<level>_<prompt>.png`), in a task directory."""
+    np = pytest.importorskip("numpy")
+    cv2 = pytest.importorskip("cv2")
+
+    rng = np.random.default_rng(0)
+    task_dir = tmp_path / "counting_seed42"
+    task_dir.mkdir()
+    paths = []
+    for i in range(6):
+        # one image of another size, as in a run with an odd generator output
+        shape = (96, 128, 3) if i != 4 else (120, 90, 3)
+        path = task_dir / f"{i}_1_prompt.png"
+        cv2.imwrite(str(path), rng.integers(0, 256, shape, dtype=np.uint8))
+        paths.append(str(path))
+    return paths
@@ -0,0 +1,136 @@
+"""bfloat16 autocast inference: the wrappers of `hrsbench.autocast` and the bf16 UniDet and MaskDINO."""
+import logging
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from hrsbench.autocast import Autocast, Float32, check_bf16, wrap_modules  # noqa: E402
+
+
+def _relative_error(actual, expected):
+    return float((actual - expected).norm() / expected.norm())
+
+
+class _Head(torch.nn.Module):
+    """Outputs of every kind the detectors return: tensors in a dict, a tuple, integer labels."""
+
+    def __init__(self):
+        super().__init__()
+        self.fc = torch.nn.Linear(32, 16)
+        self.out = torch.nn.Linear(16, 4)
+
+    def forward(self, x):
+        y = self.out(torch.relu(self.fc(x)))
+        return {"scores": y, "pair": (y, y.argmax(1))}
+
+
+def _dtypes(module):
+    """Records the output dtype of `module` on each call."""
+    seen = []
+    module.register_forward_hook(lambda m, args, output: seen.append(output.dtype))
+    return seen
+
+
+@torch.no_grad()
+def test_autocast_runs_bf16_and_returns_fp32():
+    torch.manual_seed(0)
+    head = _Head().eval()
+    x = torch.randn(8, 32)
+    expected = head(x)
+    fc_dtypes = _dtypes(head.fc)
+
+    wrapped = Autocast(head, "cpu")
+    outputs = wrapped(x)
+    assert fc_dtypes == [torch.bfloat16]
+    assert outputs["scores"].dtype == outputs["pair"][0].dtype == torch.float32
+    assert isinstance(outputs["pair"], tuple) and outputs["pair"][1].dtype == torch.int64
+    # bf16 keeps 8 bits of mantissa: about 0.5% of relative error through two layers
+    assert _relative_error(outputs["scores"], expected["scores"]) < 0.02
+    # attributes and submodules are read through the wrapper
+    assert wrapped.fc is head.fc and wrapped.out.out_features == 4
+
+
+@torch.no_grad()
+def test_float32_island_inside_autocast():
+    torch.manual_seed(0)
+    head = _Head().eval()
+    fc_dtypes, out_dtypes = _dtypes(head.fc), _dtypes(head.out)
+    wrap_modules(head, [head.out], Float32, "cpu")
+    assert isinstance(head.out, Float32)
+
+    assert Autocast(head, "cpu")(torch.randn(8, 32))["scores"].dtype == torch.float32
+    assert fc_dtypes == [torch.bfloat16]
+    # the bf16 activations of fc are cast back to fp32 before the fp32 layer
+    assert out_dtypes == [torch.float32]
+
+
+def test_wrap_modules_shares_one_wrapper():
+    shared = torch.nn.Linear(4, 4)
+    root = torch.nn.Module()
+    root.first = torch.nn.Sequential(shared)
+    root.second = torch.nn.ModuleList([shared, shared])
+    wrap_modules(root, [shared], Float32, "cpu")
+    assert isinstance(root.first[0], Float32) and root.first[0].module is shared
+    assert root.second[0] is root.second[1] is root.first[0]
+
+
+def test_check_bf16_warns_without_native_kernels(monkeypatch, caplog):
+    model = torch.nn.Linear(2, 2)
+    monkeypatch.setattr(torch.ops.mkldnn, "_is_mkldnn_bf16_supported", lambda: False)
+    with caplog.at_level(logging.WARNING, logger="hrsbench.autocast"):
+        assert check_bf16(model) == "cpu"
+    assert "slower than fp32" in caplog.text
+
+
+# random weights give activations unlike a trained model's, so the model-level bound is
+# loose; bf16 stays around 1% on a 66-conv residual stack of random convs
+FEATURE_TOLERANCE = 0.1
+
+
+@torch.no_grad()
+def _compare_features(model, reference, images):
+    expected = reference.backbone(images)
+    actual = model.backbone(images)
+    for name, feature in expected.items():
+        assert actual[name].dtype == torch.float32
+        assert _relative_error(actual[name], feature) < FEATURE_TOLERANCE, name
+
+
+def test_unidet_bf16(unidet_cfg, images):
+    from hrsbench import models, stages
+
+    predictor = models.build_unidet(unidet_cfg("MODEL.PRECISION", "bf16")).predictor
+    reference = models.build_unidet(unidet_cfg()).predictor
+    model = predictor.model
+    assert isinstance(model.backbone, Autocast) and isinstance(model.proposal_generator.rpn_head, Autocast)
+    assert all(isinstance(head, Autocast) for head in model.roi_heads.box_head)
+
+    for _, img, *_ in stages._read_inputs(images):
+        outputs = stages._detection_outputs(predictor(img))
+        assert outputs["pred_boxes"].dtype == outputs["scores"].dtype == "float32"
+        assert len(outputs["scores"]) and ((outputs["scores"] >= 0) & (outputs["scores"] <= 1)).all()
+        images_tensor = reference.model.preprocess_image([predictor.preprocess(img)]).tensor
+        _compare_features(model, reference.model, images_tensor)
+
+
+def test_maskdino_bf16(maskdino_cfg, images):
+    from detectron2.structures import ImageList
+
+    from hrsbench import models, stages
+
+    predictor = models.build_maskdino(maskdino_cfg("MODEL.PRECISION", "bf16")).predictor
+    reference = models.build_maskdino(maskdino_cfg()).predictor
+    model = predictor.model
+    assert isinstance(model.backbone, Autocast) and isinstance(model.sem_seg_head.predictor, Autocast)
+    decoder = model.sem_seg_head.predictor.module
+    assert isinstance(decoder.class_embed, Float32)
+    # the box MLP shared by every decoder layer keeps a single fp32 wrapper
+    assert all(embed is decoder._bbox_embed for embed in decoder.bbox_embed)
+
+    for _, img, *_ in stages._read_inputs(images):
+        instances = predictor(img)["instances"]
+        assert instances.scores.dtype == torch.float32 and instances.pred_masks.shape[1:] == img.shape[:2]
+        # normalized and padded as in MaskDINO.forward
+        image = (predictor.preprocess(img)["image"] - model.pixel_mean) / model.pixel_std
+        _compare_features(model, reference.model, ImageList.from_tensors([image], model.size_divisibility).tensor)
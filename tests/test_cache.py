@@ -0,0 +1,154 @@
+"""The content-addressed inference cache (`hrsbench.cache`): keys, model fingerprints and LRU eviction."""
+import os
+import pickle
+
+import pytest
+
+from hrsbench.cache import InferenceCache, file_digest, model_fingerprint, state_dict_digest, weights_digest
+
+
+class _Node(dict):
+    __getattr__ = dict.__getitem__
+
+
+class _Cfg:
+    """The part of a detectron2 `CfgNode` `model_fingerprint` uses."""
+
+    def __init__(self, weights, **options):
+        self.MODEL = _Node(WEIGHTS=str(weights))
+        self.options = options
+
+    def clone(self):
+        return _Cfg(self.MODEL.WEIGHTS, **self.options)
+
+    def defrost(self):
+        pass
+
+    def dump(self):
+        return repr(sorted({**self.options, "WEIGHTS": self.MODEL.WEIGHTS}.items()))
+
+
+def test_hit_by_content(tmp_path):
+    image = tmp_path / "0_1_prompt.png"
+    image.write_bytes(b"image bytes")
+    copy = tmp_path / "3_1_other_prompt.png"
+    copy.write_bytes(b"image bytes")
+    cache = InferenceCache(tmp_path / "cache", "model")
+
+    key = cache.key(file_digest(image))
+    assert cache.get(key) is None and cache.misses == 1
+    cache.put(key, {"scores": [0.5]})
+    # a byte-identical image of another prompt, method or seed hits the same entry
+    assert cache.get(cache.key(file_digest(copy))) == {"scores": [0.5]} and cache.hits == 1
+    # so does a new cache on the same directory
+    assert InferenceCache(tmp_path / "cache", "model").get(key) == {"scores": [0.5]}
+
+
+def test_key_covers_model_and_stage_parameters(tmp_path):
+    cache = InferenceCache(tmp_path, "model")
+    key = cache.key("digest", 0.5)
+    assert cache.key("digest", 0.5) == key
+    assert InferenceCache(tmp_path, "other model").key("digest", 0.5) != key
+    assert cache.key("other digest", 0.5) != key
+    assert cache.key("digest", 0.3) != key
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = InferenceCache(tmp_path, "model")
+    key = cache.key("digest")
+    cache.put(key, [1, 2, 3])
+    path, = tmp_path.glob("*/*.pkl")
+    path.write_bytes(b"not a pickle")
+    assert cache.get(key) is None and cache.misses == 1
+
+
+def _save_weights(path, scale=1.0, **extra):
+    torch = pytest.importorskip("torch")
+    torch.manual_seed(0)
+    state_dict = {"conv.weight": torch.randn(4, 3, 3, 3) * scale, "conv.bias": torch.zeros(4)}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    torch.save({"model": state_dict, **extra}, path)
+    return state_dict
+
+
+def test_fingerprint_follows_weights_content_and_config(tmp_path):
+    weights = tmp_path / "model.pth"
+    _save_weights(weights)
+    moved = tmp_path / "elsewhere" / "model.pth"
+    _save_weights(moved)
+    fingerprint = model_fingerprint(_Cfg(weights, MIN_SIZE_TEST=800))
+
+    # the same checkpoint at another path
+    assert model_fingerprint(_Cfg(moved, MIN_SIZE_TEST=800)) == fingerprint
+    assert model_fingerprint(_Cfg(weights, MIN_SIZE_TEST=640)) != fingerprint
+    _save_weights(weights, scale=2.0)
+    assert model_fingerprint(_Cfg(weights, MIN_SIZE_TEST=800)) != fingerprint
+
+
+def test_digest_of_the_state_dict_not_the_file(tmp_path):
+    torch = pytest.importorskip("torch")
+    np = pytest.importorskip("numpy")
+    state_dict = _save_weights(tmp_path / "model.pth")
+    digest = state_dict_digest(tmp_path / "model.pth")
+
+    # a training checkpoint with extra entries, a non-contiguous tensor and a numpy array
+    training = {
+        "model": {
+            "conv.weight": state_dict["conv.weight"].permute(3, 2, 1, 0).contiguous().permute(3, 2, 1, 0),
+            "conv.bias": np.zeros(4, dtype=np.float32),
+            "__version__": 2,
+        },
+        "optimizer": {"lr": 0.01},
+        "iteration": 90000,
+    }
+    torch.save(training, tmp_path / "model_final.pth")
+    # the layout of `hrsbench convert-weights`, memory-mapped when read
+    torch.save({"model": {key: value.clone() for key, value in reversed(state_dict.items())}}, tmp_path / "model.mmap.pth")
+    assert (tmp_path / "model.pth").read_bytes() != (tmp_path / "model.mmap.pth").read_bytes()
+    assert state_dict_digest(tmp_path / "model_final.pth") == digest
+    assert state_dict_digest(tmp_path / "model.mmap.pth") == digest
+
+    # a renamed tensor, another dtype or shape of the same bytes
+    for other in (
+        {"conv.weights": state_dict["conv.weight"], "conv.bias": state_dict["conv.bias"]},
+        {**state_dict, "conv.bias": state_dict["conv.bias"].double()},
+        {**state_dict, "conv.weight": state_dict["conv.weight"].reshape(3, 4, 3, 3)},
+    ):
+        torch.save({"model": other}, tmp_path / "other.pth")
+        assert state_dict_digest(tmp_path / "other.pth") != digest
+
+
+def test_weights_digest_sidecar(tmp_path):
+    weights = tmp_path / "model.pth"
+    _save_weights(weights)
+    digest = weights_digest(weights)
+    sidecar = tmp_path / "model.pth.sha256"
+    assert digest == state_dict_digest(weights) and sidecar.read_text().split("\n")[1] == digest
+
+    # a sidecar matching the size and mtime of the weights is trusted as is
+    stamp = sidecar.read_text().split("\n")[0]
+    sidecar.write_text(f"{stamp}\nmemoized\n")
+    assert weights_digest(weights) == "memoized"
+    # new weights have another stamp: the digest is recomputed
+    _save_weights(weights, scale=2.0)
+    assert weights_digest(weights) == state_dict_digest(weights) != digest
+
+
+def test_lru_eviction(tmp_path):
+    value = bytes(1000)
+    entry_size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    # room for three entries; an eviction goes back under 90% of the bound
+    cache = InferenceCache(tmp_path, "model", max_bytes=int(3.5 * entry_size))
+    keys = [cache.key(name) for name in "abcd"]
+    for age, key in enumerate(keys[:3]):
+        cache.put(key, value)
+        # explicit mtimes, the LRU clock, in put order
+        os.utime(cache._path(key), (1000 + age, 1000 + age))
+    assert cache.get(keys[0]) == value
+
+    cache.put(keys[3], value)
+    # b was the least recently used one: a was read after it
+    assert [cache._path(key).exists() for key in keys] == [True, False, True, True]
+    assert cache._total_bytes == 3 * entry_size
+    # the size of the directory is picked up by the next process
+    assert InferenceCache(tmp_path, "model", max_bytes=cache.max_bytes)._total_bytes == 3 * entry_size
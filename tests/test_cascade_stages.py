@@ -0,0 +1,58 @@
+"""Cascade early exit of UniDet (MODEL.ROI_BOX_CASCADE_HEAD.NUM_TEST_STAGES)."""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+KEY = "MODEL.ROI_BOX_CASCADE_HEAD.NUM_TEST_STAGES"
+
+
+def _run(predictor, images):
+    from hrsbench import stages
+
+    return [stages._detection_outputs(predictor(img)) for _, img, *_ in stages._read_inputs(images)]
+
+
+def _stages_run(predictor, images):
+    """Outputs on `images` and the indices of the cascade box heads that ran."""
+    ran = set()
+    box_heads = predictor.model.roi_heads.box_head
+    hooks = [head.register_forward_hook(lambda *_, k=k: ran.add(k)) for k, head in enumerate(box_heads)]
+    try:
+        return _run(predictor, images), ran
+    finally:
+        for hook in hooks:
+            hook.remove()
+
+
+def test_all_stages_is_the_default(unidet_cfg, images):
+    from hrsbench import models
+
+    default, ran = _stages_run(models.build_unidet(unidet_cfg()).predictor, images)
+    assert ran == {0, 1, 2}
+    # k = 3 runs the same ops as the default 0: identical outputs, bit for bit
+    for a, e in zip(_run(models.build_unidet(unidet_cfg(KEY, "3")).predictor, images), default):
+        assert a["image_size"] == e["image_size"]
+        for key in ("pred_boxes", "scores", "pred_classes"):
+            np.testing.assert_array_equal(a[key], e[key])
+
+
+@pytest.mark.parametrize("k", [1, 2])
+def test_early_exit_runs_the_first_stages(unidet_cfg, images, k):
+    from hrsbench import models
+
+    predictor = models.build_unidet(unidet_cfg(KEY, str(k))).predictor
+    assert predictor.model.roi_heads.num_test_stages == k
+    outputs, ran = _stages_run(predictor, images)
+    assert ran == set(range(k))
+    assert any(len(o["scores"]) for o in outputs)
+    for o in outputs:
+        assert ((o["scores"] >= 0) & (o["scores"] <= 1)).all()
+        assert len(o["pred_boxes"]) == len(o["scores"]) == len(o["pred_classes"])
+
+
+@pytest.mark.parametrize("k", [-1, 4])
+def test_invalid_number_of_stages(unidet_cfg, k):
+    from hrsbench import models
+
+    with pytest.raises(ValueError, match="NUM_TEST_STAGES"):
+        models.build_unidet(unidet_cfg(KEY, str(k)))
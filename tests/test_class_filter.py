@@ -0,0 +1,101 @@
+"""
+`--classes prompt` scores like `--classes all`.
+
+With the prompt classes, UniDet returns its full-vocabulary detections restricted to
+the classes of the prompt, except that an expected detection may survive where the
+full run drops it: past the `TEST.DETECTIONS_PER_IMAGE` cap, or hidden in the pickle
+behind a box of another class with the same integer coordinates. Without those two
+cases, the scorer output must be identical.
+"""
+import pickle
+import warnings
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from hrsbench import HRSBENCH_DATA_ROOT, benchmark, stages  # noqa: E402
+
+# classes no prompt expects; UniDet's merged label spaces also name some classes twice
+DISTRACTORS = ["lamp", "tree", "sign", "lamp"]
+
+
+def _vocabulary(gt_data):
+    expected = sorted({v for entry in gt_data for k, v in entry.items() if k.startswith("expected_obj") and v})
+    return [name for name in expected for _ in range(2 if name == expected[0] else 1)] + DISTRACTORS
+
+
+def _detections(rng, gt_entry, thing_classes):
+    """Random full-vocabulary detections of one image, in score order: a few of each expected class and distractors."""
+    expected = [v for k, v in gt_entry.items() if k.startswith("expected_obj") and v]
+    names = [name for name in expected for _ in range(rng.integers(0, 4))]
+    names += [str(rng.choice(DISTRACTORS)) for _ in range(rng.integers(0, 4))]
+    classes = np.array([thing_classes.index(name) for name in names], dtype=np.int64)[rng.permutation(len(names))]
+    corners = rng.uniform(0, 400, (len(names), 2))
+    boxes = np.hstack((corners, corners + rng.uniform(10, 110, (len(names), 2)))).astype(np.float32)
+    # no box hides another one in the pickle
+    assert len(np.unique(boxes.astype(int), axis=0)) == len(boxes)
+    return boxes, classes
+
+
+def _score(task, entries, path):
+    with open(path, "wb") as f:
+        pickle.dump(entries, f)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return benchmark.load_scorer(task)(str(path))
+
+
+@pytest.mark.parametrize("task", benchmark.DETECTION_TASKS)
+def test_prompt_classes_score_like_all(task, tmp_path):
+    scorer = benchmark.load_scorer_module(task)
+    gt_data = scorer.load_gt(jsonl_path=str(HRSBENCH_DATA_ROOT / f"{task}.jsonl"))
+    thing_classes = _vocabulary(gt_data)
+    classes_for = stages._prompt_classes(task, thing_classes)
+
+    rng = np.random.default_rng(0)
+    runs = {"all": {}, "prompt": {}}
+    for idx, gt_entry in enumerate(gt_data):
+        boxes, classes = _detections(rng, gt_entry, thing_classes)
+        allowed = np.isin(classes, classes_for(f"{idx}_{gt_entry['level']}_prompt.png"))
+        for name, keep in (("all", slice(None)), ("prompt", allowed)):
+            names = [thing_classes[c] for c in classes[keep]]
+            runs[name][str(idx)] = stages.collapse_duplicate_boxes(boxes[keep], names)
+
+    verdicts = {
+        name: [scorer.image_correct(gt_entry, entries[str(idx)]) for idx, gt_entry in enumerate(gt_data)]
+        for name, entries in runs.items()
+    }
+    assert any(verdicts["all"]) and not all(verdicts["all"])
+    assert verdicts["prompt"] == verdicts["all"]
+    assert _score(task, runs["prompt"], tmp_path / f"{task}_prompt.pkl") == _score(
+        task, runs["all"], tmp_path / f"{task}_all.pkl"
+    )
+
+
+def _sorted_rows(outputs, keep=slice(None)):
+    rows = np.hstack((
+        outputs["pred_classes"][keep, None].astype(np.float64),
+        outputs["scores"][keep, None],
+        outputs["pred_boxes"][keep],
+    ))
+    return rows[np.lexsort(rows.T[::-1])]
+
+
+def test_unidet_prompt_classes_restrict_full_output(unidet_cfg, images):
+    from hrsbench import models
+
+    demo = models.build_unidet(unidet_cfg())
+    predictor = demo.predictor
+    classes_for = stages._prompt_classes("counting", demo.metadata.thing_classes)
+    for path, img, *_ in stages._read_inputs(images):
+        allowed = classes_for(path)
+        full = stages._detection_outputs(predictor(img))
+        prompt = stages._detection_outputs(predictor(img, allowed))
+        assert np.isin(prompt["pred_classes"], allowed).all()
+        # the allowed detections of the full run are the best of the prompt run; the
+        # prompt run may fill the rest of the per-image cap with more of them
+        kept = np.isin(full["pred_classes"], allowed)
+        expected = _sorted_rows(full, kept)
+        top = np.argsort(-prompt["scores"], kind="stable")[:len(expected)]
+        np.testing.assert_array_equal(_sorted_rows({k: v[top] for k, v in prompt.items() if k != "image_size"}), expected)
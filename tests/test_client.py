@@ -0,0 +1,45 @@
+"""`hrsbench.client.evaluate`: which runs go to the daemon and what the request carries."""
+import pytest
+
+from hrsbench import benchmark, cli, client
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Requests sent to a daemon that is always up, and keyword arguments of in-process runs."""
+    calls = {"remote": [], "local": []}
+    monkeypatch.setattr(client, "server_address", lambda: "unix:/nonexistent.sock")
+    monkeypatch.setattr(client, "ping", lambda address: {"status": "ok"})
+    monkeypatch.setattr(client, "evaluate_remote", lambda address, request: calls["remote"].append(request) or {})
+    monkeypatch.setattr(benchmark, "run_benchmark", lambda *args, **kwargs: calls["local"].append(kwargs) or {})
+    return calls
+
+
+def test_cli_defaults_use_the_daemon(calls, tmp_path):
+    args = cli.get_parser().parse_args([str(tmp_path)])
+    assert client._local_only_options(cli._runtime_kwargs(args)) == []
+    client.evaluate(tmp_path, **cli._runtime_kwargs(args))
+    assert len(calls["remote"]) == 1 and not calls["local"]
+
+
+def test_request_options_are_forwarded(calls, tmp_path):
+    client.evaluate(tmp_path, seed=7, resume=True, render="failures")
+    request, = calls["remote"]
+    assert request["seed"] == 7 and request["resume"] is True and request["render"] == "failures"
+
+
+@pytest.mark.parametrize("option, value", [
+    ("unidet_opts", ["INPUT.MIN_SIZE_TEST", "400"]),
+    ("cache_dir", "/tmp/cache"),
+    ("cache_size_gb", 5.0),
+    ("concurrent", True),
+    ("num_workers", 2),
+    ("threads_per_worker", 4),
+    ("batch_size", 4),
+    ("classes", "prompt"),
+    ("metrics_port", 9109),
+])
+def test_daemon_options_run_in_process(calls, tmp_path, option, value):
+    assert client._local_only_options({option: value, "resume": True}) == [option]
+    client.evaluate(tmp_path, **{option: value})
+    assert not calls["remote"] and calls["local"][0][option] == value
@@ -0,0 +1,59 @@
+"""`stages.collapse_duplicate_boxes` against the nested loop it replaced."""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from hrsbench.stages import collapse_duplicate_boxes  # noqa: E402
+
+
+def _collapse_loop(pred_boxes, pred_cls_names):
+    """The original implementation: every box compared with the first box of each group, from strings."""
+    pred_objs_cls_name = np.reshape(np.array(pred_cls_names), (-1, 1))
+    pred_objs = np.hstack((pred_boxes, pred_objs_cls_name))
+    if len(pred_objs) == 0:
+        return {0: [[0, 0, 0, 0, ""]]}
+    pred_filtered = {}
+    for idx in range(pred_objs.shape[0]):
+        found = False
+        for k, v in pred_filtered.items():
+            if (pred_objs[idx][0:4].astype(float).astype(int) == v[0][0:4].astype(float).astype(int)).all():
+                found = True
+                pred_filtered[k].append(pred_objs[idx])
+                break
+        if not found:
+            pred_filtered[idx] = [pred_objs[idx]]
+    return pred_filtered
+
+
+def _boxes(rng, n):
+    """Boxes on a coarse integer grid, so many truncate to the same integers, with values just below an integer."""
+    boxes = rng.integers(0, 4, (n, 4)).astype(np.float32) * 50 + rng.integers(0, 3, (n, 4))
+    boxes += rng.choice([0.0, 0.25, 0.5, 0.999], (n, 4)).astype(np.float32)
+    near = rng.random((n, 4)) < 0.1
+    boxes[near] = np.nextafter(np.ceil(boxes[near]) + 1, 0, dtype=np.float32)
+    return boxes.astype(np.float32)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_same_groups_as_the_loop(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 60))
+    boxes = _boxes(rng, n)
+    if n > 2:
+        # exact same coordinates under other classes: the tie order is the input order
+        boxes[n - 1] = boxes[0]
+    names = [str(name) for name in rng.choice(["cup", "dog", "traffic light", "dining table"], n)]
+
+    actual = collapse_duplicate_boxes(boxes, names)
+    expected = _collapse_loop(boxes, names)
+    assert list(actual) == list(expected)
+    assert any(len(group) > 1 for group in expected.values())
+    for key, group in expected.items():
+        assert len(actual[key]) == len(group)
+        for a, e in zip(actual[key], group):
+            assert a.dtype == e.dtype and a.tolist() == e.tolist()
+
+
+def test_empty_predictions():
+    boxes = np.zeros((0, 4), dtype=np.float32)
+    assert collapse_duplicate_boxes(boxes, []) == _collapse_loop(boxes, []) == {0: [[0, 0, 0, 0, ""]]}
@@ -0,0 +1,174 @@
+"""Static-shape compiled backbones (`hrsbench.compiled`) and the MODEL.COMPILE options of the models."""
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from hrsbench.compiled import CompiledBackbone, compiled_dir  # noqa: E402
+
+
+class _Backbone(torch.nn.Module):
+    """Two feature levels in a dict, as a detectron2 backbone returns them."""
+
+    size_divisibility = 32
+
+    def __init__(self):
+        super().__init__()
+        self.stem = torch.nn.Conv2d(3, 8, 3, stride=2, padding=1)
+        self.res = torch.nn.Conv2d(8, 16, 3, stride=2, padding=1)
+
+    def forward(self, x):
+        p2 = torch.relu(self.stem(x))
+        return {"p2": p2, "p3": torch.relu(self.res(p2))}
+
+    def output_shape(self):
+        return {"p2": 8, "p3": 16}
+
+
+SHAPE = (1, 3, 32, 48)
+OTHER_SHAPE = (1, 3, 64, 32)
+
+
+@pytest.fixture(scope="module")
+def package_dir(tmp_path_factory):
+    """A package directory with the backbone compiled for SHAPE, compiled once for the module."""
+    torch.manual_seed(0)
+    path = tmp_path_factory.mktemp("compiled")
+    backbone = CompiledBackbone(_Backbone().eval(), path, min_count=1)
+    with torch.no_grad():
+        backbone(torch.randn(SHAPE))
+    if backbone.packages.get(SHAPE) is None:
+        pytest.skip("AOTInductor cannot compile on this machine")
+    return path
+
+
+def _backbone(package_dir, **kwargs):
+    torch.manual_seed(0)
+    return CompiledBackbone(_Backbone().eval(), package_dir, **kwargs)
+
+
+@torch.no_grad()
+def test_compiled_matches_eager(package_dir):
+    backbone = _backbone(package_dir)
+    x = torch.randn(SHAPE)
+    expected = backbone.backbone(x)
+    # a saved package is loaded on the first input of its shape, without waiting for MIN_COUNT
+    actual = backbone(x)
+    assert (backbone.compiled_calls, backbone.eager_calls) == (1, 0)
+    assert actual.keys() == expected.keys()
+    for name, feature in expected.items():
+        # the generated kernels may reorder float reductions
+        torch.testing.assert_close(actual[name], feature, rtol=1e-4, atol=1e-5)
+
+
+@torch.no_grad()
+def test_shapes_beyond_the_budget_run_eager(package_dir, tmp_path):
+    backbone = _backbone(package_dir, max_shapes=1)
+    backbone(torch.randn(SHAPE))
+    x = torch.randn(OTHER_SHAPE)
+    for name, feature in backbone(x).items():
+        torch.testing.assert_close(feature, backbone.backbone(x)[name], rtol=0, atol=0)
+    assert (backbone.compiled_calls, backbone.eager_calls) == (1, 1)
+    assert list(backbone.packages) == [SHAPE]
+    assert not any(package_dir.glob("1x3x64x32*"))
+
+
+def test_eager_while_counting_training_or_with_grad(tmp_path):
+    backbone = _backbone(tmp_path, min_count=2)
+    with torch.no_grad():
+        backbone(torch.randn(SHAPE))
+    # seen once, below MIN_COUNT: nothing compiled yet
+    assert backbone.counts[SHAPE] == 1 and not backbone.packages and not any(tmp_path.iterdir())
+    backbone(torch.randn(SHAPE))
+    backbone.train()
+    with torch.no_grad():
+        backbone(torch.randn(SHAPE))
+    assert backbone.counts[SHAPE] == 1 and backbone.eager_calls == 3 and backbone.compiled_calls == 0
+
+
+@torch.no_grad()
+def test_failed_compilation_runs_eager(tmp_path, monkeypatch, caplog):
+    def fail(*args, **kwargs):
+        raise RuntimeError("unsupported op")
+
+    monkeypatch.setattr(torch.export, "export", fail)
+    backbone = _backbone(tmp_path, min_count=1)
+    x = torch.randn(SHAPE)
+    with caplog.at_level(logging.WARNING, logger="hrsbench.compiled"):
+        backbone(x)
+        backbone(x)
+    assert "unsupported op" in caplog.text
+    # the shape is not retried, and no partial package is left behind
+    assert backbone.packages == {SHAPE: None} and backbone.eager_calls == 2
+    assert not any(tmp_path.rglob("*.pt2"))
+
+
+def test_wrapper_reads_through_to_the_backbone(tmp_path):
+    backbone = _backbone(tmp_path)
+    assert backbone.size_divisibility == 32
+    assert backbone.output_shape() == {"p2": 8, "p3": 16}
+    assert backbone.stem is backbone.backbone.stem
+
+
+class _Node(dict):
+    __getattr__ = dict.__getitem__
+
+
+def _cfg(weights, cache_dir="", backbone="resnest"):
+    return SimpleNamespace(MODEL=_Node(
+        WEIGHTS=str(weights), DEVICE="cpu", COMPILE=_Node(CACHE_DIR=cache_dir), BACKBONE=backbone
+    ))
+
+
+def test_compiled_dir_keys(tmp_path):
+    weights = tmp_path / "model.pth"
+    torch.save({"model": {"weight": torch.zeros(2)}}, weights)
+    path = compiled_dir(_cfg(weights), "unidet", ("BACKBONE",))
+    assert path.parent == tmp_path / "compiled" and path.name.startswith("unidet-")
+    assert compiled_dir(_cfg(weights), "unidet", ("BACKBONE",)) == path
+    assert compiled_dir(_cfg(weights, cache_dir=str(tmp_path / "cache")), "unidet", ("BACKBONE",)).parent == (
+        tmp_path / "cache"
+    )
+    # another architecture or other weights get other packages
+    assert compiled_dir(_cfg(weights, backbone="swin"), "unidet", ("BACKBONE",)) != path
+    other = tmp_path / "other.pth"
+    torch.save({"model": {"weight": torch.ones(2)}}, other)
+    assert compiled_dir(_cfg(other), "unidet", ("BACKBONE",)).name != path.name
+
+
+@pytest.mark.parametrize("opts", [("MODEL.PRECISION", "int8"), ("MODEL.BACKEND", "onnxruntime")])
+def test_unidet_compile_needs_fp32_pytorch(unidet_cfg, opts):
+    from hrsbench import models
+
+    with pytest.raises(ValueError, match="MODEL.COMPILE.ENABLED"):
+        models.build_unidet(unidet_cfg("MODEL.COMPILE.ENABLED", "True", *opts))
+
+
+def test_maskdino_compile_needs_fp32(maskdino_cfg):
+    from hrsbench import models
+
+    with pytest.raises(ValueError, match="MODEL.COMPILE.ENABLED"):
+        models.build_maskdino(maskdino_cfg("MODEL.COMPILE.ENABLED", "True", "MODEL.PRECISION", "bf16"))
+
+
+def test_unidet_compile_smoke(unidet_cfg, images, tmp_path):
+    import numpy as np
+
+    from hrsbench import models, stages
+
+    # no shape budget: the backbone is wrapped but runs eager, exactly as without MODEL.COMPILE
+    cfg = unidet_cfg(
+        "MODEL.COMPILE.ENABLED", "True", "MODEL.COMPILE.CACHE_DIR", str(tmp_path), "MODEL.COMPILE.MAX_SHAPES", "0"
+    )
+    predictor = models.build_unidet(cfg).predictor
+    reference = models.build_unidet(unidet_cfg()).predictor
+    backbone = predictor.model.backbone
+    assert isinstance(backbone, CompiledBackbone) and backbone.package_dir.parent == tmp_path
+    for _, img, *_ in stages._read_inputs(images):
+        actual = stages._detection_outputs(predictor(img))
+        expected = stages._detection_outputs(reference(img))
+        for key in ("pred_boxes", "scores", "pred_classes"):
+            np.testing.assert_array_equal(actual[key], expected[key])
+    assert backbone.eager_calls == len(images) and backbone.compiled_calls == 0
@@ -0,0 +1,60 @@
+"""Folding the UniDet batch norms into their convolutions keeps the inference outputs."""
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("detectron2")
+
+from hrsbench import models  # noqa: E402
+
+models.add_model_paths()
+
+
+def _random_norms(model):
+    """Running statistics and affine parameters far from the identity, so a wrong fold shows."""
+    for module in model.modules():
+        if isinstance(module, torch.nn.modules.batchnorm._BatchNorm):
+            module.running_mean.normal_(0, 0.5)
+            module.running_var.uniform_(0.5, 2.0)
+            module.weight.data.uniform_(0.5, 1.5)
+            module.bias.data.normal_(0, 0.5)
+
+
+def _stack(norm, radix, groups):
+    """Stem conv, a ResNeSt split-attention conv and an FPN-style output conv, each with a norm."""
+    from detectron2.layers import Conv2d, get_norm
+    from unidet.modeling.backbone.splat import SplAtConv2d
+
+    return torch.nn.Sequential(
+        Conv2d(3, 16, 3, padding=1, bias=False, norm=get_norm(norm, 16), activation=torch.relu),
+        SplAtConv2d(16, 16, 3, padding=1, groups=groups, bias=False, radix=radix, norm=norm),
+        Conv2d(16, 8, 3, padding=1, norm=get_norm(norm, 8)),
+    )
+
+
+@pytest.mark.parametrize("norm", ["BN", "SyncBN"])
+@pytest.mark.parametrize("radix,groups", [(2, 1), (2, 2), (4, 1)])
+@torch.no_grad()
+def test_folded_matches_unfolded(norm, radix, groups):
+    from unidet.modeling.backbone.splat import SplAtConv2d
+    from unidet.modeling.fold_bn import fold_batchnorm
+
+    torch.manual_seed(0)
+    model = _stack(norm, radix, groups)
+    _random_norms(model)
+    model.eval()
+    x = torch.randn(2, 3, 20, 24)
+    expected = model(x)
+
+    assert fold_batchnorm(model) == 4
+    splat = model[1]
+    assert isinstance(splat, SplAtConv2d) and not splat.use_bn and not hasattr(splat, "bn0")
+    assert model[0].norm is None and model[2].norm is None
+    # folding only reorders the float products: differences are rounding, ~1e-6 here
+    torch.testing.assert_close(model(x), expected, rtol=1e-4, atol=1e-4)
+
+
+def test_fold_refuses_training_mode():
+    from unidet.modeling.fold_bn import fold_batchnorm
+
+    with pytest.raises(AssertionError):
+        fold_batchnorm(_stack("BN", 2, 1))
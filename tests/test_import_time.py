@@ -0,0 +1,45 @@
+"""The CLI and the scoring path stay free of the model stacks (`hrsbench.perf.import_time`)."""
+import json
+import os
+import pickle
+import subprocess
+import sys
+
+import pytest
+
+from hrsbench import HRSBENCH_ROOT
+from hrsbench.perf.import_time import MODEL_STACKS, TARGETS, measure
+
+
+@pytest.fixture(autouse=True)
+def source_path(monkeypatch):
+    """Fresh interpreters import this source tree, installed or not."""
+    monkeypatch.setenv("PYTHONPATH", os.pathsep.join([str(HRSBENCH_ROOT.parent), os.environ.get("PYTHONPATH", "")]))
+
+
+@pytest.mark.parametrize("module, forbidden", [(module, forbidden) for module, forbidden, _ in TARGETS])
+def test_import_pulls_no_forbidden_module(module, forbidden):
+    # the time budgets are left to the benchmark itself: they depend on the machine
+    _, imported = measure(module, repeat=1)
+    assert not imported.intersection(forbidden)
+
+
+_SCORE = """
+import json, sys
+from hrsbench import cli
+cli.score_main(sys.argv[1:])
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def test_score_runs_without_model_stacks(tmp_path):
+    pkl_path = tmp_path / "counting.pkl"
+    with open(pkl_path, "wb") as f:
+        pickle.dump({}, f)
+    out = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", _SCORE, "counting", str(pkl_path)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    modules = {name.split(".")[0] for name in json.loads(out.strip().splitlines()[-1])}
+    assert "hrsbench" in modules and not modules.intersection(MODEL_STACKS)
+    assert (tmp_path / "counting_results.json").is_file()
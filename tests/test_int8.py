@@ -0,0 +1,126 @@
+"""INT8 UniDet: calibration, quantization and its error against fp32."""
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("detectron2")
+
+from hrsbench import models  # noqa: E402
+
+models.add_model_paths()
+
+
+def _relative_error(actual, expected):
+    return float((actual - expected).norm() / expected.norm())
+
+
+class _Detector(torch.nn.Module):
+    """The parts `quantize_int8` touches: convs under `backbone`, linears in `roi_heads`."""
+
+    def __init__(self):
+        from detectron2.layers import Conv2d
+        from unidet.modeling.backbone.splat import SplAtConv2d
+
+        super().__init__()
+        self.backbone = torch.nn.Sequential(
+            Conv2d(3, 32, 3, stride=2, padding=1, activation=torch.relu),
+            SplAtConv2d(32, 32, 3, padding=1, radix=2, bias=False),
+            Conv2d(32, 64, 3, stride=2, padding=1, activation=torch.relu),
+            Conv2d(64, 64, 1),
+        )
+        self.roi_heads = torch.nn.Module()
+        self.roi_heads.box_head = torch.nn.Sequential(torch.nn.Flatten(), torch.nn.Linear(64 * 16, 128), torch.nn.ReLU())
+        self.roi_heads.box_predictor = torch.nn.Linear(128, 10)
+
+    def forward(self, x):
+        features = self.backbone(x)
+        pooled = torch.nn.functional.adaptive_avg_pool2d(features, 4)
+        return features, self.roi_heads.box_predictor(self.roi_heads.box_head(pooled))
+
+
+@torch.no_grad()
+def test_quantized_layers_stay_close_to_fp32():
+    from unidet.modeling.quantize import Int8Conv, calibrate_int8, int8_convs, quantize_int8
+
+    torch.manual_seed(0)
+    model = _Detector().eval()
+    calibration = [torch.randn(2, 3, 32, 40) for _ in range(4)]
+    x = torch.randn(2, 3, 32, 40)
+    expected = model(x)
+
+    convs = int8_convs(model)
+    # the split-attention FCs run on pooled 1x1 maps and stay in fp32
+    assert sorted(convs) == ["backbone.0", "backbone.1.conv", "backbone.2", "backbone.3"]
+    qparams = calibrate_int8(model, lambda: [model(batch) for batch in calibration])
+    assert sorted(qparams) == sorted(convs)
+    # calibration leaves the model as it was
+    torch.testing.assert_close(model(x), expected, rtol=0, atol=0)
+
+    quantize_int8(model, qparams)
+    assert all(isinstance(model.get_submodule(name), Int8Conv) for name in convs)
+    features, logits = model(x)
+    # 8-bit activations and weights: about 1% of relative error through these four convs
+    assert _relative_error(features, expected[0]) < 0.05
+    assert _relative_error(logits, expected[1]) < 0.05
+
+
+def test_quantize_needs_every_calibrated_conv():
+    from unidet.modeling.quantize import quantize_int8
+
+    with pytest.raises(ValueError, match="No calibrated ranges"):
+        quantize_int8(_Detector().eval(), {})
+
+
+@pytest.fixture
+def calibration_dir(images):
+    from pathlib import Path
+
+    return str(Path(images[0]).parent)
+
+
+def test_unidet_int8_smoke(unidet_cfg, images, calibration_dir):
+    from unidet.modeling.quantize import Int8Conv, int8_qparams_path
+    from unidet.predictor import build_unidet_predictor
+
+    from hrsbench import stages
+
+    cfg = unidet_cfg(
+        "MODEL.PRECISION", "int8", "MODEL.QUANT.CALIBRATION_DIR", calibration_dir,
+        "MODEL.QUANT.NUM_CALIBRATION_IMAGES", "4",
+    )
+    # 4 of the 6 images, one every len // 4 = 1: the first four
+    qparams_path = int8_qparams_path(cfg, sorted(images)[:4])
+    assert not qparams_path.exists()
+    predictor = build_unidet_predictor(cfg)
+    # the calibrated ranges are saved next to the weights and reused by the next build
+    assert qparams_path.is_file()
+    saved = qparams_path.stat().st_mtime_ns
+    build_unidet_predictor(cfg)
+    assert qparams_path.stat().st_mtime_ns == saved
+    qparams_path.unlink()
+    assert any(isinstance(m, Int8Conv) for m in predictor.model.backbone.modules())
+
+    reference = build_unidet_predictor(unidet_cfg())
+    for _, img, *_ in stages._read_inputs(images):
+        outputs = stages._detection_outputs(predictor(img))
+        height, width = outputs["image_size"]
+        assert len(outputs["scores"]) and ((outputs["scores"] >= 0) & (outputs["scores"] <= 1)).all()
+        assert (outputs["pred_boxes"] >= 0).all()
+        assert (outputs["pred_boxes"][:, [0, 2]] <= width).all() and (outputs["pred_boxes"][:, [1, 3]] <= height).all()
+
+        inputs = [predictor.preprocess(img)]
+        images_tensor = reference.model.preprocess_image(inputs).tensor
+        with torch.no_grad():
+            quantized = predictor.model.backbone(images_tensor)
+            expected = reference.model.backbone(images_tensor)
+        # random weights make activations unlike a trained model's, so this bound only
+        # catches a broken quantization (wrong ranges or layers); the error itself is
+        # bounded by test_quantized_layers_stay_close_to_fp32
+        for level, feature in expected.items():
+            assert _relative_error(quantized[level], feature) < 0.5, level
+
+
+def test_unidet_int8_needs_calibration_images(unidet_cfg):
+    from unidet.predictor import build_unidet_predictor
+
+    with pytest.raises(ValueError, match="calibration images"):
+        build_unidet_predictor(unidet_cfg("MODEL.PRECISION", "int8"))
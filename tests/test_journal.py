@@ -0,0 +1,116 @@
+"""Crash safety of the stage journals (`hrsbench.journal`) and resumed detection runs."""
+import os
+import pickle
+
+import pytest
+
+from hrsbench.journal import _HEADER, Journal
+
+RECORDS = {f"{idx}_1_prompt.png": (str(idx), {0: [f"box {idx}"]}) for idx in range(3)}
+
+
+def _write(path):
+    with Journal(path) as journal:
+        for key, value in RECORDS.items():
+            journal.commit(key, value)
+    return path.stat().st_size
+
+
+def _reopen(path):
+    with Journal(path, resume=True) as journal:
+        return dict(journal.records)
+
+
+def _last_record_size():
+    key, value = list(RECORDS.items())[-1]
+    return _HEADER.size + len(pickle.dumps((key, value)))
+
+
+def test_reopen_replays_every_record(tmp_path):
+    path = tmp_path / "counting.pkl.journal"
+    _write(path)
+    assert _reopen(path) == RECORDS
+
+
+def test_without_resume_the_journal_starts_empty(tmp_path):
+    path = tmp_path / "counting.pkl.journal"
+    _write(path)
+    with Journal(path) as journal:
+        assert len(journal) == 0
+    assert path.stat().st_size == 0
+
+
+# bytes of the last record on disk: part of its header, its header alone, part of its payload
+@pytest.mark.parametrize("kept", [5, _HEADER.size, _HEADER.size + 5, _last_record_size() - 1])
+def test_torn_tail_is_dropped(tmp_path, kept):
+    path = tmp_path / "counting.pkl.journal"
+    valid_size = _write(path) - _last_record_size()
+    # a crash in the middle of the last commit
+    os.truncate(path, valid_size + kept)
+    expected = dict(list(RECORDS.items())[:-1])
+    assert _reopen(path) == expected
+    assert path.stat().st_size == valid_size
+
+    # the next commits append after the last whole record
+    key, value = list(RECORDS.items())[-1]
+    with Journal(path, resume=True) as journal:
+        journal.commit(key, value)
+    assert _reopen(path) == RECORDS
+
+
+def test_corrupt_record_is_rejected(tmp_path):
+    path = tmp_path / "counting.pkl.journal"
+    size = _write(path)
+    with open(path, "r+b") as f:
+        f.seek(size - 2)
+        byte = f.read(1)
+        f.seek(size - 2)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    assert _reopen(path) == dict(list(RECORDS.items())[:-1])
+    assert path.stat().st_size == size - _last_record_size()
+
+
+def test_records_after_a_corrupt_one_are_dropped(tmp_path):
+    path = tmp_path / "counting.pkl.journal"
+    _write(path)
+    with open(path, "r+b") as f:
+        # flip a payload byte of the first record: its checksum no longer matches
+        f.seek(_HEADER.size + 1)
+        byte = f.read(1)
+        f.seek(_HEADER.size + 1)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    # only a whole prefix of valid records is replayed
+    assert _reopen(path) == {}
+    assert path.stat().st_size == 0
+
+
+def test_resumed_detection_skips_finished_images(unidet_cfg, images, tmp_path, monkeypatch):
+    import numpy as np
+
+    from hrsbench import models, stages
+
+    demo = models.build_unidet(unidet_cfg())
+    expected = stages.run_detection(demo, images, "counting", tmp_path / "full", tmp_path / "full" / "counting.pkl")
+
+    computed = []
+    detection_outputs = stages._detection_outputs
+
+    def counting_outputs(predictions):
+        computed.append(predictions)
+        return detection_outputs(predictions)
+
+    monkeypatch.setattr(stages, "_detection_outputs", counting_outputs)
+    pkl_path = tmp_path / "run" / "counting.pkl"
+    # an interrupted run: the first three images are committed to the journal
+    stages.run_detection(demo, images[:3], "counting", tmp_path / "run", pkl_path)
+    os.remove(pkl_path)
+    assert len(computed) == 3
+
+    actual = stages.run_detection(demo, images, "counting", tmp_path / "run", pkl_path, resume=True)
+    assert len(computed) == len(images)
+    with open(pkl_path, "rb") as f:
+        assert pickle.load(f).keys() == actual.keys() == expected.keys()
+    for idx, entry in expected.items():
+        assert actual[idx].keys() == entry.keys()
+        for key, boxes in entry.items():
+            np.testing.assert_array_equal(actual[idx][key], boxes)
@@ -0,0 +1,114 @@
+import struct
+import zlib
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from hrsbench.masks import decode_gray_png, read_mask  # noqa: E402
+
+
+def _chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+
+def _paeth(a: int, b: int, c: int) -> int:
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    return a if pa <= pb and pa <= pc else (b if pb <= pc else c)
+
+
+def _filter_row(filter_type: int, row: np.ndarray, prev: np.ndarray) -> bytes:
+    """Reference PNG filtering of one 8-bit grayscale scanline (PNG spec, section 9)."""
+    out = []
+    for x in range(len(row)):
+        a = int(row[x - 1]) if x else 0
+        b = int(prev[x])
+        c = int(prev[x - 1]) if x else 0
+        predictor = (0, a, b, (a + b) // 2, _paeth(a, b, c))[filter_type]
+        out.append((int(row[x]) - predictor) & 0xFF)
+    return bytes([filter_type, *out])
+
+
+def _png(width: int, height: int, raw: bytes) -> bytes:
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n" + _chunk(b"IHDR", header) + _chunk(b"IDAT", zlib.compress(raw)) + _chunk(b"IEND", b"")
+    )
+
+
+def _encode_gray_png(image: np.ndarray, filter_types) -> bytes:
+    """8-bit grayscale PNG whose row y uses filter_types[y % len(filter_types)]."""
+    height, width = image.shape
+    raw = b""
+    prev = np.zeros(width, dtype=np.uint8)
+    for y in range(height):
+        raw += _filter_row(filter_types[y % len(filter_types)], image[y], prev)
+        prev = image[y]
+    return _png(width, height, raw)
+
+
+def _images():
+    rng = np.random.default_rng(0)
+    mask = np.zeros((37, 53), dtype=np.uint8)
+    mask[5:30, 10:41] = 255
+    return {
+        "noise": rng.integers(0, 256, (23, 31), dtype=np.uint8),
+        "mask": mask,
+        "gradient": np.add.outer(np.arange(40), np.arange(45)).astype(np.uint8),
+        "single pixel": np.array([[200]], dtype=np.uint8),
+    }
+
+
+@pytest.mark.parametrize("name", list(_images()))
+@pytest.mark.parametrize("filter_type", [0, 1, 2, 3, 4], ids=["none", "sub", "up", "average", "paeth"])
+def test_decode_every_filter_type(name, filter_type):
+    image = _images()[name]
+    assert np.array_equal(decode_gray_png(_encode_gray_png(image, [filter_type])), image)
+
+
+def test_decode_mixed_filter_types():
+    image = _images()["noise"]
+    assert np.array_equal(decode_gray_png(_encode_gray_png(image, [4, 0, 3, 1, 2])), image)
+
+
+def test_decode_rejects_unknown_filter_type():
+    with pytest.raises(ValueError):
+        decode_gray_png(_png(4, 2, b"\x07" + bytes(4) + b"\x00" + bytes(4)))
+
+
+@pytest.mark.parametrize("name", list(_images()))
+def test_read_mask_matches_cv2_on_cv2_encoded_masks(tmp_path, name):
+    cv2 = pytest.importorskip("cv2")
+    image = _images()[name]
+    # the segmentation stage saves its masks with cv2.imencode(".png", mask)
+    for level in (0, 1, 9):
+        path = tmp_path / f"{level}.png"
+        path.write_bytes(cv2.imencode(".png", image, [cv2.IMWRITE_PNG_COMPRESSION, level])[1].tobytes())
+        assert np.array_equal(read_mask(path), cv2.imread(str(path), cv2.IMREAD_GRAYSCALE))
+        assert np.array_equal(read_mask(path), image)
+
+
+@pytest.mark.parametrize("name", list(_images()))
+def test_read_mask_on_pil_encoded_masks(tmp_path, name):
+    Image = pytest.importorskip("PIL.Image")
+    image = _images()[name]
+    path = tmp_path / "mask.png"
+    Image.fromarray(image).save(path, optimize=True)
+    assert np.array_equal(read_mask(path), image)
+
+
+@pytest.mark.parametrize("mode", ["1", "I;16", "RGB"])
+def test_other_png_flavours_fall_back_to_cv2(tmp_path, mode):
+    cv2 = pytest.importorskip("cv2")
+    Image = pytest.importorskip("PIL.Image")
+    path = tmp_path / "mask.png"
+    Image.fromarray(_images()["mask"]).convert(mode).save(path)
+    assert decode_gray_png(path.read_bytes()) is None
+    assert np.array_equal(read_mask(path), cv2.imread(str(path), cv2.IMREAD_GRAYSCALE))
+
+
+def test_read_mask_unreadable(tmp_path):
+    assert read_mask(tmp_path / "missing.png") is None
+    (tmp_path / "truncated.png").write_bytes(b"\x89PNG\r\n\x1a\n")
+    assert read_mask(tmp_path / "truncated.png") is None
@@ -0,0 +1,136 @@
+"""Live progress metrics (`hrsbench.metrics`): rate and ETA, and the Prometheus text exposition."""
+import json
+import math
+import re
+
+import pytest
+
+from hrsbench import metrics
+
+_SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)\{((?:[a-zA-Z_]+="(?:[^"\\]|\\.)*",?)*)\} (\S+)$')
+_LABEL = re.compile(r'([a-zA-Z_]+)="((?:[^"\\]|\\.)*)"')
+
+
+def _parse(text):
+    """
+    Samples of a Prometheus text exposition as {(name, sorted labels): value}, checking that
+    every sample follows the HELP and TYPE lines of its metric family.
+    """
+    assert text.endswith("\n")
+    types, samples = {}, {}
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            name = line.split(" ")[2]
+            assert name not in types, f"{name} declared twice"
+        elif line.startswith("# TYPE "):
+            _, _, name, metric_type = line.split(" ")
+            assert metric_type in ("gauge", "summary")
+            types[name] = metric_type
+        else:
+            match = _SAMPLE.match(line)
+            assert match, f"malformed sample line {line!r}"
+            name, labels, value = match.groups()
+            family = re.sub(r"_(sum|count)$", "", name) if name not in types else name
+            assert family in types, f"{name} has no TYPE line"
+            labels = tuple(sorted((key, value.replace('\\"', '"')) for key, value in _LABEL.findall(labels)))
+            samples[name, labels] = float(value)
+    return samples
+
+
+class _Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock(1000.0)
+    monkeypatch.setattr(metrics.time, "time", clock)
+    return clock
+
+
+def _labels(progress, **extra):
+    return tuple(sorted({**progress.labels, **extra}.items()))
+
+
+def test_rate_and_eta(clock):
+    # 2 images already done by an interrupted run
+    progress = metrics.TaskProgress("detection", "counting", "run", total=10, done=2)
+    assert math.isnan(progress.snapshot()["eta"])
+    for t, cached in ((1010, False), (1020, True), (1030, False)):
+        clock.now = t
+        progress.image_done(cached)
+    snapshot = progress.snapshot()
+    assert (snapshot["done"], snapshot["cached"], snapshot["last_progress"]) == (5, 1, 1030)
+    # 3 images in the 30 s since the start
+    assert snapshot["rate"] == pytest.approx(0.1)
+    assert snapshot["eta"] == pytest.approx(50)
+
+    # the window slides: only the image finished at 1030 is in the last minute
+    clock.now = 1085
+    assert progress.snapshot()["rate"] == pytest.approx(1 / 60)
+    assert progress.snapshot()["eta"] == pytest.approx(300)
+    for _ in range(5):
+        progress.image_done()
+    assert progress.snapshot()["eta"] == 0.0
+
+
+def test_latency_quantiles():
+    progress = metrics.TaskProgress("segmentation", "color", "run", total=100)
+    for ms in range(1, 101):
+        progress.observe("model", ms / 1000)
+    latency = progress.snapshot()["latencies"]["model"]
+    assert latency["quantiles"] == {"0.5": 0.051, "0.9": 0.091, "0.99": 0.1}
+    assert latency["count"] == 100 and latency["sum"] == pytest.approx(5.05)
+    assert math.isnan(progress.snapshot()["latencies"]["decode"]["quantiles"]["0.5"])
+
+
+def test_exposition_format(clock):
+    registry = metrics.MetricsRegistry()
+    progress = registry.task("detection", "counting", 'out/"quoted" run', total=4, done=1)
+    clock.now = 1002
+    progress.observe("model", 0.25)
+    progress.image_done()
+    progress.set_queue_depth(3)
+
+    samples = _parse(metrics.render_prometheus(registry.snapshot()))
+    assert samples["hrsbench_images_total", _labels(progress)] == 4
+    assert samples["hrsbench_images_done", _labels(progress)] == 2
+    assert samples["hrsbench_images_per_second", _labels(progress)] == 0.5
+    assert samples["hrsbench_eta_seconds", _labels(progress)] == 4
+    assert samples["hrsbench_queue_depth", _labels(progress)] == 3
+    assert samples["hrsbench_task_running", _labels(progress)] == 1
+    assert samples["hrsbench_last_progress_timestamp_seconds", _labels(progress)] == 1002
+    latency = _labels(progress, phase="model", quantile="0.99")
+    assert samples["hrsbench_image_latency_seconds", latency] == 0.25
+    assert samples["hrsbench_image_latency_seconds_count", _labels(progress, phase="model")] == 1
+    # phases without samples have NaN quantiles
+    assert math.isnan(samples["hrsbench_image_latency_seconds", _labels(progress, phase="decode", quantile="0.5")])
+
+    progress.finish()
+    samples = _parse(metrics.render_prometheus(registry.snapshot()))
+    assert samples["hrsbench_task_running", _labels(progress)] == 0
+    assert samples["hrsbench_queue_depth", _labels(progress)] == 0
+
+
+def test_exporter_merges_worker_snapshots(tmp_path, monkeypatch):
+    # the registry of the worker process and the one of the parent
+    worker = metrics.MetricsRegistry()
+    worker.task("segmentation", "color", "run", total=3).image_done()
+    monkeypatch.setattr(metrics, "REGISTRY", worker)
+    metrics.SnapshotWriter(tmp_path / "worker.json").tick()
+    assert json.loads((tmp_path / "worker.json").read_text())[0]["done"] == 1
+
+    parent = metrics.MetricsRegistry()
+    parent.task("detection", "counting", "run", total=5)
+    monkeypatch.setattr(metrics, "REGISTRY", parent)
+    exporter = metrics.MetricsExporter(
+        tmp_path / "textfile" / "hrsbench.prom", child_snapshots=[tmp_path / "worker.json", tmp_path / "missing.json"]
+    )
+    exporter.tick()
+    samples = _parse((tmp_path / "textfile" / "hrsbench.prom").read_text())
+    done = {dict(labels)["task"]: value for (name, labels), value in samples.items() if name == "hrsbench_images_done"}
+    assert done == {"counting": 0, "color": 1}
@@ -0,0 +1,59 @@
+"""UniDet with MODEL.BACKEND onnxruntime against the PyTorch model, and the reuse of its exported graphs."""
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("torch")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("detectron2")
+
+from hrsbench import models, stages  # noqa: E402
+
+models.add_model_paths()
+
+
+def test_onnxruntime_matches_pytorch(unidet_cfg, images):
+    from unidet.modeling.onnx_backend import OrtBackbone, OrtBoxHead, OrtRPNHead
+
+    predictor = models.build_unidet(unidet_cfg("MODEL.BACKEND", "onnxruntime")).predictor
+    reference = models.build_unidet(unidet_cfg()).predictor
+    model = predictor.model
+    assert isinstance(model.backbone, OrtBackbone) and isinstance(model.proposal_generator.rpn_head, OrtRPNHead)
+    assert all(isinstance(head, OrtBoxHead) for head in model.roi_heads.box_head)
+
+    for _, img, *_ in stages._read_inputs(images):
+        actual = stages._detection_outputs(predictor(img))
+        expected = stages._detection_outputs(reference(img))
+        assert actual["image_size"] == expected["image_size"]
+        assert len(expected["scores"])
+        np.testing.assert_array_equal(actual["pred_classes"], expected["pred_classes"])
+        # ORT kernels round floats differently from torch: well below a pixel and 1e-4 in score
+        np.testing.assert_allclose(actual["pred_boxes"], expected["pred_boxes"], rtol=0, atol=1e-2)
+        np.testing.assert_allclose(actual["scores"], expected["scores"], rtol=0, atol=1e-4)
+
+
+def test_export_reuses_the_graphs(unidet_cfg, monkeypatch):
+    from unidet.modeling import onnx_backend
+
+    cfg = unidet_cfg("MODEL.BACKEND", "onnxruntime")
+    model = models.build_unidet(unidet_cfg()).predictor.model
+    out_dir = onnx_backend.export_onnx(model, cfg)
+    assert out_dir == onnx_backend.onnx_dir(cfg)
+    graphs = {path.name: path.stat().st_mtime_ns for path in out_dir.iterdir()}
+    assert {"backbone.onnx", "rpn_head.onnx", "box_head0.onnx"} <= set(graphs)
+
+    def write_graphs(model, out_dir):
+        raise AssertionError("the graphs were exported again")
+
+    monkeypatch.setattr(onnx_backend, "_write_graphs", write_graphs)
+    assert onnx_backend.export_onnx(model, cfg) == out_dir
+    assert {path.name: path.stat().st_mtime_ns for path in out_dir.iterdir()} == graphs
+    # no temporary export directory is left next to it
+    assert not [path for path in out_dir.parent.iterdir() if path.name.startswith(".")]
+
+
+def test_other_architecture_gets_other_graphs(unidet_cfg):
+    from unidet.modeling.onnx_backend import onnx_dir
+
+    cfg = unidet_cfg("MODEL.BACKEND", "onnxruntime")
+    other = unidet_cfg("MODEL.BACKEND", "onnxruntime", "MODEL.FOLD_BN", str(not cfg.MODEL.FOLD_BN))
+    assert onnx_dir(other) != onnx_dir(cfg)
@@ -0,0 +1,67 @@
+"""The UniDet speed/accuracy profiles: their config options, the CLI and a run of each."""
+import pytest
+
+from hrsbench import cli
+from hrsbench.models import UNIDET_PROFILES, unidet_profile_opts
+
+
+@pytest.mark.parametrize("profile", list(UNIDET_PROFILES))
+def test_profile_opts_are_key_value_pairs(profile):
+    opts = unidet_profile_opts(profile)
+    assert dict(zip(opts[::2], opts[1::2])) == {key: str(value) for key, value in UNIDET_PROFILES[profile].items()}
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError, match="Unknown UniDet profile"):
+        unidet_profile_opts("fastest")
+    with pytest.raises(SystemExit):
+        cli.get_serve_parser().parse_args(["--profile", "fastest"])
+
+
+def test_unidet_opts_override_the_profile():
+    args = cli.get_serve_parser().parse_args(["--profile", "fast", "--unidet-opts", "INPUT.MIN_SIZE_TEST", "400"])
+    # later options win in merge_from_list
+    assert cli._unidet_opts(args) == [*unidet_profile_opts("fast"), "INPUT.MIN_SIZE_TEST", "400"]
+    # the default profile adds nothing, so the cache fingerprint of default runs is unchanged
+    assert cli._unidet_opts(cli.get_serve_parser().parse_args([])) == []
+
+
+def test_fold_bn_flag():
+    args = cli.get_serve_parser().parse_args(["--fold-bn"])
+    assert cli._unidet_opts(args) == ["MODEL.FOLD_BN", "True"]
+    # folding is a speed trade-off of the faster profiles only
+    assert [UNIDET_PROFILES[profile].get("MODEL.FOLD_BN", False) for profile in UNIDET_PROFILES] == [False, True, True]
+
+
+@pytest.mark.parametrize("profile", list(UNIDET_PROFILES))
+def test_profile_sets_the_config(profile):
+    pytest.importorskip("detectron2")
+    from hrsbench.models import setup_unidet_cfg
+
+    cfg = setup_unidet_cfg(opts=unidet_profile_opts(profile))
+    for key, value in UNIDET_PROFILES[profile].items():
+        node = cfg
+        for part in key.split("."):
+            node = node[part]
+        assert node == value, key
+
+
+def test_accurate_profile_is_the_shipped_config():
+    pytest.importorskip("detectron2")
+    from hrsbench.models import setup_unidet_cfg
+
+    # same config, hence the same detections, bit for bit
+    assert setup_unidet_cfg(opts=unidet_profile_opts("accurate")).dump() == setup_unidet_cfg().dump()
+    assert not setup_unidet_cfg().MODEL.FOLD_BN
+
+
+@pytest.mark.parametrize("profile", list(UNIDET_PROFILES))
+def test_each_profile_runs(unidet_cfg, images, profile):
+    from hrsbench import models, stages
+
+    cfg = unidet_cfg(*unidet_profile_opts(profile))
+    demo = models.build_unidet(cfg)
+    _, img, *_ = next(stages._read_inputs(images[:1]))
+    outputs = stages._detection_outputs(demo.predictor(img))
+    assert outputs["image_size"] == img.shape[:2]
+    assert 0 < len(outputs["scores"]) <= UNIDET_PROFILES[profile]["TEST.DETECTIONS_PER_IMAGE"]
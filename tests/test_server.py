@@ -0,0 +1,105 @@
+"""Per-image verdicts of the daemon (`POST /images`, and `/evaluate` with `per_image`) on fixed model outputs."""
+import pickle
+import threading
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+from hrsbench import stages  # noqa: E402
+from hrsbench.server import EvaluationService, RequestError  # noqa: E402
+
+# prompt 0 of counting.jsonl: "two cups filled with steaming hot coffee ..."
+CUPS = "0_1_two cups filled with steaming hot coffee.png"
+# prompt 0 of color.jsonl: "a red banana and a green chair."
+BANANA = "0_1_a red banana and a green chair.png"
+BANANA_ID, CHAIR_ID = 46, 56
+
+
+def _service():
+    """A service whose models are replaced by the fake stages below."""
+    service = EvaluationService.__new__(EvaluationService)
+    service.unidet = service.maskdino = service.unidet_cache = service.maskdino_cache = None
+    service.render = service.classes = "all"
+    service.lock = threading.Lock()
+    service.num_requests = 0
+    return service
+
+
+@pytest.fixture
+def detections(monkeypatch):
+    """Class names detected on every image, written to the pickle like `run_detection` does."""
+    names = []
+
+    def run_detection(demo, image_paths, task, output_base_dir, pkl_path, **kwargs):
+        boxes = np.array([[10 + 50 * i, 10, 40 + 50 * i, 60] for i in range(len(names))], dtype=np.float32)
+        entries = {stages.image_index(path): stages.collapse_duplicate_boxes(boxes, names) for path in image_paths}
+        with open(pkl_path, "wb") as f:
+            pickle.dump(entries, f)
+
+    monkeypatch.setattr(stages, "run_detection", run_detection)
+    return names
+
+
+def _color_image(chair_bgr):
+    """A red left half (the banana) and a right half of `chair_bgr` (the chair)."""
+    img = np.zeros((64, 96, 3), dtype=np.uint8)
+    # hue 5 and 60 in OpenCV's 0-180 range: red and green for the scorer
+    img[:, :48] = (0, 43, 255)
+    img[:, 48:] = chair_bgr
+    return cv2.imencode(".png", img)[1].tobytes()
+
+
+@pytest.fixture
+def segmentation(monkeypatch):
+    """One mask per half of the image, saved like `run_segmentation` does."""
+
+    def run_segmentation(demo, image_paths, output_base_dir, **kwargs):
+        out_dir = output_base_dir / "color_detected_images"
+        out_dir.mkdir()
+        for path in image_paths:
+            for mask_idx, (class_id, columns) in enumerate(((BANANA_ID, slice(0, 48)), (CHAIR_ID, slice(48, 96)))):
+                mask = np.zeros((64, 96), dtype=np.uint8)
+                mask[:, columns] = 255
+                name = stages.mask_filename(Path(path).stem, mask_idx, class_id)
+                cv2.imwrite(str(out_dir / name), mask)
+        return out_dir
+
+    monkeypatch.setattr(stages, "run_segmentation", run_segmentation)
+
+
+@pytest.mark.parametrize("names, correct", [(["cup", "cup"], True), (["cup"], False), (["cup", "cup", "cup"], False)])
+def test_image_counting_verdict(detections, names, correct):
+    detections.extend(names)
+    results = _service().evaluate_image("counting", CUPS, b"not decoded by the fake detection")
+    # the image is judged on its own, not divided by the 2990 prompts of the task
+    assert results == {"counting": {"images": {CUPS: correct}, "accuracy": 100.0 if correct else 0.0}}
+
+
+@pytest.mark.parametrize("chair_bgr, correct", [((0, 255, 0), True), ((255, 0, 0), False)])
+def test_image_color_verdict(segmentation, chair_bgr, correct):
+    results = _service().evaluate_image("color", BANANA, _color_image(chair_bgr))
+    assert results == {"color": {"images": {BANANA: correct}, "accuracy": 100.0 if correct else 0.0}}
+
+
+def test_subset_per_image(detections, tmp_path):
+    detections.extend(["cup", "cup"])
+    task_dir = tmp_path / "counting_seed42"
+    task_dir.mkdir()
+    # prompt 1 expects two parking meters
+    for name in (CUPS, "1_1_two parking meters.png"):
+        (task_dir / name).write_bytes(b"")
+    request = {"task": "counting", "task_dir": str(task_dir), "output_dir": str(tmp_path / "output")}
+    results = _service().evaluate({**request, "per_image": True})
+    assert results["counting"] == {"images": {CUPS: True, "1_1_two parking meters.png": False}, "accuracy": 50.0}
+    with pytest.warns(UserWarning, match="not found in predictions"):
+        # the dataset-wide scorer looks for the 2988 other prompts too
+        assert "images" not in _service().evaluate(request)["counting"]
+
+
+@pytest.mark.parametrize("name", ["cups.png", "../0_1_cups.png", "0_1_cups.gif"])
+def test_invalid_image_name(name):
+    with pytest.raises(RequestError):
+        _service().evaluate_image("counting", name, b"")
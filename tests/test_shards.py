@@ -0,0 +1,156 @@
+"""Sharded stage runs (`--num-shards`/`--shard-id`) and `hrsbench.shards.merge_shards`."""
+import os
+import pickle
+import subprocess
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from hrsbench import HRSBENCH_ROOT  # noqa: E402
+from hrsbench.shards import ShardError, merge_shards, select_shard, shard_path, write_shard  # noqa: E402
+
+NUM_SHARDS = 3
+# two samples of prompt 3 and a name without a prompt index, which is sharded by hash
+NAMES = [f"{idx}_1_prompt.png" for idx in range(8)] + ["3_1_prompt_2.png", "extra.png"]
+
+
+def test_select_shard_partitions_by_prompt_index():
+    selected = [select_shard(NAMES, NUM_SHARDS, shard_id) for shard_id in range(NUM_SHARDS)]
+    assert sorted(name for names in selected for name in names) == sorted(NAMES)
+    assert {"3_1_prompt.png", "3_1_prompt_2.png"} <= set(selected[0])
+    assert selected == [select_shard(NAMES, NUM_SHARDS, shard_id) for shard_id in range(NUM_SHARDS)]
+    with pytest.raises(ValueError, match="out of range"):
+        select_shard(NAMES, NUM_SHARDS, NUM_SHARDS)
+
+
+def _write_shards(tmp_path, num_shards=NUM_SHARDS, all_names=NAMES, shard_ids=None):
+    """Detection shard files of `all_names` whose records are the prompt index of each image."""
+    from hrsbench.stages import image_index
+
+    paths = []
+    for shard_id in range(num_shards) if shard_ids is None else shard_ids:
+        records = {name: (image_index(name), [name]) for name in select_shard(all_names, num_shards, shard_id)}
+        paths.append(shard_path(tmp_path / "counting.pkl", shard_id, num_shards))
+        write_shard(paths[-1], "detection", "counting", num_shards, shard_id, all_names, records)
+    return paths
+
+
+def test_merge_detection_shards(tmp_path):
+    merged = merge_shards(_write_shards(tmp_path))
+    assert merged == tmp_path / "counting.pkl"
+    with open(merged, "rb") as f:
+        entries = pickle.load(f)
+    assert sorted(entries) == sorted(["extra", *map(str, range(8))])
+    assert entries["5"] == ["5_1_prompt.png"]
+    # the samples of a prompt share its entry; the last one in name order wins, as in an unsharded run
+    assert entries["3"] == ["3_1_prompt_2.png"]
+
+
+def test_missing_shard(tmp_path):
+    paths = _write_shards(tmp_path)
+    with pytest.raises(ShardError, match=r"Missing shard\(s\) \[1\] of 3"):
+        merge_shards([paths[0], paths[2]])
+
+
+def test_duplicate_shard(tmp_path):
+    paths = _write_shards(tmp_path)
+    copy = tmp_path / "copy" / paths[1].name
+    copy.parent.mkdir()
+    copy.write_bytes(paths[1].read_bytes())
+    with pytest.raises(ShardError, match="Shard 1 given twice"):
+        merge_shards([*paths, copy])
+
+
+def test_mixed_num_shards(tmp_path):
+    three = _write_shards(tmp_path)
+    two = _write_shards(tmp_path, num_shards=2)
+    with pytest.raises(ShardError, match="different num_shards"):
+        merge_shards([*three[:2], two[1]])
+
+
+def test_shards_of_other_inputs(tmp_path):
+    paths = _write_shards(tmp_path)
+    (tmp_path / "other").mkdir()
+    other = _write_shards(tmp_path / "other", all_names=NAMES[:-1], shard_ids=[2])
+    with pytest.raises(ShardError, match="different inputs_digest"):
+        merge_shards([*paths[:2], *other])
+
+
+def test_not_a_shard_file(tmp_path):
+    path = tmp_path / "counting.pkl.shard-0-of-1"
+    with open(path, "wb") as f:
+        pickle.dump({"0": {}}, f)
+    with pytest.raises(ShardError, match="not an hrsbench shard file"):
+        merge_shards([path])
+
+
+def _run_shards(script, images, out_dir, opts, args_for):
+    """
+    Run `script` unsharded into `<out_dir>/full` and as NUM_SHARDS concurrent processes
+    into `<out_dir>/shard<k>`, as on separate hosts; `args_for(output_base_dir)` are its stage arguments.
+    """
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([str(HRSBENCH_ROOT.parent), os.environ.get("PYTHONPATH", "")])}
+
+    def run(output_base_dir, *shard_args):
+        return subprocess.Popen(
+            [
+                sys.executable, str(script), "--input", *images, "--output_base_dir", str(output_base_dir),
+                *args_for(output_base_dir), *shard_args, "--opts", *opts,
+            ],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+
+    processes = [run(out_dir / "full")] + [
+        run(out_dir / f"shard{k}", "--num-shards", str(NUM_SHARDS), "--shard-id", str(k)) for k in range(NUM_SHARDS)
+    ]
+    for process in processes:
+        _, stderr = process.communicate()
+        assert process.returncode == 0, stderr.decode()
+
+
+def _entries(path):
+    with open(path, "rb") as f:
+        entries = pickle.load(f)
+    return {idx: {k: [box.tolist() for box in boxes] for k, boxes in entry.items()} for idx, entry in entries.items()}
+
+
+def test_sharded_detection_merges_into_the_unsharded_pickle(unidet_weights, images, tmp_path):
+    from conftest import TEST_OPTS
+
+    from hrsbench.models import UNIDET_ROOT
+
+    opts = ["MODEL.WEIGHTS", str(unidet_weights), "MODEL.DEVICE", "cpu", *TEST_OPTS]
+    _run_shards(
+        UNIDET_ROOT / "demo.py", images, tmp_path, opts,
+        lambda output_base_dir: [
+            "--task", "counting", "--confidence-threshold", "0.0", "--render", "none",
+            "--pkl_pth", str(output_base_dir / "counting.pkl"),
+        ],
+    )
+    shards = [shard_path(tmp_path / f"shard{k}" / "counting.pkl", k, NUM_SHARDS) for k in range(NUM_SHARDS)]
+    merged = merge_shards(shards, tmp_path / "merged.pkl")
+    expected = _entries(tmp_path / "full" / "counting.pkl")
+    assert len(expected) == len(images)
+    assert _entries(merged) == expected
+
+
+def test_sharded_segmentation_merges_into_the_unsharded_masks(maskdino_weights, images, tmp_path):
+    from conftest import TEST_OPTS
+
+    from hrsbench.models import MASKDINO_ROOT
+
+    opts = ["MODEL.WEIGHTS", str(maskdino_weights), "MODEL.DEVICE", "cpu", *TEST_OPTS]
+    _run_shards(
+        MASKDINO_ROOT / "demo" / "demo.py", images, tmp_path, opts,
+        lambda output_base_dir: ["--confidence-threshold", "0.0"],
+    )
+    shards = [
+        shard_path(tmp_path / f"shard{k}" / "color_detected_images", k, NUM_SHARDS) for k in range(NUM_SHARDS)
+    ]
+    merged = merge_shards(shards, tmp_path / "merged")
+    expected_dir = tmp_path / "full" / "color_detected_images"
+    expected = {path.name: path.read_bytes() for path in expected_dir.iterdir()}
+    assert expected
+    assert {path.name: path.read_bytes() for path in merged.iterdir()} == expected
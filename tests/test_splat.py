@@ -0,0 +1,35 @@
+"""The fused inference path of `SplAtConv2d` gives the outputs of the reference split path."""
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("detectron2")
+
+from hrsbench import models  # noqa: E402
+
+models.add_model_paths()
+
+
+@pytest.mark.parametrize("norm", [None, "BN"])
+@pytest.mark.parametrize("groups", [1, 2])
+@pytest.mark.parametrize("radix", [2, 4])
+@torch.no_grad()
+def test_fused_matches_split(radix, groups, norm):
+    from unidet.modeling.backbone.splat import SplAtConv2d
+
+    torch.manual_seed(0)
+    conv = SplAtConv2d(16, 32, 3, stride=2, padding=1, groups=groups, bias=False, radix=radix, norm=norm)
+    for module in conv.modules():
+        if isinstance(module, torch.nn.BatchNorm2d):
+            module.running_mean.normal_(0, 0.5)
+            module.running_var.uniform_(0.5, 2.0)
+    conv.eval()
+    x = torch.randn(2, 16, 19, 24)
+
+    fused = conv(x)
+    # the fused path is the one forward takes at inference
+    torch.testing.assert_close(fused, conv._forward_fused(x), rtol=0, atol=0)
+    conv.fused = False
+    split = conv(x)
+    assert fused.shape == split.shape == (2, 32, 10, 12)
+    # pooling before summing the radix splits only reorders float additions
+    torch.testing.assert_close(fused, split, rtol=1e-5, atol=1e-5)
@@ -0,0 +1,100 @@
+"""Sweep files and the per-seed leaderboard of `hrsbench.sweep`."""
+import csv
+import json
+import statistics
+
+import pytest
+
+from hrsbench.sweep import build_leaderboard, load_sweep, save_leaderboard
+
+
+def _sweep_file(tmp_path, *entries):
+    path = tmp_path / "sweep.jsonl"
+    path.write_text("\n".join(json.dumps(entry) if entry is not None else "" for entry in entries) + "\n")
+    return path
+
+
+def test_entry_defaults(tmp_path):
+    path = _sweep_file(
+        tmp_path,
+        {"method": "SD1.5", "image_root": "/data/sd15", "seed": "7"},
+        None,
+        {"image_root": "/data/SDXL/"},
+    )
+    assert load_sweep(path) == [
+        {"method": "SD1.5", "image_root": "/data/sd15", "seed": 7},
+        {"method": "SDXL", "image_root": "/data/SDXL/", "seed": 42},
+    ]
+
+
+def test_entry_without_image_root(tmp_path):
+    path = _sweep_file(tmp_path, {"image_root": "/data/sd15"}, {"method": "SDXL", "seed": 1})
+    with pytest.raises(ValueError, match=r"sweep.jsonl:2: sweep entry without an image_root"):
+        load_sweep(path)
+
+
+@pytest.mark.parametrize("duplicate", [
+    {"method": "SD1.5", "image_root": "/data/other", "seed": 42},
+    # the method and seed both come from the defaults
+    {"image_root": "/elsewhere/SD1.5"},
+])
+def test_duplicate_method_and_seed(tmp_path, duplicate):
+    path = _sweep_file(
+        tmp_path,
+        {"method": "SD1.5", "image_root": "/data/sd15", "seed": 42},
+        {"method": "SD1.5", "image_root": "/data/sd15", "seed": 43},
+        duplicate,
+    )
+    with pytest.raises(ValueError, match=r"sweep.jsonl:3: method 'SD1.5' with seed 42 is already listed on line 1"):
+        load_sweep(path)
+
+
+def _spatial(levels):
+    return {"accuracy_per_level": {level: [value] for level, value in zip((1, 2, 3), levels)},
+            "average_accuracy": sum(levels) / 3}
+
+
+def _counting(f1):
+    per_level = {level: [f1] for level in (1, 2, 3)}
+    return {"precisions_per_level": per_level, "recalls_per_level": per_level, "f1_per_level": per_level,
+            "average": {"precision": f1, "recall": f1, "f1": f1}}
+
+
+def test_leaderboard_mean_and_std(tmp_path):
+    entries = [
+        {"method": "SD1.5", "seed": 42},
+        {"method": "SD1.5", "seed": 43},
+        {"method": "SD1.5", "seed": 44},
+        {"method": "SDXL", "seed": 42},
+    ]
+    results = [
+        {"spatial": _spatial((10.0, 20.0, 30.0)), "counting": _counting(50.0)},
+        {"spatial": _spatial((20.0, 20.0, 60.0)), "counting": _counting(60.0)},
+        {"spatial": _spatial((30.0, 20.0, 90.0)), "counting": _counting(70.0)},
+        {"spatial": _spatial((40.0, 40.0, 40.0)), "color": {"acc": {1: [1.0], 2: [2.0], 3: [3.0]}, "avg": 2.0}},
+    ]
+    leaderboard = build_leaderboard(entries, results)
+    rows = {(row["method"], row["task"], row["metric"], row["level"]): row for row in leaderboard}
+    # 4 levels of spatial accuracy, counting precision, recall and F1, color accuracy
+    assert len(rows) == len(leaderboard) == 4 + 3 * 4 + 4 + 4
+
+    level_3 = rows["SD1.5", "spatial", "accuracy", "3"]
+    assert level_3["mean"] == 60.0 and level_3["seeds"] == [42, 43, 44]
+    # the sample standard deviation over seeds
+    assert level_3["std"] == pytest.approx(statistics.stdev([30.0, 60.0, 90.0])) == pytest.approx(30.0)
+    assert rows["SD1.5", "spatial", "accuracy", "2"]["std"] == 0.0
+    assert rows["SD1.5", "spatial", "accuracy", "avg"]["mean"] == pytest.approx(100 / 3)
+    assert rows["SD1.5", "counting", "f1", "avg"]["mean"] == 60.0
+    assert rows["SD1.5", "counting", "f1", "avg"]["std"] == pytest.approx(10.0)
+    # a single seed has no spread
+    assert rows["SDXL", "spatial", "accuracy", "1"] == {
+        "method": "SDXL", "task": "spatial", "metric": "accuracy", "level": "1", "mean": 40.0, "std": 0.0, "seeds": [42]
+    }
+    assert rows["SDXL", "color", "accuracy", "avg"]["mean"] == 2.0
+
+    json_path, csv_path = save_leaderboard(leaderboard, tmp_path)
+    assert json.loads(json_path.read_text()) == leaderboard
+    with open(csv_path, newline="") as f:
+        row = next(row for row in csv.DictReader(f) if row["method"] == "SD1.5" and row["level"] == "3"
+                   and row["task"] == "spatial")
+    assert row["seeds"] == "42 43 44" and float(row["mean"]) == 60.0
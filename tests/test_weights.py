@@ -0,0 +1,96 @@
+"""Checkpoint conversions of `hrsbench.weights`: the memory-mappable copy and the inference-only UniDet."""
+import re
+
+import pytest
+
+from hrsbench.models import pruned_dataset, pruned_weights_path
+
+# classifier of a cascade stage and dataset, as `prune_unidet` matches it
+CLS_SCORE = re.compile(r"^roi_heads\.box_predictor\.(\d+)\.cls_score\.(\d+)\.(weight|bias)$")
+# index of COCO in MULTI_DATASET.DATASETS of the shipped config: objects365, coco, oid
+COCO = 1
+
+
+def test_mmap_checkpoint_loads_the_same_state_dict(unidet_weights, unidet_cfg, tmp_path):
+    import torch
+    from detectron2.checkpoint import DetectionCheckpointer
+    from detectron2.modeling import build_model
+
+    from hrsbench.cache import weights_digest
+    from hrsbench.weights import MmapDetectionCheckpointer, convert_to_mmap
+
+    mmap_path = convert_to_mmap(unidet_weights, tmp_path / "unidet-random.mmap.pth")
+    cfg = unidet_cfg("MODEL.WEIGHTS", "")
+    reference = build_model(cfg)
+    DetectionCheckpointer(reference).load(str(unidet_weights))
+    mapped = build_model(cfg)
+    MmapDetectionCheckpointer(mapped).load(str(mmap_path))
+
+    expected, actual = reference.state_dict(), mapped.state_dict()
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        assert actual[key].dtype == value.dtype and torch.equal(actual[key], value), key
+    # the copy is the same model: it shares the inference cache entries and compiled artifacts
+    assert weights_digest(mmap_path) == weights_digest(unidet_weights)
+
+
+def test_pruned_dataset_from_the_file_name(tmp_path):
+    path = pruned_weights_path(tmp_path / "unidet.pth")
+    assert path.name == "unidet.coco-only.mmap.pth"
+    assert pruned_dataset(path) == "coco"
+    assert pruned_dataset(tmp_path / "unidet.mmap.pth") is None
+    assert pruned_dataset(tmp_path / "unidet.pth") is None
+
+
+def test_pruned_unidet_matches_the_full_model(unidet_weights, unidet_cfg, images, tmp_path):
+    import numpy as np
+    import torch
+
+    from hrsbench import models, stages
+    from hrsbench.weights import prune_unidet
+
+    pruned_path = prune_unidet(unidet_weights, pruned_weights_path(tmp_path / unidet_weights.name))
+    full = torch.load(unidet_weights, map_location="cpu")["model"]
+    pruned = torch.load(pruned_path, map_location="cpu", weights_only=True)["model"]
+
+    # every stage keeps the COCO classifier alone, as cls_score.0; the rest is untouched
+    classifiers = {key: CLS_SCORE.match(key).groups() for key in full if CLS_SCORE.match(key)}
+    assert {dataset for _, dataset, _ in classifiers.values()} == {"0", "1", "2"}
+    assert set(pruned) == (set(full) - set(classifiers)) | {
+        f"roi_heads.box_predictor.{stage}.cls_score.0.{name}" for stage, _, name in classifiers.values()
+    }
+    for key, (stage, dataset, name) in classifiers.items():
+        if dataset == str(COCO):
+            assert torch.equal(pruned[f"roi_heads.box_predictor.{stage}.cls_score.0.{name}"], full[key])
+    for key in set(full) - set(classifiers):
+        assert torch.equal(pruned[key], full[key]), key
+
+    cfg = unidet_cfg("MODEL.WEIGHTS", str(pruned_path))
+    # the inference-only model is configured from the file name
+    assert cfg.MULTI_DATASET.INFERENCE_DATASET == "coco"
+    assert unidet_cfg().MULTI_DATASET.INFERENCE_DATASET == ""
+    predictor = models.build_unidet(cfg).predictor
+    model = predictor.model
+    assert model.inference_only and model.eval_dataset == COCO
+    assert all(len(box_predictor.cls_score) == 1 for box_predictor in model.roi_heads.box_predictor)
+
+    reference = models.build_unidet(unidet_cfg()).predictor
+    assert reference.model.eval_dataset == COCO
+    for _, img, *_ in stages._read_inputs(images):
+        actual = stages._detection_outputs(predictor(img))
+        expected = stages._detection_outputs(reference(img))
+        assert len(expected["scores"])
+        # the same weights run through the same ops: identical COCO detections
+        for key in ("pred_boxes", "scores", "pred_classes"):
+            np.testing.assert_array_equal(actual[key], expected[key])
+
+
+def test_prune_needs_a_partitioned_checkpoint(tmp_path):
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("detectron2")
+    from hrsbench.weights import prune_unidet
+
+    src = tmp_path / "model.pth"
+    torch.save({"model": {"backbone.weight": torch.zeros(2)}}, src)
+    with pytest.raises(ValueError, match="no per-dataset classifier"):
+        prune_unidet(src)
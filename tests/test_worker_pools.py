@@ -0,0 +1,81 @@
+"""The AsyncPredictor worker pools give the stage outputs of the serial in-process models."""
+import multiprocessing as mp
+import os
+import pickle
+
+import pytest
+
+from hrsbench.journal import Journal
+
+
+@pytest.fixture
+def single_thread():
+    """Serial and worker runs both on one intra-op thread, so float reductions match bit for bit."""
+    torch = pytest.importorskip("torch")
+    if len(os.sched_getaffinity(0)) < 2:
+        pytest.skip("needs 2 cores for a pool of 2 workers")
+    num_threads = torch.get_num_threads()
+    start_method = mp.get_start_method(allow_none=True)
+    torch.set_num_threads(1)
+    # as the CLI does: pools must not be forked from a process whose thread pools run
+    mp.set_start_method("spawn", force=True)
+    yield
+    torch.set_num_threads(num_threads)
+    mp.set_start_method(start_method, force=True)
+
+
+def _detect(demo, images, output_dir):
+    from hrsbench import stages
+
+    pkl_path = output_dir / "counting.pkl"
+    stages.run_detection(
+        demo, images, task="counting", output_base_dir=output_dir, pkl_path=pkl_path, render="none", classes="all"
+    )
+    with open(pkl_path, "rb") as f:
+        return pickle.load(f)
+
+
+def _segment(demo, images, output_dir):
+    from hrsbench import stages
+
+    mask_dir = stages.run_segmentation(demo, images, output_base_dir=output_dir, score_thresh=0.0)
+    with Journal(output_dir / "color_detected_images.journal", resume=True) as journal:
+        records = list(journal.records.items())
+    return records, {name: (mask_dir / name).read_bytes() for name in os.listdir(mask_dir)}
+
+
+def test_unidet_pool_matches_serial(unidet_cfg, images, tmp_path, single_thread):
+    from hrsbench import models
+
+    cfg = unidet_cfg()
+    serial = _detect(models.build_unidet(cfg), images, tmp_path / "serial")
+    demo = models.build_unidet(cfg, num_workers=2, num_threads=1)
+    try:
+        pooled = _detect(demo, images, tmp_path / "pool")
+    finally:
+        demo.predictor.shutdown()
+
+    # same images in the same order, same boxes and class names in every group
+    assert list(pooled) == list(serial)
+    assert any(serial.values())
+    for img_idx, groups in serial.items():
+        assert list(pooled[img_idx]) == list(groups)
+        for first_idx, detections in groups.items():
+            assert [d.tolist() for d in pooled[img_idx][first_idx]] == [d.tolist() for d in detections]
+
+
+def test_maskdino_pool_matches_serial(maskdino_cfg, images, tmp_path, single_thread):
+    from hrsbench import models
+
+    cfg = maskdino_cfg()
+    serial_records, serial_masks = _segment(models.build_maskdino(cfg), images, tmp_path / "serial")
+    demo = models.build_maskdino(cfg, num_workers=2, num_threads=1)
+    try:
+        pooled_records, pooled_masks = _segment(demo, images, tmp_path / "pool")
+    finally:
+        demo.predictor.shutdown()
+
+    # same images committed in the same order, with the same mask files, byte for byte
+    assert pooled_records == serial_records
+    assert serial_masks
+    assert pooled_masks == serial_masks
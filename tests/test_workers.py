@@ -0,0 +1,30 @@
+import pytest
+
+from hrsbench.workers import split_cores
+
+
+def test_split_cores_shares_leftover_evenly():
+    assert split_cores(range(8), [None, None]) == [[0, 1, 2, 3], [4, 5, 6, 7]]
+    assert split_cores(range(5), [None] * 3) == [[0, 1], [2, 3], [4]]
+    assert split_cores(range(8), [None, 2, None]) == [[0, 1, 2], [3, 4], [5, 6, 7]]
+
+
+def test_split_cores_budgets_are_disjoint():
+    budgets = split_cores(range(8), [3, None, 1])
+    cores = [c for budget in budgets for c in budget]
+    assert len(cores) == len(set(cores))
+    assert all(budgets)
+
+
+@pytest.mark.parametrize(
+    "cores, counts",
+    [
+        (range(8), [8, None]),  # explicit counts use every core
+        (range(3), [None] * 5),  # more budgets than cores
+        (range(4), [5]),
+        (range(4), [0, None]),
+    ],
+)
+def test_split_cores_rejects_oversubscription(cores, counts):
+    with pytest.raises(ValueError):
+        split_cores(cores, counts)